@@ -22,19 +22,64 @@ from flask_moment import Moment
 
 moment = Moment()
 
-def create_app(config_name='default'):
-    """Factory pour créer l'application Flask"""
+def create_app(config_name='default', overrides=None):
+    """
+    Factory pour créer l'application Flask
+
+    Args:
+        config_name: Entrée de config.config
+        overrides (dict, optional): Réglages appliqués par-dessus (avant l'ouverture de la base)
+    """
     app = Flask(__name__, 
                 static_folder='../static',
                 static_url_path='/static')
 
     app.config.from_object(config[config_name])
+    app.config.update(overrides or {})
 
     moment.init_app(app)
 
+    # Pool de navigateurs partagé par les scrapers (SELENIUM_WARM_SIZE démarrés en arrière-plan)
+    from scraping.driver_pool import configure_driver_pool
+    configure_driver_pool(
+        browser=app.config.get('SELENIUM_BROWSER', 'chrome'),
+        max_size=app.config.get('SELENIUM_POOL_SIZE', 2),
+        warm_size=app.config.get('SELENIUM_WARM_SIZE', 1),
+        max_pages=app.config.get('SELENIUM_MAX_PAGES', 50),
+        max_memory_mb=app.config.get('SELENIUM_MAX_MEMORY_MB'),
+        max_memory_growth_mb=app.config.get('SELENIUM_MAX_MEMORY_GROWTH_MB')
+    )
+
+    from scraping.parsers import configure_html_parser
+    configure_html_parser(app.config.get('HTML_PARSER', 'auto'))
+
+    # Connexions SQLite : une par requête, poolées pour les workers
+    from database.connection import init_db_connections
+    init_db_connections(app)
+
+    # Lectures par produit en cache, invalidées par les écritures
+    from database.cache import init_query_cache
+    init_query_cache(app)
+
+    # Relevés de prix des scrapers écrits par lots
+    from database.writer import init_price_writer
+    init_price_writer(app)
+
     from database.models import init_db
     with app.app_context():
         init_db()
+
+    # Workers des jobs de scraping (démarrés au premier job mis en file)
+    from app.jobs import init_scrape_jobs
+    init_scrape_jobs(app)
+
+    # Maintenance de l'historique (lancée par le planificateur, ou maintenance.py)
+    from app.maintenance import init_maintenance
+    init_maintenance(app)
+
+    # Scraping automatique (dans ce processus si AUTO_UPDATE_IN_PROCESS, sinon scheduler.py)
+    from app.scheduler import init_scheduler
+    init_scheduler(app)
     
     # Enregistrer les blueprints
     from app.routes import main
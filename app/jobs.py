@@ -0,0 +1,183 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Exécution des jobs de scraping en arrière-plan
+
+Les routes mettent un job en file (table scrape_jobs) et répondent
+immédiatement ; des threads workers, démarrés au premier job, réservent
+les jobs en file et scrapent leurs liens en publiant l'avancement.
+La réservation est atomique en base : plusieurs processus web peuvent
+faire tourner leurs workers sur la même file.
+"""
+
+import os
+import logging
+import threading
+
+from flask import current_app
+
+from database.models import (
+    claim_scrape_job,
+    enqueue_scrape_job,
+    finish_scrape_job,
+    get_all_product_links,
+    get_product_links,
+    requeue_stale_scrape_jobs,
+    scrape_links,
+    update_scrape_job_progress
+)
+
+logger = logging.getLogger(__name__)
+
+# Champs conservés par lien dans le résultat d'un job
+RESULT_FIELDS = ('link_id', 'product_id', 'shop_name', 'price', 'currency', 'is_available',
+                 'success', 'error_message', 'source')
+
+
+class ScrapeJobWorkers:
+    """Threads workers qui exécutent les jobs de scraping en file"""
+
+    def __init__(self, app, num_workers=1, poll_interval=2.0, stale_after=600):
+        """
+        Args:
+            app: Application Flask (contexte des accès en base)
+            num_workers: Nombre de jobs exécutés simultanément
+            poll_interval: Intervalle de relève de la file (secondes)
+            stale_after: Délai après lequel un job 'running' muet est remis en file
+        """
+        self.app = app
+        self.num_workers = max(1, int(num_workers))
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Démarrer les workers (sans effet s'ils tournent déjà)"""
+        with self._lock:
+            if self._threads:
+                return
+
+            with self.app.app_context():
+                requeue_stale_scrape_jobs(self.stale_after)
+
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._loop, name=f'scrape-job-{i + 1}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+            logger.info(f"👷 {self.num_workers} worker(s) de scraping démarré(s)")
+
+    def notify(self):
+        """Signaler un nouveau job aux workers en attente"""
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def _loop(self):
+        name = f'{os.getpid()}:{threading.current_thread().name}'
+        while not self._stopped.is_set():
+            try:
+                if self.run_pending(name):
+                    continue
+            except Exception as e:
+                logger.error(f"Erreur worker de scraping: {e}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def run_pending(self, worker='inline'):
+        """
+        Exécuter le prochain job en file dans le thread courant
+
+        Returns:
+            bool: True si un job a été exécuté
+        """
+        with self.app.app_context():
+            job = claim_scrape_job(worker)
+            if job is None:
+                return False
+            run_scrape_job(job)
+            return True
+
+
+def run_scrape_job(job):
+    """Scraper les liens d'un job en publiant son avancement (contexte Flask requis)"""
+    job_id = job['id']
+    cancel = threading.Event()
+    counters = {'completed': 0, 'succeeded': 0, 'failed': 0}
+
+    try:
+        if job['product_id'] is None:
+            links = get_all_product_links()
+        else:
+            links = [{**link, 'product_id': job['product_id']} for link in get_product_links(job['product_id'])]
+
+        logger.info(f"▶️ Job de scraping {job_id}: {len(links)} lien(s)")
+        if update_scrape_job_progress(job_id, total=len(links), **counters):
+            cancel.set()
+
+        def _progress(result):
+            counters['completed'] += 1
+            counters['succeeded' if result.get('success') else 'failed'] += 1
+            if update_scrape_job_progress(job_id, **counters):
+                cancel.set()
+
+        results = scrape_links(links, on_progress=_progress, cancel=cancel) if not cancel.is_set() else []
+        results = [{key: result.get(key) for key in RESULT_FIELDS} for result in results]
+
+        status = 'cancelled' if cancel.is_set() else 'done'
+        finish_scrape_job(job_id, status, results)
+        logger.info(f"⏹️ Job de scraping {job_id} {status}: {counters['succeeded']} succès, "
+                    f"{counters['failed']} échec(s)")
+
+    except Exception as e:
+        logger.error(f"Job de scraping {job_id} en échec: {e}")
+        finish_scrape_job(job_id, 'failed', error_message=str(e))
+
+
+def init_scrape_jobs(app):
+    """Attacher les workers à l'application (démarrés au premier job)"""
+    app.extensions['scrape_jobs'] = ScrapeJobWorkers(
+        app,
+        num_workers=app.config.get('SCRAPE_JOB_WORKERS', 1),
+        poll_interval=app.config.get('SCRAPE_JOB_POLL_INTERVAL', 2.0)
+    )
+
+
+def submit_scrape_job(product_id=None):
+    """
+    Mettre en file un scraping (produit ou catalogue) et réveiller les workers
+
+    Returns:
+        dict: Job créé, ou job actif équivalent (merged = True)
+    """
+    job = enqueue_scrape_job(product_id)
+
+    workers = current_app.extensions.get('scrape_jobs')
+    if workers is not None and current_app.config.get('SCRAPE_JOBS_AUTOSTART', True):
+        workers.start()
+        workers.notify()
+
+    return job
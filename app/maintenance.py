@@ -0,0 +1,179 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Maintenance de l'historique des prix (MAINTENANCE_*)
+
+Une passe purge les relevés en échec anciens, compacte les suites de
+relevés identiques en un relevé unique (plage first_seen_at -> scraped_at),
+puis rend l'espace libéré : incremental_vacuum à chaque passe, VACUUM
+complet tous les MAINTENANCE_FULL_VACUUM_DAYS jours (qui active aussi
+l'auto_vacuum incrémental sur une base existante). Tout se fait par petits
+lots en transactions courtes : les scrapers continuent d'écrire.
+
+La passe est lancée par le planificateur quand elle est due, ou à la main :
+
+    python maintenance.py [--report] [--full-vacuum]
+"""
+
+import time
+import logging
+import calendar
+
+from database.models import (
+    compact_price_links,
+    expire_error_prices,
+    get_database_pages,
+    get_last_maintenance_run,
+    reclaim_free_pages,
+    record_maintenance_run,
+    vacuum_database
+)
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class HistoryMaintenance:
+    """Purge, compactage et récupération d'espace de l'historique des prix"""
+
+    def __init__(self, app, clock=time.time):
+        """
+        Args:
+            app: Application Flask (configuration et contexte des accès en base)
+            clock: Horloge epoch (remplaçable pour les tests)
+        """
+        self.app = app
+        self.clock = clock
+
+    def _settings(self):
+        config = self.app.config
+        return {
+            'interval_hours': config.get('MAINTENANCE_INTERVAL_HOURS', 24),
+            'error_retention_days': config.get('MAINTENANCE_ERROR_RETENTION_DAYS', 30),
+            'error_batch': config.get('MAINTENANCE_ERROR_BATCH', 1000),
+            'batch_links': config.get('MAINTENANCE_BATCH_LINKS', 50),
+            'batch_rows': config.get('MAINTENANCE_BATCH_ROWS', 5000),
+            'pause': config.get('MAINTENANCE_BATCH_PAUSE', 0.05),
+            'vacuum_pages': config.get('MAINTENANCE_VACUUM_PAGES', 1000),
+            'full_vacuum_days': config.get('MAINTENANCE_FULL_VACUUM_DAYS', 30),
+        }
+
+    def _since(self, run, hours):
+        """La passe (dict de maintenance_runs) date-t-elle de moins de `hours` heures ?"""
+        if not run or not hours:
+            return False
+        started = calendar.timegm(time.strptime(run['started_at'], TIMESTAMP_FORMAT))
+        return self.clock() - started < hours * 3600
+
+    def is_due(self):
+        with self.app.app_context():
+            return not self._since(get_last_maintenance_run(), self._settings()['interval_hours'])
+
+    def run(self, full_vacuum=None, stop=None):
+        """
+        Une passe de maintenance complète
+
+        Args:
+            full_vacuum (bool, optional): Forcer (True) ou exclure (False) le VACUUM complet,
+                                          par défaut selon MAINTENANCE_FULL_VACUUM_DAYS
+            stop (threading.Event, optional): Interrompre la passe entre deux lots
+
+        Returns:
+            dict: Compte rendu enregistré dans maintenance_runs
+        """
+        settings = self._settings()
+        start = time.perf_counter()
+        stopped = stop.is_set if stop else (lambda: False)
+
+        with self.app.app_context():
+            pages = get_database_pages()
+            report = {
+                'started_at': time.strftime(TIMESTAMP_FORMAT, time.gmtime(self.clock())),
+                'expired_errors': 0,
+                'compacted_rows': 0,
+                'links_compacted': 0,
+                'page_size': pages['page_size'],
+                'pages_before': pages['page_count'],
+                'vacuum': None,
+            }
+
+            # 1. Relevés en échec au-delà de la rétention
+            if settings['error_retention_days']:
+                while not stopped():
+                    deleted = expire_error_prices(settings['error_retention_days'], settings['error_batch'])
+                    report['expired_errors'] += deleted
+                    if deleted < settings['error_batch']:
+                        break
+                    time.sleep(settings['pause'])
+
+            # 2. Suites de relevés identiques, lien par lien
+            after = 0
+            while after is not None and not stopped():
+                batch = compact_price_links(after, settings['batch_links'], settings['batch_rows'])
+                report['compacted_rows'] += batch['compacted_rows']
+                report['links_compacted'] += batch['links']
+                after = batch['last_link_id']
+                if after is not None:
+                    time.sleep(settings['pause'])
+
+            # 3. Espace libéré rendu au système
+            if full_vacuum is None:
+                full_vacuum = bool(settings['full_vacuum_days']) and not self._since(
+                    get_last_maintenance_run(vacuum='full'), settings['full_vacuum_days'] * 24)
+
+            if full_vacuum and not stopped():
+                vacuum_database()
+                report['vacuum'] = 'full'
+            elif get_database_pages()['auto_vacuum'] == 2:
+                while not stopped() and reclaim_free_pages(settings['vacuum_pages']) >= settings['vacuum_pages']:
+                    time.sleep(settings['pause'])
+                report['vacuum'] = 'incremental'
+
+            pages = get_database_pages()
+            report.update({
+                'finished_at': time.strftime(TIMESTAMP_FORMAT, time.gmtime(self.clock())),
+                'pages_after': pages['page_count'],
+                'freelist_after': pages['freelist_count'],
+                'duration_ms': int((time.perf_counter() - start) * 1000),
+            })
+            report['id'] = record_maintenance_run(report)
+
+        reclaimed = (report['pages_before'] - report['pages_after']) * report['page_size']
+        logger.info(f"🧹 Maintenance de l'historique : {report['compacted_rows']} relevé(s) compacté(s), "
+                    f"{report['expired_errors']} échec(s) purgé(s), {reclaimed / 1024 ** 2:.1f} Mo récupéré(s) "
+                    f"(VACUUM {report['vacuum'] or 'aucun'})")
+        return report
+
+    def run_if_due(self, stop=None):
+        """Lancer une passe si la précédente date de plus de MAINTENANCE_INTERVAL_HOURS"""
+        if not self.app.config.get('MAINTENANCE_ENABLED', True) or not self.is_due():
+            return None
+        try:
+            return self.run(stop=stop)
+        except Exception as e:
+            logger.error(f"Erreur de maintenance de l'historique: {e}")
+            return None
+
+
+def init_maintenance(app):
+    """Attacher la maintenance de l'historique à l'application (lancée par le planificateur)"""
+    maintenance = HistoryMaintenance(app)
+    app.extensions['history_maintenance'] = maintenance
+    return maintenance
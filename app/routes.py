@@ -20,34 +20,56 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 Routes Flask pour PriceChecker
 """
 
+import json
+import time
+import base64
+import hashlib
 import logging
-import csv
 
-from io import StringIO
 from datetime import datetime
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, make_response, current_app
+from itertools import chain
+from flask import (Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app,
+                   Response, stream_with_context)
 
 from database.models import (
     add_product_link,
+    cancel_scrape_job,
+    clear_http_cache,
+    clear_link_strategy,
+    CATALOGUE_SORTS,
     create_product,
     delete_product,
     delete_product_link,
     get_all_products,
+    get_catalogue,
+    get_chart_resolution,
     get_db_connection,
+    get_extraction_stats,
     get_global_stats,
+    get_history_resolution,
     get_latest_prices,
+    get_link_schedules,
+    get_maintenance_report,
     get_price_statistics,
-    get_price_history,
+    get_product_statistics,
+    get_product_version,
     get_price_history_for_chart,
     get_price_history_table,
     get_product_by_id,
     get_product_links,
-    get_scraping_stats,
+    get_scrape_job,
+    iter_price_history,
     record_price,
-    scrape_all_product_links,
+    set_link_interval,
     update_product
 )
 
+from app.jobs import submit_scrape_job
+
+from database.cache import get_query_cache, invalidate_products
+
+from utils.decimation import DECIMATION_METHODS
+from utils.exports import EXPORT_FORMATS, export_chunks, gzip_chunks
 from utils.validators import (
     validate_all_product_data,
     validate_all_link_data,
@@ -59,6 +81,92 @@ logger = logging.getLogger(__name__)
 
 main = Blueprint('main', __name__)
 
+# Fréquences de scraping automatique proposées par lien (secondes -> libellé)
+SCRAPE_INTERVAL_CHOICES = {
+    '3600': 'Toutes les heures',
+    '21600': 'Toutes les 6 heures',
+    '43200': 'Toutes les 12 heures',
+    '86400': 'Tous les jours',
+    '259200': 'Tous les 3 jours',
+    '604800': 'Toutes les semaines',
+}
+
+# Tris proposés sur la liste des produits
+CATALOGUE_SORT_LABELS = {
+    'created': 'Ajout le plus récent',
+    'name': 'Nom',
+    'best_price': 'Meilleur prix',
+    'latest_change': 'Dernier changement de prix',
+}
+
+def encode_cursor(cursor):
+    """Curseur de pagination opaque (clé de tri et ID du dernier produit)"""
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Curseur décodé, ou None s'il est absent ou invalide"""
+    if not token:
+        return None
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(cursor, list) or len(cursor) != 2 or not isinstance(cursor[1], int):
+        return None
+    return cursor
+
+def product_etag(product_id, *parts):
+    """
+    ETag d'une réponse JSON sur un produit : version de ses données en base
+    (voir get_product_version) et paramètres de la réponse
+
+    Returns:
+        tuple: (etag, réponse 304 si le client a déjà cette version, sinon None),
+               (None, None) si le produit n'existe pas
+    """
+    version = get_product_version(product_id)
+    if version is None:
+        return None, None
+
+    # Écriture d'un autre processus (scheduler.py) : les lectures en cache du produit sont périmées
+    cache = get_query_cache()
+    if cache is not None:
+        cache.validate(product_id, version)
+
+    etag = hashlib.sha1(json.dumps([request.endpoint, version, *parts]).encode('utf-8')).hexdigest()
+    if etag in request.if_none_match:
+        return etag, with_etag(Response(status=304), etag)
+    return etag, None
+
+def with_etag(response, etag):
+    """Réponse revalidée à chaque requête par son ETag (If-None-Match -> 304)"""
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
+
+def history_window(days, resolution=None):
+    """Début de la fenêtre de `days` jours, à l'intervalle d'agrégat près (les données changent avec lui)"""
+    _, _, bucket_format = resolution or get_history_resolution(days)
+    return time.strftime(bucket_format, time.gmtime(time.time() - days * 86400))
+
+def chart_options():
+    """
+    Paramètres de graphique de la requête : boutique (shop), points par
+    boutique (max_points, 10 à CHART_MAX_POINTS) et décimation (lttb, minmax)
+
+    Returns:
+        dict: Arguments nommés de get_price_history_for_chart
+    """
+    limit = current_app.config.get('CHART_MAX_POINTS', 400)
+    shop = request.args.get('shop')
+    method = request.args.get('decimation', 'lttb')
+    return {
+        'shop': shop if shop and shop != 'all' else None,
+        'max_points': max(10, min(request.args.get('max_points', limit, type=int), limit)),
+        'method': method if method in DECIMATION_METHODS else 'lttb',
+    }
+
 def handle_validation_errors(errors):
     """Helper pour afficher les erreurs de validation"""
     for error in errors:
@@ -178,10 +286,11 @@ def api_link_scraping(link_id):
         # Répondre selon le résultat
         return jsonify({
             'success': True,
-            'price_found': price_data['is_available'] and price_data['price'] is not None,
+            'price_found': price_data['price'] is not None,
             'price': price_data['price'],
             'currency': price_data['currency'],
             'is_available': price_data['is_available'],
+            'source': price_data.get('source'),
             'error': price_data['error_message'],
             'shop_name': link['shop_name']
         })
@@ -203,12 +312,18 @@ def api_price_chart(product_id):
         if days not in [7, 30, 90, 365]:
             days = 30
 
-        chart_data = get_price_history_for_chart(product_id, days)
+        options = chart_options()
+        etag, not_modified = product_etag(product_id, days, history_window(days, get_chart_resolution(days)),
+                                          options)
+        if not_modified:
+            return not_modified
 
-        return jsonify({
+        chart_data = get_price_history_for_chart(product_id, days, **options)
+
+        return with_etag(jsonify({
             'success': True,
             'data': chart_data
-        })
+        }), etag)
 
     except Exception as e:
         logger.error(f"Erreur API graphique produit {product_id}: {e}")
@@ -222,12 +337,17 @@ def api_price_stats(product_id):
     """API pour statistiques dynamiques"""
     try:
         days = request.args.get('days', 30, type=int)
+
+        etag, not_modified = product_etag(product_id, days, history_window(days))
+        if not_modified:
+            return not_modified
+
         stats = get_price_statistics(product_id, days)
 
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'stats': stats
-        })
+        }), etag)
 
     except Exception as e:
         logger.error(f"Erreur API stats produit {product_id}: {e}")
@@ -236,6 +356,41 @@ def api_price_stats(product_id):
             'error': str(e)
         }), 500
 
+@main.route('/api/catalogue')
+def api_catalogue():
+    """
+    API JSON : catalogue paginé (meilleur prix, boutiques disponibles, prix récents)
+
+    Paramètres : sort (created, name, best_price, latest_change), order (asc, desc),
+    limit (1 à 200), after (curseur next_cursor de la page précédente)
+    """
+    sort = request.args.get('sort', 'created')
+    order = request.args.get('order')
+    limit = request.args.get('limit', current_app.config.get('CATALOGUE_PAGE_SIZE', 50), type=int)
+    after = request.args.get('after')
+
+    cursor = decode_cursor(after)
+    if sort not in CATALOGUE_SORTS or order not in (None, 'asc', 'desc') or (after and cursor is None):
+        return jsonify({'status': 'error', 'message': 'Paramètres de pagination invalides'}), 400
+
+    try:
+        catalogue = get_catalogue(sort=sort, order=order, limit=max(1, min(limit, 200)), after=cursor)
+        next_cursor = encode_cursor(catalogue['next_cursor']) if catalogue['next_cursor'] else None
+        return jsonify({
+            'status': 'success',
+            'count': len(catalogue['products']),
+            'total': catalogue['total'],
+            'sort': catalogue['sort'],
+            'order': catalogue['order'],
+            'products': catalogue['products'],
+            'next_cursor': next_cursor,
+            'next_url': url_for('main.api_catalogue', sort=sort, order=catalogue['order'], limit=limit,
+                                after=next_cursor) if next_cursor else None
+        })
+    except Exception as e:
+        logger.error(f"Erreur API catalogue: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @main.route('/api/products', methods=['GET', 'POST'])
 def api_products():
     """API JSON pour les produits"""
@@ -297,6 +452,10 @@ def api_products():
 def api_product_detail(product_id):
     """API JSON pour un produit spécifique"""
     try:
+        etag, not_modified = product_etag(product_id)
+        if not_modified:
+            return not_modified
+
         product = get_product_by_id(product_id)
         if not product:
             return jsonify({
@@ -305,11 +464,11 @@ def api_product_detail(product_id):
             }), 404
 
         prices = get_latest_prices(product_id)
-        return jsonify({
+        return with_etag(jsonify({
             'status': 'success',
             'product': product,
             'prices': prices
-        })
+        }), etag)
     except Exception as e:
         logger.error(f"Erreur API produit {product_id}: {e}")
         return jsonify({
@@ -346,13 +505,12 @@ def api_scraping_status(product_id):
     """API pour récupérer le statut du scraping"""
 
     try:
-        stats = get_scraping_stats(product_id)
-        latest_prices = get_latest_prices(product_id)  # ← Utiliser votre fonction
+        statistics = get_product_statistics(product_id)
 
         return jsonify({
             'success': True,
-            'stats': stats,
-            'latest_prices': [dict(price) for price in latest_prices]  # ← Nouveau nom
+            'stats': statistics['scraping'],
+            'latest_prices': statistics['prices']
         })
 
     except Exception as e:
@@ -361,6 +519,49 @@ def api_scraping_status(product_id):
             'error': str(e)
         }), 500
 
+@main.route('/api/scraping/extraction-stats')
+def api_extraction_stats():
+    """API : étapes d'extraction ayant fourni les prix, par boutique"""
+
+    try:
+        return jsonify({
+            'success': True,
+            'shops': get_extraction_stats()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@main.route('/api/maintenance')
+def api_maintenance_report():
+    """API : dernières passes de maintenance de l'historique et espace récupéré"""
+
+    try:
+        return jsonify({
+            'success': True,
+            'report': get_maintenance_report()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@main.route('/api/cache')
+def api_query_cache_stats():
+    """API : efficacité du cache des lectures (succès, échecs, évictions, invalidations)"""
+
+    cache = get_query_cache()
+    return jsonify({
+        'success': True,
+        'enabled': cache is not None,
+        'stats': cache.stats() if cache else None
+    })
+
 @main.route('/api/validate/product-name', methods=['POST'])
 def api_validate_product_name():
     """API pour valider un nom de produit en temps réel"""
@@ -519,9 +720,12 @@ def edit_product_link(product_id, link_id):
             shop_name = request.form.get('shop_name', '').strip()
             url = request.form.get('url', '').strip()
             css_selector = request.form.get('css_selector', '').strip()
+            scrape_interval = request.form.get('scrape_interval', '').strip()
 
             # Validation
             errors = []
+            if scrape_interval and scrape_interval not in SCRAPE_INTERVAL_CHOICES:
+                errors.append('Fréquence de vérification invalide')
             if not shop_name:
                 errors.append('Le nom de la boutique est requis')
             if not url:
@@ -548,6 +752,8 @@ def edit_product_link(product_id, link_id):
                 return render_template('edit_product_link.html',
                                        product=product,
                                        link=link,
+                                       schedule=get_link_schedules([link_id]).get(link_id),
+                                       interval_choices=SCRAPE_INTERVAL_CHOICES,
                                        form_data=request.form)
 
             # Mettre à jour le lien
@@ -562,90 +768,138 @@ def edit_product_link(product_id, link_id):
 
             conn.commit()
             conn.close()
+            invalidate_products(product_id)
+
+            # L'URL ou le sélecteur ont pu changer : stratégie et cache HTTP ne sont plus fiables
+            if url != link['url'] or (css_selector or None) != link['css_selector']:
+                clear_link_strategy(link_id)
+                clear_http_cache(link['url'])
+
+            # Fréquence de scraping automatique propre au lien (vide = boutique ou défaut)
+            schedule = get_link_schedules([link_id]).get(link_id) or {}
+            interval_seconds = int(scrape_interval) if scrape_interval else None
+            if interval_seconds != schedule.get('interval_seconds'):
+                set_link_interval(link_id, interval_seconds)
 
             flash(f'Lien "{shop_name}" modifié avec succès', 'success')
             return redirect(url_for('main.product_detail', product_id=product_id))
 
         conn.close()
-        return render_template('edit_product_link.html', product=product, link=link)
+        return render_template('edit_product_link.html', product=product, link=link,
+                               schedule=get_link_schedules([link_id]).get(link_id),
+                               interval_choices=SCRAPE_INTERVAL_CHOICES)
 
     except Exception as e:
         logger.error(f"Erreur édition lien {link_id}: {e}")
         flash(f'Erreur lors de l\'édition: {e}', 'error')
         return redirect(url_for('main.product_detail', product_id=product_id))
 
+def _export_options():
+    """
+    Paramètres d'export de la requête : ?format=csv|jsonl&gzip=1&shop=...&since=YYYY-MM-DD&until=YYYY-MM-DD
+
+    Raises:
+        ValueError: Format ou date invalide
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+
+    options = {'fmt': fmt, 'gzip': request.args.get('gzip', '').lower() in ('1', 'true', 'yes', 'on'),
+               'shop': request.args.get('shop') or None}
+    for key in ('since', 'until'):
+        value = request.args.get(key) or None
+        if value:
+            datetime.strptime(value, '%Y-%m-%d')
+        options[key] = value
+    return options
+
+def _export_response(records, name, options, with_product=False):
+    """Réponse HTTP en flux : relevés sérialisés (et compressés) au fur et à mesure de la lecture"""
+    mimetype, extension = EXPORT_FORMATS[options['fmt']]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Nettoyer le nom pour éviter les caractères problématiques
+    safe_name = "".join(c for c in name.replace(' ', '_') if c.isalnum() or c in ('_', '-')).rstrip()
+    filename = f"historique_prix_{safe_name}_{timestamp}.{extension}"
+
+    def generate():
+        count = 0
+
+        def counted():
+            nonlocal count
+            for record in records:
+                count += 1
+                yield record
+
+        chunks = export_chunks(counted(), options['fmt'], with_product=with_product)
+        yield from gzip_chunks(chunks) if options['gzip'] else chunks
+        logger.info(f"Export {extension.upper()} généré pour {name}: {count} enregistrements")
+
+    if options['gzip']:
+        mimetype, filename = 'application/gzip', f"{filename}.gz"
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+    return response
+
 @main.route('/product/<int:product_id>/history/export')
 def export_price_history(product_id):
-    """Export de l'historique des prix en CSV"""
+    """Export de l'historique des prix d'un produit (CSV ou JSON Lines, en flux)"""
     try:
-        # ✅ Vérifier que le produit existe avec votre fonction
         product = get_product_by_id(product_id)
         if not product:
             flash('Produit introuvable.', 'error')
             return redirect(url_for('main.products'))
 
-        # ✅ Récupérer l'historique avec votre fonction
-        price_history = get_price_history(product_id, limit=1000)  # Plus de données pour export
+        try:
+            options = _export_options()
+        except ValueError as e:
+            flash(f'Export impossible : {e}', 'error')
+            return redirect(url_for('main.price_history', product_id=product_id))
 
-        if not price_history:
+        records = iter_price_history(product_id, shop=options['shop'],
+                                     since=options['since'], until=options['until'])
+
+        # Premier relevé lu avant de répondre : pas de fichier vide
+        first = next(records, None)
+        if first is None:
             flash('Aucune donnée à exporter pour ce produit.', 'warning')
             return redirect(url_for('main.price_history', product_id=product_id))
 
-        # ✅ Créer le CSV en mémoire
-        output = StringIO()
-        writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-
-        # En-têtes CSV
-        writer.writerow([
-            'Date et heure',
-            'Boutique',
-            'Prix',
-            'Devise',
-            'Disponible',
-            'URL',
-            'Message d\'erreur'
-        ])
-
-        # ✅ Écrire les données (adaptées à vos dictionnaires)
-        for record in price_history:
-            writer.writerow([
-                record.get('scraped_at', '').replace('T', ' ')[:19] if record.get('scraped_at') else '',
-                record.get('shop_name', ''),
-                f"{record['price']:.2f}" if record.get('price') is not None else '',
-                record.get('currency', 'EUR'),
-                'Oui' if record.get('is_available') else 'Non',
-                record.get('url', ''),
-                record.get('error_message', '')
-            ])
-
-        # ✅ Préparer le fichier pour téléchargement
-        output.seek(0)
-
-        # Nom de fichier sécurisé
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        product_name = product.get('name', 'produit').replace(' ', '_')
-        # Nettoyer le nom pour éviter les caractères problématiques
-        safe_name = "".join(c for c in product_name if c.isalnum() or c in ('_', '-')).rstrip()
-        filename = f"historique_prix_{safe_name}_{timestamp}.csv"
-
-        # ✅ Créer la réponse HTTP avec headers corrects
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-
-        logger.info(f"Export CSV généré pour produit {product_id}: {len(price_history)} enregistrements")
-        return response
+        return _export_response(chain([first], records), product.get('name', 'produit'), options)
 
     except Exception as e:
-        logger.error(f"Erreur export CSV produit {product_id}: {str(e)}")
-        import traceback
-        traceback.print_exc()  # Debug complet
-        flash('Erreur lors de l\'export CSV.', 'error')
+        logger.error(f"Erreur export produit {product_id}: {str(e)}")
+        flash('Erreur lors de l\'export.', 'error')
         return redirect(url_for('main.price_history', product_id=product_id))
 
+@main.route('/history/export')
+def export_catalogue_history():
+    """Export de l'historique des prix de tout le catalogue (CSV ou JSON Lines, en flux)"""
+    try:
+        try:
+            options = _export_options()
+        except ValueError as e:
+            flash(f'Export impossible : {e}', 'error')
+            return redirect(url_for('main.products'))
+
+        records = iter_price_history(shop=options['shop'], since=options['since'], until=options['until'])
+
+        first = next(records, None)
+        if first is None:
+            flash('Aucune donnée à exporter.', 'warning')
+            return redirect(url_for('main.products'))
+
+        return _export_response(chain([first], records), 'catalogue', options, with_product=True)
+
+    except Exception as e:
+        logger.error(f"Erreur export du catalogue: {str(e)}")
+        flash('Erreur lors de l\'export.', 'error')
+        return redirect(url_for('main.products'))
+
 @main.route('/product/<int:product_id>/history')
 def price_history(product_id):
     """Page d'historique des prix"""
@@ -695,19 +949,17 @@ def price_history_chart_data(product_id):
     try:
 
         days = request.args.get('days', 30, type=int)
-        shop_filter = request.args.get('shop', None)
 
-        chart_data = get_price_history_for_chart(product_id, days)
+        # Boutique filtrée en SQL, séries décimées (voir get_price_history_for_chart)
+        options = chart_options()
+        etag, not_modified = product_etag(product_id, days, history_window(days, get_chart_resolution(days)),
+                                          options)
+        if not_modified:
+            return not_modified
 
-        # Filtrer par boutique si nécessaire
-        if shop_filter and shop_filter != 'all':
-            filtered_datasets = []
-            for dataset in chart_data.get('datasets', []):
-                if dataset.get('label') == shop_filter:
-                    filtered_datasets.append(dataset)
-            chart_data['datasets'] = filtered_datasets
+        chart_data = get_price_history_for_chart(product_id, days, **options)
 
-        return jsonify(chart_data)
+        return with_etag(jsonify(chart_data), etag)
 
     except Exception as e:
         logger.error(f"Erreur données graphique produit {product_id}: {e}")
@@ -715,47 +967,26 @@ def price_history_chart_data(product_id):
 
 @main.route('/products')
 def products():
-    """Liste tous les produits avec leurs informations de prix enrichies"""
+    """Liste paginée des produits avec leur meilleur prix, boutiques disponibles et prix récents"""
     try:
-        products = get_all_products()
-
-        # 🎯 ENRICHIR CHAQUE PRODUIT AVEC SES DONNÉES DE PRIX
-        for product in products:
-            try:
-                # Récupérer les données de prix pour ce produit
-                price_data = get_latest_prices(product['id'])
-
-                # Ajouter les informations directement au produit
-                if price_data and 'best_price' in price_data:
-                    product['best_price'] = price_data['best_price']
-                else:
-                    product['best_price'] = None
-
-                # Compter les boutiques disponibles
-                if price_data and 'prices' in price_data:
-                    available_prices = [
-                        p for p in price_data['prices']
-                        if p['is_available'] and p['price'] is not None
-                    ]
-                    product['available_shops'] = len(available_prices)
-                    product['has_prices'] = len(price_data['prices']) > 0
-
-                    # Ajouter quelques prix récents pour l'affichage (optionnel)
-                    product['recent_prices'] = available_prices[:3]
-                else:
-                    product['available_shops'] = 0
-                    product['has_prices'] = False
-                    product['recent_prices'] = []
-
-            except Exception as e:
-                logger.warning(f"Erreur récupération prix pour produit {product['id']}: {e}")
-                # Valeurs par défaut en cas d'erreur
-                product['best_price'] = None
-                product['available_shops'] = 0
-                product['has_prices'] = False
-                product['recent_prices'] = []
-
-        return render_template('products.html', products=products)
+        sort = request.args.get('sort', 'created')
+        if sort not in CATALOGUE_SORTS:
+            sort = 'created'
+        order = request.args.get('order') if request.args.get('order') in ('asc', 'desc') else None
+
+        catalogue = get_catalogue(sort=sort, order=order,
+                                  limit=current_app.config.get('CATALOGUE_PAGE_SIZE', 50),
+                                  after=decode_cursor(request.args.get('after')))
+        products = catalogue['products']
+        next_url = None
+        if catalogue['next_cursor']:
+            next_url = url_for('main.products', sort=sort, order=catalogue['order'],
+                               after=encode_cursor(catalogue['next_cursor']))
+
+        return render_template('products.html', products=products,
+                               total=catalogue['total'], sort=sort, order=catalogue['order'],
+                               sort_labels=CATALOGUE_SORT_LABELS, next_url=next_url,
+                               is_first_page=not request.args.get('after'))
 
     except Exception as e:
         logger.error(f"Erreur lors du chargement des produits: {e}")
@@ -771,20 +1002,20 @@ def product_detail(product_id):
             flash('Produit non trouvé', 'error')
             return redirect(url_for('main.products'))
 
-        prices = get_latest_prices(product_id)
+        # Derniers prix et compteurs de scraping en une requête
+        statistics = get_product_statistics(product_id)
         links = get_product_links(product_id)
-
-        stats = get_scraping_stats(product_id)
-        latest_prices = get_latest_prices(product_id)
+        schedules = get_link_schedules([link['id'] for link in links])
 
         return render_template('product_detail.html',
                              product=product,
-                             prices=prices['prices'],
-                             best_price=prices['best_price'],
+                             prices=statistics['prices'],
+                             best_price=statistics['best_price'],
                              links=links,
                              get_product_links=get_product_links,
-                             stats=stats,
-                             latest_prices=latest_prices)
+                             stats=statistics['scraping'],
+                             latest_prices=statistics,
+                             schedules=schedules)
 
     except Exception as e:
         logger.error(f"Erreur chargement produit {product_id}: {e}")
@@ -793,24 +1024,10 @@ def product_detail(product_id):
 
 @main.route('/quick_scrape_product/<int:product_id>', methods=['POST'])
 def products_single_scrape(product_id):
-    """Scraper rapidement un produit et rediriger selon la source"""
+    """Lancer le scraping d'un produit en arrière-plan et revenir à la liste"""
     try:
-
-        results = scrape_all_product_links(product_id)
-
-        successful = [r for r in results if r.get('success', False)]
-        failed = [r for r in results if not r.get('success', False)]
-
-        if successful:
-            flash(f'✅ Prix mis à jour avec succès ! {len(successful)} prix récupérés.', 'success')
-
-        if failed:
-            failed_shops = [r['shop_name'] for r in failed]
-            flash(f'⚠️ Échec(s) pour: {", ".join(failed_shops)}', 'warning')
-
-        if not results:
-            flash('ℹ️ Aucun lien à scraper pour ce produit.', 'info')
-
+        job = submit_scrape_job(product_id)
+        flash_scrape_job(job)
         return redirect(url_for('main.products'))
 
     except Exception as e:
@@ -820,7 +1037,7 @@ def products_single_scrape(product_id):
 
 @main.route('/product/<int:product_id>/quick-scrape', methods=['POST'])
 def quick_scrape_product(product_id):
-    """Scraping rapide depuis la page produit"""
+    """Scraping rapide depuis la page produit (en arrière-plan)"""
 
     try:
         product = get_product_by_id(product_id)
@@ -828,21 +1045,8 @@ def quick_scrape_product(product_id):
             flash('Produit non trouvé.', 'error')
             return redirect(url_for('main.products'))
 
-        results = scrape_all_product_links(product_id)
-
-        successful = [r for r in results if r.get('success', False)]
-        failed = [r for r in results if not r.get('success', False)]
-
-        if successful:
-            flash(f'✅ Prix mis à jour ! {len(successful)} boutique(s) scrapée(s) avec succès.', 'success')
-
-        if failed:
-            failed_shops = [r['shop_name'] for r in failed]
-            flash(f'⚠️ Échec(s) pour: {", ".join(failed_shops)}', 'warning')
-
-        if not results:
-            flash('ℹ️ Aucun lien à scraper pour ce produit.', 'info')
-
+        job = submit_scrape_job(product_id)
+        flash_scrape_job(job)
         return redirect(url_for('main.product_detail', product_id=product_id))
 
     except Exception as e:
@@ -852,91 +1056,33 @@ def quick_scrape_product(product_id):
 
 @main.route('/scrape-all', methods=['POST'])
 def scrape_all_products():
-    """Scraper tous les prix de tous les produits"""
-
-    try:
-        # Récupérer tous les produits qui ont des liens
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        products_with_links = cursor.execute('''
-                                             SELECT DISTINCT p.id, p.name
-                                             FROM products p
-                                                      JOIN product_links pl ON p.id = pl.product_id
-                                             ORDER BY p.name
-                                             ''').fetchall()
-
-        conn.close()
-
-        if not products_with_links:
-            flash('ℹ️ Aucun produit avec des liens à scraper.', 'info')
-            return redirect(url_for('main.products'))
-
-        # Statistiques
-        total_products = len(products_with_links)
-        total_successful = 0
-        total_failed = 0
-        products_processed = []
-
-        # Scraper chaque produit
-        for product in products_with_links:
-            try:
-                results = scrape_all_product_links(product['id'])
-
-                successful = [r for r in results if r.get('success', False)]
-                failed = [r for r in results if not r.get('success', False)]
-
-                total_successful += len(successful)
-                total_failed += len(failed)
+    """Lancer le scraping de tous les produits en arrière-plan"""
 
-                products_processed.append({
-                    'name': product['name'],
-                    'successful': len(successful),
-                    'failed': len(failed)
-                })
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
-            except Exception as e:
-                logger.error(f"Erreur scraping produit {product['id']}: {e}")
-                total_failed += 1
-
-        # Messages de résultats
-        if total_successful > 0:
-            flash(f'✅ Scraping global terminé ! {total_successful} prix récupérés sur {total_products} produit(s).',
-                  'success')
-
-        if total_failed > 0:
-            flash(f'⚠️ {total_failed} échec(s) de scraping détectés.', 'warning')
+    try:
+        job = submit_scrape_job()
 
-        # Log détaillé optionnel
-        logger.info(f"Scraping global: {total_products} produits, {total_successful} succès, {total_failed} échecs")
+        if is_ajax:
+            return jsonify(job_response(job)), 202
 
+        flash_scrape_job(job)
         return redirect(url_for('main.products'))
 
     except Exception as e:
         logger.error(f"Erreur scraping global: {e}")
+        if is_ajax:
+            return jsonify({'success': False, 'error': str(e)}), 500
         flash(f'❌ Erreur lors du scraping global: {str(e)}', 'error')
         return redirect(url_for('main.products'))
 
 @main.route('/product/<int:product_id>/scrape/ajax', methods=['POST'])
 def scrape_product_ajax(product_id):
-    """Scraping AJAX pour un produit (non-bloquant)"""
+    """Scraping AJAX pour un produit (non-bloquant : suivi via /api/jobs/<id>)"""
 
     try:
-        # Lancer le scraping en arrière-plan
-        results = scrape_all_product_links(product_id)
-
-        # Préparer la réponse JSON
-        successful = [r for r in results if r.get('success', False)]
-        failed = [r for r in results if not r.get('success', False)]
-
-        return jsonify({
-            'success': True,
-            'total': len(results),
-            'successful': len(successful),
-            'failed': len(failed),
-            'results': results,
-            'message': f'Scraping terminé: {len(successful)} succès, {len(failed)} échecs'
-        })
+        job = submit_scrape_job(product_id)
+        return jsonify(job_response(job)), 202
 
     except Exception as e:
         logger.error(f"Erreur scraping AJAX produit {product_id}: {e}")
@@ -946,6 +1092,56 @@ def scrape_product_ajax(product_id):
             'message': f'Erreur: {str(e)}'
         }), 500
 
+def job_response(job):
+    """Réponse JSON décrivant un job de scraping"""
+    return {
+        'success': True,
+        'job': job,
+        'job_id': job['id'],
+        'merged': job.get('merged', False),
+        'status_url': url_for('main.api_job_status', job_id=job['id']),
+        'cancel_url': url_for('main.api_job_cancel', job_id=job['id']),
+        'message': ('Scraping déjà en cours, suivi du job existant' if job.get('merged')
+                    else 'Scraping lancé en arrière-plan')
+    }
+
+def flash_scrape_job(job):
+    """Message flash pour un job de scraping mis en file"""
+    if job.get('merged'):
+        flash('ℹ️ Un scraping est déjà en cours pour ces prix, il sera mis à jour sous peu.', 'info')
+    else:
+        flash('🚀 Scraping lancé en arrière-plan, les prix seront mis à jour sous peu.', 'success')
+
+@main.route('/api/jobs/<int:job_id>')
+def api_job_status(job_id):
+    """API : état et avancement d'un job de scraping"""
+    job = get_scrape_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job non trouvé'}), 404
+
+    return jsonify({'success': True, 'job': job})
+
+@main.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def api_job_cancel(job_id):
+    """API : annuler un job de scraping (en file ou en cours)"""
+    job = cancel_scrape_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job non trouvé'}), 404
+
+    return jsonify({'success': True, 'job': job})
+
+@main.app_template_filter('duration')
+def duration_filter(seconds):
+    """Durée lisible d'une fréquence de scraping (ex : 6 h, 3 j)"""
+    if not seconds:
+        return '-'
+    hours = seconds / 3600
+    if hours < 1:
+        return f"{round(seconds / 60)} min"
+    if hours < 48:
+        return f"{hours:.0f} h"
+    return f"{hours / 24:.0f} j"
+
 @main.app_template_filter('shop_color')
 def shop_color_filter(shop_name, alpha=1.0):
     from utils.display_helpers import _get_shop_color
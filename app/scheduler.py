@@ -0,0 +1,210 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Planificateur du scraping automatique (AUTO_UPDATE_*)
+
+À chaque tour, les liens dont la date de scraping est passée sont
+réservés puis scrapés, et leur date suivante est calculée à partir de
+leur fréquence (voir scraping.scheduling), adaptée à la volatilité de
+leur prix quand aucune fréquence n'est imposée au lien. Le planificateur tourne soit
+dans le processus web (AUTO_UPDATE_IN_PROCESS), soit à part :
+
+    python scheduler.py
+"""
+
+import time
+import logging
+import threading
+
+from database.models import (
+    claim_due_links,
+    get_link_volatility,
+    get_unscheduled_links,
+    mark_link_run,
+    schedule_link_runs,
+    scrape_links
+)
+from scraping.scheduling import (
+    HOUR,
+    adaptive_interval,
+    change_rate,
+    first_run_time,
+    interval_for,
+    next_run_time
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeScheduler:
+    """Boucle de scraping périodique des liens arrivés à échéance"""
+
+    def __init__(self, app, tick: float = 60, clock=time.time):
+        """
+        Args:
+            app: Application Flask (configuration et contexte des accès en base)
+            tick: Intervalle entre deux relèves des liens dus (secondes)
+            clock: Horloge epoch (remplaçable pour les tests)
+        """
+        self.app = app
+        self.tick = tick
+        self.clock = clock
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _settings(self):
+        config = self.app.config
+        return {
+            'default_interval': config.get('AUTO_UPDATE_INTERVAL_HOURS', 24) * HOUR,
+            'domain_intervals': config.get('SCRAPING_DOMAIN_INTERVALS'),
+            'window_start_hour': config.get('AUTO_UPDATE_HOUR', 6),
+            'window_hours': config.get('AUTO_UPDATE_WINDOW_HOURS', 6),
+            'adaptive': config.get('AUTO_UPDATE_ADAPTIVE', True),
+            'min_interval': config.get('AUTO_UPDATE_MIN_INTERVAL_HOURS', 1) * HOUR,
+            'max_interval': config.get('AUTO_UPDATE_MAX_INTERVAL_HOURS', 24 * 14) * HOUR,
+            'backoff': config.get('AUTO_UPDATE_BACKOFF', 2.0),
+            'volatility_days': config.get('AUTO_UPDATE_VOLATILITY_DAYS', 30),
+        }
+
+    def _interval(self, link, settings):
+        """Fréquence courante : imposée au lien, sinon adaptative, sinon boutique ou défaut"""
+        if settings['adaptive'] and not link.get('interval_seconds') and link.get('adaptive_interval'):
+            return float(link['adaptive_interval'])
+        return interval_for(link, settings['default_interval'], settings['domain_intervals'])
+
+    def _adapt(self, link, result, volatility, settings):
+        """
+        Nouvel état adaptatif d'un lien après un scraping
+
+        Un scraping en échec n'apporte aucune information : l'état est conservé.
+        """
+        previous = volatility.get(link['id']) or {}
+        unchanged_runs = link.get('unchanged_runs') or 0
+        changes = previous.get('changes') or 0
+        changed = False
+
+        if result.get('price') is not None and previous.get('last_price') is not None:
+            changed = (abs(result['price'] - previous['last_price']) > 0.005
+                       or bool(result.get('is_available', True)) != bool(previous['last_available']))
+            unchanged_runs = 0 if changed else unchanged_runs + 1
+            changes += changed
+
+        rate = change_rate(changes, previous.get('span_seconds') or 0)
+        base = interval_for(link, settings['default_interval'], settings['domain_intervals'])
+        interval = adaptive_interval(base, rate, unchanged_runs, settings['min_interval'],
+                                     settings['max_interval'], settings['backoff'])
+        return {
+            'adaptive_interval': int(interval),
+            'change_rate': round(rate, 4),
+            'unchanged_runs': unchanged_runs,
+            'changed': changed,
+        }
+
+    def schedule_new_links(self) -> int:
+        """Planifier les liens jamais planifiés (ou dont la fréquence a changé)"""
+        settings = self._settings()
+        now = self.clock()
+        links = get_unscheduled_links()
+
+        schedule_link_runs([
+            (link['id'], first_run_time(link['id'], self._interval(link, settings), now,
+                                        settings['window_start_hour'], settings['window_hours']))
+            for link in links
+        ])
+        return len(links)
+
+    def run_once(self) -> dict:
+        """
+        Un tour de planification : planifier les nouveaux liens puis scraper les liens dus
+
+        Returns:
+            dict: scheduled (liens planifiés), due (liens scrapés), succeeded
+        """
+        with self.app.app_context():
+            scheduled = self.schedule_new_links()
+            due = claim_due_links(
+                lease_seconds=self.app.config.get('AUTO_UPDATE_LEASE_SECONDS', 900),
+                limit=self.app.config.get('AUTO_UPDATE_BATCH_SIZE', 500)
+            )
+
+            if not due:
+                return {'scheduled': scheduled, 'due': 0, 'succeeded': 0}
+
+            settings = self._settings()
+            links = {link['id']: link for link in due}
+            volatility = get_link_volatility(list(links), settings['volatility_days']) if settings['adaptive'] else {}
+            logger.info(f"⏰ Scraping planifié de {len(due)} lien(s)")
+
+            def _reschedule(result):
+                link = links[result['link_id']]
+                adaptive = None
+                interval = self._interval(link, settings)
+
+                if settings['adaptive']:
+                    adaptive = self._adapt(link, result, volatility, settings)
+                    if not link.get('interval_seconds'):
+                        interval = adaptive['adaptive_interval']
+
+                mark_link_run(link['id'], next_run_time(link['id'], interval, self.clock(),
+                                                        settings['window_start_hour'], settings['window_hours']),
+                              adaptive)
+
+            results = scrape_links(due, on_progress=_reschedule, cancel=self._stopped)
+            return {
+                'scheduled': scheduled,
+                'due': len(due),
+                'succeeded': sum(1 for result in results if result.get('success'))
+            }
+
+    def run_forever(self):
+        """Boucle principale (thread dédié ou processus séparé)"""
+        logger.info(f"⏰ Planificateur de scraping démarré (relève toutes les {self.tick}s)")
+        while not self._stopped.is_set():
+            if self.app.config.get('AUTO_UPDATE_ENABLED', True):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Erreur du planificateur de scraping: {e}")
+
+            # Maintenance de l'historique entre deux tours, quand elle est due
+            maintenance = self.app.extensions.get('history_maintenance')
+            if maintenance:
+                maintenance.run_if_due(stop=self._stopped)
+
+            self._stopped.wait(self.tick)
+
+    def start(self):
+        """Démarrer la boucle dans un thread du processus courant"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name='scrape-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def init_scheduler(app):
+    """Attacher le planificateur à l'application et le démarrer si configuré dans le processus web"""
+    scheduler = ScrapeScheduler(app, tick=app.config.get('AUTO_UPDATE_TICK_SECONDS', 60))
+    app.extensions['scrape_scheduler'] = scheduler
+
+    if app.config.get('AUTO_UPDATE_ENABLED') and app.config.get('AUTO_UPDATE_IN_PROCESS'):
+        scheduler.start()
+
+    return scheduler
@@ -0,0 +1,269 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Snapshot analytique de l'historique des prix (SNAPSHOT_*)
+
+Les relevés, joints à leur lien et à leur produit, sont copiés dans des
+fichiers en colonnes (Parquet ou Arrow IPC) : les analyses (pyarrow, pandas,
+DuckDB...) lisent ces fichiers plutôt que la base SQLite où écrit le serveur
+web. Produits, boutiques, URL et devises y sont encodés en dictionnaire.
+
+Chaque passe ajoute un fichier part-NNNNNN avec les relevés postérieurs au
+dernier ID exporté (_snapshot.json). Le dernier relevé de chaque lien, qui
+peut encore être prolongé (PRICE_STORAGE_MODE = 'changes'), est mis en
+attente et exporté à la passe suivante une fois clos. Un compactage
+ultérieur peut faire recompter des relevés déjà exportés dans observations :
+--full reconstruit le snapshot.
+
+    python snapshot.py [--output snapshots] [--format parquet|arrow] [--full]
+
+Nécessite pyarrow (optionnel, voir requirements.txt).
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+    import pyarrow.parquet as pq
+except ImportError:  # Optionnel : seul le snapshot en dépend
+    pa = None
+
+from database.models import get_price_history_rows
+
+logger = logging.getLogger(__name__)
+
+# Préfixe « _ » / « . » : ignorés à la lecture du répertoire comme dataset (pyarrow, DuckDB...)
+MANIFEST = '_snapshot.json'
+
+# Format -> extension des fichiers
+SNAPSHOT_FORMATS = {
+    'parquet': 'parquet',
+    'arrow': 'arrow',
+}
+
+DICTIONARY_COLUMNS = ('product_name', 'shop_name', 'url', 'currency')
+
+# Relevés en attente relus par requête
+PENDING_BATCH = 500
+
+
+def snapshot_schema():
+    """Schéma Arrow des fichiers du snapshot"""
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('price_id', pa.int64()),
+        ('product_id', pa.int64()),
+        ('product_name', dictionary),
+        ('product_link_id', pa.int64()),
+        ('shop_name', dictionary),
+        ('url', dictionary),
+        ('price', pa.float64()),
+        ('currency', dictionary),
+        ('is_available', pa.bool_()),
+        ('error_message', pa.string()),
+        ('first_seen_at', pa.timestamp('s')),
+        ('scraped_at', pa.timestamp('s')),
+        ('observations', pa.int32()),
+    ])
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _DictionaryEncoder:
+    """
+    Dictionnaire d'une colonne, partagé par les lots d'un même fichier : chaque
+    lot n'ajoute que des valeurs en fin de dictionnaire (deltas du format Arrow IPC)
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def encode(self, values):
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            position = self.index.get(value)
+            if position is None:
+                position = self.index[value] = len(self.values)
+                self.values.append(value)
+            indices.append(position)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(self.values, pa.string()))
+
+
+class _PartWriter:
+    """Fichier d'une passe, écrit par lots puis renommé une fois complet"""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        self.schema = snapshot_schema()
+        self.encoders = {column: _DictionaryEncoder() for column in DICTIONARY_COLUMNS}
+        self.rows = 0
+
+        if fmt == 'parquet':
+            self._sink = None
+            self._writer = pq.ParquetWriter(self.tmp_path, self.schema, compression='zstd',
+                                            use_dictionary=list(DICTIONARY_COLUMNS))
+        else:
+            self._sink = pa.OSFile(self.tmp_path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, self.schema,
+                                           options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def _record_batch(self, rows):
+        columns = []
+        for field in self.schema:
+            values = [row[field.name] for row in rows]
+            if field.name in self.encoders:
+                columns.append(self.encoders[field.name].encode(values))
+            elif pa.types.is_timestamp(field.type):
+                columns.append(pa.array([_parse_timestamp(value) for value in values], field.type))
+            elif pa.types.is_boolean(field.type):
+                columns.append(pa.array([None if value is None else bool(value) for value in values], field.type))
+            else:
+                columns.append(pa.array(values, field.type))
+        return pa.RecordBatch.from_arrays(columns, schema=self.schema)
+
+    def write(self, rows):
+        batch = self._record_batch(rows)
+        if self._sink is None:
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+        self.rows += len(rows)
+
+    def close(self):
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def _load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'format': None, 'last_id': 0, 'pending': [], 'parts': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST)
+    tmp_path = os.path.join(output_dir, f".{MANIFEST}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_snapshot(app, output_dir=None, fmt=None, batch_rows=None, full=False):
+    """
+    Ajouter au snapshot les relevés clos depuis la passe précédente
+
+    Args:
+        app: Application Flask (configuration et contexte des accès en base)
+        output_dir (str, optional): Répertoire du snapshot (SNAPSHOT_DIR)
+        fmt (str, optional): 'parquet' ou 'arrow' (SNAPSHOT_FORMAT)
+        batch_rows (int, optional): Relevés lus et écrits par lot (SNAPSHOT_BATCH_ROWS)
+        full (bool): Reconstruire le snapshot depuis le premier relevé
+
+    Returns:
+        dict: Compte rendu de la passe (fichier écrit, relevés, relevés en attente, dernier ID)
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow n'est pas installé (pip install pyarrow)")
+
+    output_dir = output_dir or app.config.get('SNAPSHOT_DIR', 'snapshots')
+    fmt = fmt or app.config.get('SNAPSHOT_FORMAT', 'parquet')
+    batch_rows = batch_rows or app.config.get('SNAPSHOT_BATCH_ROWS', 50000)
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Format de snapshot inconnu: {fmt}")
+
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+
+    # Reconstruction complète, ou changement de format : les fichiers précédents sont retirés
+    if full or (manifest['format'] and manifest['format'] != fmt):
+        for part in manifest['parts']:
+            part_path = os.path.join(output_dir, part['file'])
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        manifest = {'format': None, 'last_id': 0, 'pending': [], 'parts': []}
+
+    sequence = manifest['parts'][-1]['sequence'] + 1 if manifest['parts'] else 1
+    filename = f"part-{sequence:06d}.{SNAPSHOT_FORMATS[fmt]}"
+    writer = None
+    pending = []
+    last_id = manifest['last_id']
+
+    def _export(rows):
+        nonlocal writer
+        # Dernier relevé d'un lien : exporté quand un relevé plus récent l'aura clos
+        pending.extend(row['price_id'] for row in rows if row['is_open'])
+        closed = [row for row in rows if not row['is_open']]
+        if closed:
+            writer = writer or _PartWriter(os.path.join(output_dir, filename), fmt)
+            writer.write(closed)
+
+    try:
+        with app.app_context():
+            # Relevés mis en attente à la passe précédente (ceux qui ont disparu sont ignorés)
+            previous = manifest['pending']
+            for offset in range(0, len(previous), PENDING_BATCH):
+                _export(get_price_history_rows(ids=previous[offset:offset + PENDING_BATCH],
+                                               limit=PENDING_BATCH))
+
+            while True:
+                rows = get_price_history_rows(after_id=last_id, limit=batch_rows)
+                if not rows:
+                    break
+                _export(rows)
+                last_id = rows[-1]['price_id']
+    except Exception:
+        if writer is not None:
+            writer.close()
+            os.remove(writer.path)
+        raise
+
+    report = {'file': None, 'rows': 0, 'pending': len(pending), 'last_id': last_id}
+    if writer is not None:
+        writer.close()
+        report.update(file=filename, rows=writer.rows)
+        manifest['parts'].append({'sequence': sequence, 'file': filename, 'rows': writer.rows,
+                                  'created_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())})
+
+    manifest.update(format=fmt, last_id=last_id, pending=pending)
+    _save_manifest(output_dir, manifest)
+
+    report['duration_ms'] = int((time.perf_counter() - start) * 1000)
+    logger.info(f"📦 Snapshot {fmt} : {report['rows']} relevé(s) ajouté(s) "
+                f"({report['pending']} en attente, jusqu'à l'ID {last_id}) en {report['duration_ms']} ms")
+    return report
@@ -0,0 +1,200 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark des requêtes sur l'historique des prix, sans / avec index couvrants
+
+Génère une base de test avec un historique volumineux réparti sur
+l'année, mesure la latence des requêtes de lecture des prix sans les
+index de l'historique, recrée ces index (migration 2) puis mesure à
+nouveau. Les derniers prix (link_latest_price) sont tenus à jour par
+triggers pendant la génération, comme en production.
+
+Usage:
+    python benchmarks/bench_history_indexes.py                  # 10 millions de relevés
+    python benchmarks/bench_history_indexes.py --rows 1000000 --samples-before 5
+    python benchmarks/bench_history_indexes.py --db bench.db --keep   # Conserver la base
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from database.migrations import MIGRATIONS  # noqa: E402
+from database.models import (  # noqa: E402
+    get_catalogue_latest_prices,
+    get_db_connection,
+    get_latest_prices,
+    get_price_alerts_data,
+    get_price_history_data,
+    get_price_history_for_chart,
+    get_price_statistics,
+    init_db
+)
+
+QUERIES = {
+    'get_latest_prices': get_latest_prices,
+    'get_price_statistics': get_price_statistics,
+    'get_price_history_for_chart': get_price_history_for_chart,
+    'get_price_history_data': get_price_history_data,
+    'get_price_alerts_data': get_price_alerts_data,
+    'get_catalogue_latest_prices': lambda product_id: get_catalogue_latest_prices(),
+}
+
+# Migration des index couvrants de l'historique, et index qu'elle crée
+INDEX_MIGRATION = 2
+HISTORY_INDEXES = ('idx_price_history_link_scraped', 'idx_product_links_product')
+
+BATCH_ROWS = 1_000_000
+
+
+def populate(args):
+    """Produits, liens et relevés de prix (générés par SQLite, entrelacés dans le temps)"""
+    links = args.products * args.links_per_product
+    scrapes_per_link = max(1, args.rows // links)
+    step = args.days * 86400 / scrapes_per_link
+    start = int(time.time()) - args.days * 86400
+
+    conn = get_db_connection()
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+
+    conn.executemany('INSERT INTO products (id, name) VALUES (?, ?)',
+                     [(i, f'Produit {i}') for i in range(1, args.products + 1)])
+    conn.executemany('INSERT INTO product_links (id, product_id, shop_name, url) VALUES (?, ?, ?, ?)',
+                     [(link, (link - 1) // args.links_per_product + 1, f'Boutique {(link - 1) % args.links_per_product}',
+                       f'https://boutique{(link - 1) % args.links_per_product}.fr/p/{link}')
+                      for link in range(1, links + 1)])
+    conn.commit()
+
+    # Prix propre au lien, modifié tous les 30 relevés ; ~2 % d'échecs, ~5 % d'indisponibilités
+    for offset in range(0, args.rows, BATCH_ROWS):
+        count = min(BATCH_ROWS, args.rows - offset)
+        conn.execute('''
+            WITH RECURSIVE seq(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM seq WHERE i < ?)
+            INSERT INTO price_history (product_link_id, price, currency, is_available, scraped_at, error_message)
+            SELECT link_id,
+                   CASE WHEN failed THEN NULL ELSE 10 + (link_id * 37) % 990 + (run / 30) % 7 END,
+                   'EUR',
+                   abs(random()) % 20 != 0,
+                   datetime(? + run * ?, 'unixepoch'),
+                   CASE WHEN failed THEN 'Prix non trouvé' END
+            FROM (SELECT i % ? + 1 AS link_id, i / ? AS run, abs(random()) % 50 = 0 AS failed FROM seq)
+        ''', (offset, offset + count - 1, start, step, links, links))
+        conn.commit()
+        print(f"  {offset + count:>12,} relevés", end='\r', flush=True)
+
+    conn.close()
+    print()
+
+
+def drop_indexes():
+    """Retirer les index de l'historique (état d'une base antérieure aux migrations)"""
+    conn = get_db_connection()
+    for index in HISTORY_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {index}')
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+
+
+def create_indexes():
+    """Rejouer les requêtes de la migration des index"""
+    statements = {version: migration for version, _, migration in MIGRATIONS}[INDEX_MIGRATION]
+    conn = get_db_connection()
+    for statement in statements:
+        conn.execute(statement)
+    conn.execute('PRAGMA analysis_limit = 1000')
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+
+
+def measure(products, samples):
+    """Latences (ms) de chaque requête sur un échantillon de produits"""
+    results = {}
+    for name, query in QUERIES.items():
+        timings = []
+        for product_id in random.Random(name).sample(range(1, products + 1), min(samples, products)):
+            start = time.perf_counter()
+            query(product_id)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'median': statistics.median(timings),
+            'max': max(timings),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000, help='Nombre de relevés de prix')
+    parser.add_argument('--products', type=int, default=2000, help='Nombre de produits')
+    parser.add_argument('--links-per-product', type=int, default=5, help='Liens par produit')
+    parser.add_argument('--days', type=int, default=365, help="Période couverte par l'historique (jours)")
+    parser.add_argument('--samples-before', type=int, default=3, help='Produits mesurés sans index (lent)')
+    parser.add_argument('--samples-after', type=int, default=50, help='Produits mesurés avec index')
+    parser.add_argument('--db', help='Chemin de la base générée (défaut : fichier temporaire)')
+    parser.add_argument('--keep', action='store_true', help='Conserver la base générée')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix='pricechecker-bench-'), 'bench.db')
+    if os.path.exists(path):
+        sys.exit(f"{path} existe déjà")
+
+    app = Flask(__name__)
+    app.config['DATABASE_PATH'] = path
+
+    with app.app_context():
+        print(f"Génération de {args.rows:,} relevés ({args.products} produits × {args.links_per_product} liens)")
+        init_db()
+        drop_indexes()
+        start = time.perf_counter()
+        populate(args)
+        print(f"Base générée en {time.perf_counter() - start:.0f}s ({os.path.getsize(path) / 1024 ** 2:.0f} Mo)")
+
+        before = measure(args.products, args.samples_before)
+
+        start = time.perf_counter()
+        create_indexes()
+        print(f"Index créés en {time.perf_counter() - start:.1f}s ({os.path.getsize(path) / 1024 ** 2:.0f} Mo)")
+
+        after = measure(args.products, args.samples_after)
+
+    print(f"\n{'Requête':<30} {'Sans (ms)':>12} {'Avec (ms)':>12} {'Avec max':>10} {'Gain':>8}")
+    for name in QUERIES:
+        gain = before[name]['median'] / max(after[name]['median'], 1e-6)
+        print(f"{name:<30} {before[name]['median']:12.1f} {after[name]['median']:12.2f} "
+              f"{after[name]['max']:10.2f} {gain:7.0f}x")
+
+    if args.keep:
+        print(f"\nBase conservée : {path}")
+    else:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark des backends de parsing HTML
+
+Compare, pour chaque backend installé, le temps d'extraction du prix et
+le pic mémoire (mesuré dans un sous-processus dédié), en parsing complet
+et avec le pré-scan en flux, ainsi que la lecture des seules données
+structurées (JSON-LD / meta, sans DOM).
+
+Le corpus est soit un dossier de pages boutiques enregistrées (*.html,
+le prix étant recherché avec --selector), soit un corpus synthétique
+de pages produit volumineuses (menus, avis, produits similaires).
+
+Usage:
+    python benchmarks/bench_parsers.py --pages 20 --size 500
+    python benchmarks/bench_parsers.py --corpus pages/ --selector .price
+    python benchmarks/bench_parsers.py --save pages/   # Enregistrer le corpus synthétique
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import resource
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraping.parsers import CHUNK_SIZE, available_backends, parse_html, prescan, selector_pattern  # noqa: E402
+from scraping.price_scraper import PriceScraper  # noqa: E402
+from scraping.structured_data import extract_structured_price  # noqa: E402
+
+# Extraction JSON-LD / meta sans DOM, comparée aux backends
+STRUCTURED = 'json-ld/meta'
+
+
+def build_page(index, size_kb):
+    """Page produit synthétique d'environ `size_kb` Ko, prix dans le premier tiers"""
+    rng = random.Random(index)
+    menu = ''.join(f'<li class="nav-item"><a href="/c/{i}">Catégorie {i}</a></li>' for i in range(200))
+    price = f"{rng.randint(10, 999)},{rng.randint(0, 99):02d} €"
+
+    def filler(count):
+        return ''.join(
+            f'<div class="review"><span class="author">Client {i}</span>'
+            f'<p class="text">{"Très bon produit, livraison rapide. " * rng.randint(2, 6)}</p>'
+            f'<span class="amount">Remise {rng.randint(1, 30)},00 €</span></div>'
+            for i in range(count)
+        )
+
+    offer = {'@context': 'https://schema.org', '@type': 'Product', 'name': f'Produit {index}',
+             'offers': {'@type': 'Offer', 'price': price.replace(',', '.').rstrip(' €'), 'priceCurrency': 'EUR',
+                        'availability': 'https://schema.org/InStock'}}
+    head = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Produit</title>'
+        + '<script>var data = ' + json.dumps(['x' * 64] * 40) + ';</script>'
+        + '<script type="application/ld+json">' + json.dumps(offer) + '</script></head><body>'
+        + f'<nav><ul>{menu}</ul></nav><main><h1>Produit {index}</h1>'
+    )
+    body = filler(20) + f'<div class="price-box"><span class="price">{price}</span></div>'
+
+    page = head + body
+    target = size_kb * 1024
+    tail = []
+    while len(page) + sum(map(len, tail)) < target:
+        tail.append(filler(10))
+    return (page + ''.join(tail) + '</main></body></html>').encode('utf-8')
+
+
+def load_corpus(args):
+    """Pages du dossier --corpus, ou corpus synthétique"""
+    if args.corpus:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.corpus, '*.html'))):
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+        return pages
+
+    return [build_page(i, args.size) for i in range(args.pages)]
+
+
+def extract(scraper, content, backend, selector, streaming):
+    """Extraire le prix d'une page, comme le scraper en mode requests"""
+    if backend == STRUCTURED:
+        if streaming:
+            chunks = (content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE))
+            content = prescan(chunks, structured=True)[0]
+        info = extract_structured_price(content)
+        return info and info['price'], len(content)
+
+    if streaming:
+        chunks = (content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE))
+        prefix, region, rest = prescan(chunks, selector_pattern(selector))
+        if region:
+            info = scraper._extract_from_prefix(parse_html(prefix, backend), selector)
+            if info:
+                return info['price'], len(prefix)
+        content = prefix + b''.join(rest)
+
+    soup = parse_html(content, backend)
+    return scraper._extract_price_from_soup(soup, selector, 'bench')['price'], len(content)
+
+
+def measure(args, backend, streaming):
+    """Mesure dans le processus courant (appelé par le sous-processus)"""
+    pages = load_corpus(args)
+    scraper = PriceScraper(parser=None if backend == STRUCTURED else backend)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    found = 0
+    parsed = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for content in pages:
+            price, size = extract(scraper, content, backend, args.selector, streaming)
+            found += price is not None
+            parsed += size
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'ms_per_page': elapsed * 1000 / (len(pages) * args.repeat),
+        'peak_mb': max(0, peak - baseline) / 1024,  # ru_maxrss est en Ko sous Linux
+        'found': found / args.repeat,
+        'parsed_kb': parsed / 1024 / (len(pages) * args.repeat),
+        'pages': len(pages),
+    }
+
+
+def run_isolated(args, backend, streaming):
+    """Lancer la mesure dans un sous-processus pour isoler le pic mémoire"""
+    command = [sys.executable, os.path.abspath(__file__), '--measure', backend,
+               '--pages', str(args.pages), '--size', str(args.size),
+               '--repeat', str(args.repeat), '--selector', args.selector]
+    if args.corpus:
+        command += ['--corpus', args.corpus]
+    if streaming:
+        command.append('--streaming')
+
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='Dossier de pages boutiques enregistrées (*.html)')
+    parser.add_argument('--save', help='Enregistrer le corpus synthétique dans ce dossier')
+    parser.add_argument('--pages', type=int, default=20, help='Nombre de pages synthétiques')
+    parser.add_argument('--size', type=int, default=500, help='Taille des pages synthétiques (Ko)')
+    parser.add_argument('--repeat', type=int, default=3, help='Nombre de passes sur le corpus')
+    parser.add_argument('--selector', default='.price', help='Sélecteur CSS du prix')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--streaming', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args, args.measure, args.streaming)))
+        return
+
+    if args.save:
+        os.makedirs(args.save, exist_ok=True)
+        for i, content in enumerate(load_corpus(args)):
+            with open(os.path.join(args.save, f'page_{i:03d}.html'), 'wb') as f:
+                f.write(content)
+        print(f"Corpus enregistré dans {args.save}")
+        return
+
+    pages = load_corpus(args)
+    if not pages:
+        sys.exit(f"Aucune page *.html dans {args.corpus}")
+    average_kb = sum(map(len, pages)) / len(pages) / 1024
+    print(f"{len(pages)} pages, {average_kb:.0f} Ko en moyenne, sélecteur '{args.selector}'")
+    print(f"{'Backend':<14} {'Mode':<10} {'ms/page':>9} {'Ko parsés':>10} {'Pic Mo':>8} {'Prix':>6}")
+
+    for backend in available_backends() + [STRUCTURED]:
+        for streaming in (False, True):
+            stats = run_isolated(args, backend, streaming)
+            mode = 'pré-scan' if streaming else 'complet'
+            print(f"{backend:<14} {mode:<10} {stats['ms_per_page']:9.2f} {stats['parsed_kb']:10.0f} "
+                  f"{stats['peak_mb']:8.1f} {stats['found']:4.0f}/{stats['pages']}")
+
+
+if __name__ == '__main__':
+    main()
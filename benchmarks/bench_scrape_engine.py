@@ -0,0 +1,128 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark du moteur de scraping concurrent
+
+Un serveur HTTP local simule plusieurs boutiques : chaque boutique est
+une adresse de loopback différente (127.0.0.1, 127.0.0.2, ...) afin que
+le plafond par domaine s'applique comme en production.
+
+Usage:
+    python benchmarks/bench_scrape_engine.py --links 200 --shops 10 --latency 0.05
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraping.engine import ScrapeEngine, get_link_domain  # noqa: E402
+
+
+class ShopHandler(BaseHTTPRequestHandler):
+    """Page produit minimale avec un prix, servie après une latence simulée"""
+
+    latency = 0.05
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        price = f"{random.randint(10, 999)},{random.randint(0, 99):02d} €"
+        body = (
+            '<html><head><title>Produit</title></head><body>'
+            f'<h1>Produit {self.path}</h1><span class="price">{price}</span>'
+            '</body></html>'
+        ).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(latency):
+    """Démarrer le serveur local dans un thread et retourner son port"""
+    ShopHandler.latency = latency
+    server = ThreadingHTTPServer(('0.0.0.0', 0), ShopHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_links(port, count, shops):
+    """Répartir les liens sur les boutiques simulées"""
+    return [
+        {
+            'id': i,
+            'shop_name': f'Boutique {i % shops + 1}',
+            'url': f'http://127.0.0.{i % shops + 1}:{port}/produit/{i}',
+            'css_selector': '.price',
+        }
+        for i in range(count)
+    ]
+
+
+def run(label, engine, links):
+    start = time.perf_counter()
+    results = engine.run(links)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in results if r.get('success'))
+    print(f"{label:<28} {elapsed:8.2f} s  {len(links) / elapsed:8.1f} liens/s  ({ok}/{len(links)} prix)")
+    rates = [stats['requests_per_second'] for stats in engine.domain_stats.values()]
+    if rates:
+        print(f"{'':<28} débit par domaine: min {min(rates):.1f}, max {max(rates):.1f} req/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, default=200, help='Nombre de liens à scraper')
+    parser.add_argument('--shops', type=int, default=10, help='Nombre de boutiques simulées')
+    parser.add_argument('--latency', type=float, default=0.05, help='Latence serveur par page (s)')
+    parser.add_argument('--delay', type=float, default=0.1, help='Délai anti-spam par domaine (s)')
+    parser.add_argument('--workers', type=int, default=16, help='Plafond global de concurrence')
+    parser.add_argument('--per-domain', type=int, default=1, help='Plafond de concurrence par domaine')
+    args = parser.parse_args()
+
+    server = start_server(args.latency)
+    port = server.server_address[1]
+    links = build_links(port, args.links, args.shops)
+    domains = {get_link_domain(link['url']) for link in links}
+
+    print(f"{len(links)} liens, {len(domains)} domaines, latence {args.latency}s, délai {args.delay}s")
+
+    try:
+        sequential = run('Séquentiel (1 worker)', ScrapeEngine(1, 1, args.delay), links)
+        concurrent = run(f'Concurrent ({args.workers} workers)',
+                         ScrapeEngine(args.workers, args.per_domain, args.delay), links)
+        print(f"Accélération: x{sequential / concurrent:.1f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
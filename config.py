@@ -29,19 +29,93 @@ class Config:
     TIMEOUT = int(os.environ.get('TIMEOUT', '30'))
     USER_AGENT = os.environ.get('USER_AGENT', 'PriceChecker/2.4.2')
 
+    # Scraping concurrent
+    SCRAPING_MAX_WORKERS = int(os.environ.get('SCRAPING_MAX_WORKERS', '8'))         # Plafond global
+    SCRAPING_MAX_PER_DOMAIN = int(os.environ.get('SCRAPING_MAX_PER_DOMAIN', '1'))   # Plafond par boutique
+
+    # Délais anti-spam par boutique (secondes), prioritaires sur SCRAPING_DELAY
+    # Exemple : {'amazon.fr': 5, 'fnac.com': 3}
+    SCRAPING_DOMAIN_DELAYS = {}
+
+    # Pool de navigateurs Selenium (repli pour les pages dynamiques)
+    SELENIUM_BROWSER = os.environ.get('SELENIUM_BROWSER', 'chrome')             # chrome ou firefox
+    SELENIUM_POOL_SIZE = int(os.environ.get('SELENIUM_POOL_SIZE', '2'))         # Navigateurs simultanés
+    SELENIUM_WARM_SIZE = int(os.environ.get('SELENIUM_WARM_SIZE', '1'))         # Navigateurs démarrés avec l'application et gardés prêts
+    SELENIUM_MAX_PAGES = int(os.environ.get('SELENIUM_MAX_PAGES', '50'))        # Recyclage après N pages
+    SELENIUM_MAX_MEMORY_MB = int(os.environ.get('SELENIUM_MAX_MEMORY_MB', '0')) or None  # Recyclage mémoire (psutil)
+    SELENIUM_MAX_MEMORY_GROWTH_MB = int(os.environ.get('SELENIUM_MAX_MEMORY_GROWTH_MB', '500')) or None  # Recyclage sur croissance depuis le démarrage (psutil)
+
+    # Parser HTML : auto (le plus rapide installé), selectolax, lxml ou html.parser
+    HTML_PARSER = os.environ.get('HTML_PARSER', 'auto')
+
+    # Jobs de scraping en arrière-plan
+    SCRAPE_JOB_WORKERS = int(os.environ.get('SCRAPE_JOB_WORKERS', '1'))                  # Jobs simultanés
+    SCRAPE_JOB_POLL_INTERVAL = float(os.environ.get('SCRAPE_JOB_POLL_INTERVAL', '2'))    # Relève de la file (s)
+    SCRAPE_JOBS_AUTOSTART = True                                                         # Workers démarrés au premier job
+
     # Optimisations SQLite
     SQLITE_PRAGMAS = {
+        'auto_vacuum': 'INCREMENTAL',  # Espace libéré rendu par incremental_vacuum (nouvelles bases)
         'journal_mode': 'WAL',      # Write-Ahead Logging
         'cache_size': -32000,       # Cache 32MB
         'synchronous': 'NORMAL',    # Performance/sécurité équilibrée
         'temp_store': 'MEMORY',     # Tables temporaires en RAM
         'mmap_size': 268435456,     # Memory-mapped I/O (256MB)
     }
+    SQLITE_POOL_SIZE = 4                # Connexions inactives conservées par base
+    SQLITE_STATEMENT_CACHE_SIZE = 256   # Requêtes préparées en cache par connexion
+    PRICE_WRITER_ENABLED = True         # Relevés de prix écrits par lots (thread d'écriture unique)
+    PRICE_WRITER_BATCH_SIZE = int(os.environ.get('PRICE_WRITER_BATCH_SIZE', '200'))          # Relevés par transaction
+    PRICE_WRITER_FLUSH_INTERVAL = float(os.environ.get('PRICE_WRITER_FLUSH_INTERVAL', '1'))  # Écriture d'un lot incomplet (s)
+    PRICE_WRITER_FLUSH_TIMEOUT = float(os.environ.get('PRICE_WRITER_FLUSH_TIMEOUT', '30'))   # Attente des relevés par un scraping (s)
+    # every : une ligne par relevé ; changes : une ligne par changement (prix, devise, disponibilité),
+    # un relevé identique prolonge la ligne précédente (scraped_at, observations)
+    PRICE_STORAGE_MODE = os.environ.get('PRICE_STORAGE_MODE', 'every')
+
+    # Cache des lectures par produit (graphiques, statistiques, derniers prix), invalidé à chaque écriture
+    QUERY_CACHE_ENABLED = os.environ.get('QUERY_CACHE_ENABLED', 'True').lower() == 'true'
+    QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', '1024'))  # Entrées (LRU)
+    QUERY_CACHE_TTL = int(os.environ.get('QUERY_CACHE_TTL', '60'))                   # Écritures d'un autre processus visibles après (s)
+
+    # Snapshot analytique (python snapshot.py, nécessite pyarrow)
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'snapshots')              # Répertoire des fichiers
+    SNAPSHOT_FORMAT = os.environ.get('SNAPSHOT_FORMAT', 'parquet')          # parquet ou arrow
+    SNAPSHOT_BATCH_ROWS = int(os.environ.get('SNAPSHOT_BATCH_ROWS', '50000'))  # Relevés par lot
     
     # Fonctionnalités métier
     PRICE_HISTORY_DAYS = 30
-    AUTO_UPDATE_ENABLED = True
-    AUTO_UPDATE_HOUR = 6
+    CHART_MAX_POINTS = 400                                                               # Points par boutique au plus (graphiques, stats)
+    CHART_SOURCE_MAX_POINTS = 400                                                        # Points lus par boutique avant décimation (1000 : l'heure jusqu'à 30 jours)
+    CATALOGUE_PAGE_SIZE = 50                                                             # Produits par page de la liste
+    AUTO_UPDATE_ENABLED = os.environ.get('AUTO_UPDATE_ENABLED', 'True').lower() == 'true'
+    AUTO_UPDATE_HOUR = int(os.environ.get('AUTO_UPDATE_HOUR', '6'))                      # Début de la fenêtre quotidienne
+    AUTO_UPDATE_WINDOW_HOURS = float(os.environ.get('AUTO_UPDATE_WINDOW_HOURS', '6'))    # Étalement des liens quotidiens
+    AUTO_UPDATE_INTERVAL_HOURS = float(os.environ.get('AUTO_UPDATE_INTERVAL_HOURS', '24'))  # Fréquence par défaut
+    AUTO_UPDATE_IN_PROCESS = os.environ.get('AUTO_UPDATE_IN_PROCESS', 'False').lower() == 'true'  # Sinon : python scheduler.py
+    AUTO_UPDATE_TICK_SECONDS = 60                                                        # Relève des liens dus
+    AUTO_UPDATE_BATCH_SIZE = 500                                                         # Liens par tour
+    AUTO_UPDATE_LEASE_SECONDS = 900                                                      # Réservation d'un lien en cours
+
+    # Fréquence adaptative : plus fréquente pour les prix volatils, recul exponentiel pour les prix stables
+    AUTO_UPDATE_ADAPTIVE = os.environ.get('AUTO_UPDATE_ADAPTIVE', 'True').lower() == 'true'
+    AUTO_UPDATE_MIN_INTERVAL_HOURS = float(os.environ.get('AUTO_UPDATE_MIN_INTERVAL_HOURS', '1'))     # Plancher
+    AUTO_UPDATE_MAX_INTERVAL_HOURS = float(os.environ.get('AUTO_UPDATE_MAX_INTERVAL_HOURS', '336'))   # Plafond (14 jours)
+    AUTO_UPDATE_BACKOFF = 2.0                                                            # Facteur par scraping sans changement
+    AUTO_UPDATE_VOLATILITY_DAYS = 30                                                     # Fenêtre d'estimation de la volatilité
+
+    # Maintenance de l'historique des prix (lancée par le planificateur)
+    MAINTENANCE_ENABLED = os.environ.get('MAINTENANCE_ENABLED', 'True').lower() == 'true'
+    MAINTENANCE_INTERVAL_HOURS = int(os.environ.get('MAINTENANCE_INTERVAL_HOURS', '24'))             # Entre deux passes
+    MAINTENANCE_ERROR_RETENTION_DAYS = int(os.environ.get('MAINTENANCE_ERROR_RETENTION_DAYS', '30')) # Relevés en échec conservés (0 : tous)
+    MAINTENANCE_FULL_VACUUM_DAYS = int(os.environ.get('MAINTENANCE_FULL_VACUUM_DAYS', '30'))         # VACUUM complet (0 : jamais)
+    MAINTENANCE_BATCH_LINKS = 50                                                         # Liens compactés par transaction
+    MAINTENANCE_BATCH_ROWS = 5000                                                        # Relevés relus au plus par lien et par transaction
+    MAINTENANCE_BATCH_PAUSE = 0.05                                                       # Pause entre deux lots (s)
+    MAINTENANCE_VACUUM_PAGES = 1000                                                      # Pages rendues par étape d'incremental_vacuum
+
+    # Fréquences de scraping par boutique (heures), prioritaires sur AUTO_UPDATE_INTERVAL_HOURS
+    # Exemple : {'amazon.fr': 1, 'boutique-stable.fr': 72}
+    SCRAPING_DOMAIN_INTERVALS = {}
 
 @property
 def SCRAPING_CONFIG(self):
@@ -67,8 +141,18 @@ class ProductionConfig(Config):
         'optimize': True,           # Optimiser à la fermeture
     }
 
+class TestingConfig(Config):
+    TESTING = True
+    DEBUG = False
+    SECRET_KEY = 'test-secret-key'
+    SELENIUM_WARM_SIZE = 0      # Pas de navigateur démarré par les tests
+    # Base fichier fournie par les tests (create_app(..., overrides)) : une base
+    # ':memory:' serait vide pour chaque connexion du pool
+    AUTO_UPDATE_IN_PROCESS = False
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
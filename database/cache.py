@@ -0,0 +1,224 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Cache des lectures par produit de database.models
+
+Les fonctions décorées par @cached (graphiques, statistiques, derniers
+prix...) gardent leur résultat en mémoire, par produit et paramètres : au
+plus QUERY_CACHE_MAX_ENTRIES entrées (les moins récemment lues sont
+évincées), chacune QUERY_CACHE_TTL secondes au plus.
+
+Les écritures de l'application (relevés de prix, y compris par le thread
+d'écriture, produits, liens, maintenance) invalident les entrées des seuls
+produits concernés. Celles d'un autre processus (scheduler.py) sont vues à
+l'expiration du TTL, ou dès qu'une route vérifie la version du produit
+(validate, voir les ETag des routes JSON).
+
+Les valeurs renvoyées sont partagées entre appels : ne pas les modifier.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from database.connection import DEFAULT_DATABASE_PATH
+
+
+class QueryCache:
+    """Résultats de lectures par produit : LRU borné, expiration, invalidation par produit"""
+
+    def __init__(self, max_entries=1024, ttl=60, clock=time.monotonic):
+        """
+        Args:
+            max_entries: Entrées conservées au plus (éviction des moins récemment lues)
+            ttl: Durée de vie d'une entrée en secondes (0 : jusqu'à invalidation)
+            clock: Horloge monotone (remplaçable pour les tests)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()   # clé -> (expiration, product_id, valeur)
+        self._products = {}             # product_id -> clés en cache
+        self._versions = {}             # product_id -> dernière version validée
+        # Incrémenté à chaque invalidation : un calcul commencé avant n'est pas conservé
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get_or_compute(self, key, product_id, compute):
+        """
+        Valeur en cache de `key`, sinon compute() (conservée si aucune écriture n'a eu lieu entre-temps)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self.ttl or entry[0] > self.clock():
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[2]
+                self._discard(key)
+                self._stats['expired'] += 1
+            self._stats['misses'] += 1
+            generation = self._generation
+
+        value = compute()
+
+        with self._lock:
+            if generation == self._generation:
+                self._discard(key)
+                self._entries[key] = (self.clock() + (self.ttl or 0), product_id, value)
+                self._products.setdefault(product_id, set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    self._discard(next(iter(self._entries)))
+                    self._stats['evictions'] += 1
+        return value
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._products.get(entry[1])
+            keys.discard(key)
+            if not keys:
+                del self._products[entry[1]]
+
+    def invalidate(self, product_ids=None):
+        """Oublier les entrées des produits (de tous les produits si None)"""
+        with self._lock:
+            self._generation += 1
+            if product_ids is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for product_id in set(product_ids) for key in self._products.get(product_id, ())]
+            for key in keys:
+                self._discard(key)
+            self._stats['invalidations'] += len(keys)
+
+    def validate(self, product_id, version):
+        """Oublier les entrées du produit si sa version en base a changé depuis la dernière validation"""
+        with self._lock:
+            known = self._versions.get(product_id)
+            self._versions[product_id] = version
+        # Première validation : les entrées peuvent précéder une écriture d'un autre processus
+        if known != version:
+            self.invalidate([product_id])
+
+    def invalidate_links(self, conn, link_ids):
+        """
+        Oublier les entrées des produits de ces liens
+
+        Args:
+            conn: Connexion SQLite (retrouve les produits des liens)
+            link_ids: IDs des liens écrits
+        """
+        link_ids = list(set(link_ids))
+        if not link_ids:
+            return
+        with self._lock:
+            if not self._entries:
+                self._generation += 1
+                return
+
+        product_ids = set()
+        for start in range(0, len(link_ids), 500):
+            chunk = link_ids[start:start + 500]
+            product_ids.update(row[0] for row in conn.execute(
+                f"SELECT DISTINCT product_id FROM product_links WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk))
+        self.invalidate(product_ids)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {**self._stats, 'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'ttl': self.ttl, 'hit_rate': round(self._stats['hits'] / lookups * 100, 1) if lookups else 0}
+
+
+def init_query_cache(app):
+    """Activer le cache des lectures pour l'application (un cache par base)"""
+    app.extensions['query_caches'] = {}
+
+
+def get_query_cache():
+    """
+    Cache de la base de l'application courante
+
+    Returns:
+        QueryCache: None hors application ou si le cache est désactivé
+    """
+    if not current_app or not current_app.config.get('QUERY_CACHE_ENABLED', True):
+        return None
+
+    caches = current_app.extensions.get('query_caches')
+    if caches is None:
+        return None
+
+    path = current_app.config.get('DATABASE_PATH', DEFAULT_DATABASE_PATH)
+    cache = caches.get(path)
+    if cache is None:
+        cache = caches.setdefault(path, QueryCache(
+            max_entries=current_app.config.get('QUERY_CACHE_MAX_ENTRIES', 1024),
+            ttl=current_app.config.get('QUERY_CACHE_TTL', 60)
+        ))
+    return cache
+
+
+def cached(function):
+    """Mettre en cache une fonction de lecture dont le premier argument est l'ID du produit"""
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        cache = get_query_cache()
+        if cache is None:
+            return function(*args, **kwargs)
+
+        # Appels équivalents (positionnels, nommés, valeurs par défaut) : même clé
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple(bound.arguments.values())
+        return cache.get_or_compute((function.__name__, arguments), arguments[0],
+                                    lambda: function(*args, **kwargs))
+
+    return wrapper
+
+
+def invalidate_products(*product_ids):
+    """Oublier les lectures en cache de ces produits"""
+    cache = get_query_cache()
+    if cache is not None:
+        cache.invalidate(product_ids)
+
+
+def invalidate_links(conn, link_ids):
+    """Oublier les lectures en cache des produits de ces liens"""
+    cache = get_query_cache()
+    if cache is not None:
+        cache.invalidate_links(conn, link_ids)
+
+
+def clear_query_cache():
+    """Oublier toutes les lectures en cache (écritures touchant tous les produits)"""
+    cache = get_query_cache()
+    if cache is not None:
+        cache.invalidate()
@@ -0,0 +1,333 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Gestion des connexions SQLite
+
+Les connexions sont ouvertes une seule fois (pragmas de Config.SQLITE_PRAGMAS
+appliqués à l'ouverture) puis réutilisées :
+- pendant une requête Flask, toutes les fonctions de database.models
+  partagent une connexion conservée sur `g`, rendue au pool en fin de requête ;
+- hors requête (workers, scheduler), chaque get_db_connection() emprunte une
+  connexion au pool, rendue par close().
+
+Les connexions réutilisées conservent leur cache de requêtes préparées
+(SQLITE_STATEMENT_CACHE_SIZE). Les appels existants `conn = get_db_connection()`
+... `conn.close()` restent valables : close() rend la connexion au lieu de la fermer.
+"""
+
+import atexit
+import logging
+import sqlite3
+import threading
+
+from flask import current_app, g, has_request_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_PATH = 'pricechecker.db'
+
+# Pragmas exécutés à la fermeture d'une connexion plutôt qu'à son ouverture
+CLOSING_PRAGMAS = ('optimize',)
+
+
+def is_memory_database(path):
+    """La base désignée est-elle en mémoire (':memory:', 'file::memory:', '?mode=memory') ?"""
+    path = str(path)
+    return path in ('', ':memory:') or path.startswith('file::memory:') or 'mode=memory' in path
+
+
+class ConnectionPool:
+    """Connexions SQLite inactives vers une même base, réutilisées entre appels"""
+
+    def __init__(self, path, pragmas=None, max_idle=4, cached_statements=256):
+        """
+        Args:
+            path: Chemin de la base SQLite
+            pragmas: Pragmas appliqués à chaque nouvelle connexion
+            max_idle: Connexions inactives conservées (au-delà, elles sont fermées)
+            cached_statements: Taille du cache de requêtes préparées par connexion
+
+        Raises:
+            ValueError: Base en mémoire (chaque connexion du pool serait une base vide distincte)
+        """
+        if is_memory_database(path):
+            raise ValueError(f"Base SQLite en mémoire non supportée par le pool de connexions : {path}")
+        self.path = path
+        self.pragmas = dict(pragmas or {})
+        self.max_idle = max(0, int(max_idle))
+        self.cached_statements = cached_statements
+
+        self._idle = []
+        self._lock = threading.RLock()
+        self._stats = {'opened': 0, 'reused': 0, 'closed': 0, 'in_use': 0}
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+
+        for pragma, value in self.pragmas.items():
+            if pragma not in CLOSING_PRAGMAS:
+                conn.execute(f"PRAGMA {pragma} = {value}")
+
+        return conn
+
+    def _close(self, conn):
+        try:
+            for pragma in CLOSING_PRAGMAS:
+                if self.pragmas.get(pragma):
+                    conn.execute(f"PRAGMA {pragma}")
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Erreur fermeture connexion DB: {e}")
+
+        with self._lock:
+            self._stats['closed'] += 1
+
+    def acquire(self):
+        """
+        Emprunter une connexion (inactive si possible, sinon nouvelle)
+
+        Returns:
+            tuple: (connexion, True si elle vient d'être ouverte)
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._stats['in_use'] += 1
+            if conn is not None:
+                self._stats['reused'] += 1
+                return conn, False
+
+        try:
+            conn = self._open()
+        except Exception:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            raise
+
+        with self._lock:
+            self._stats['opened'] += 1
+        return conn, True
+
+    def release(self, conn):
+        """Rendre une connexion : transaction en cours annulée, réglages par défaut restaurés"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.isolation_level = ''
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            logger.warning(f"Connexion DB écartée: {e}")
+            conn = None
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if conn is not None and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+
+        if conn is not None:
+            self._close(conn)
+
+    def close_all(self):
+        """Fermer les connexions inactives"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'idle': len(self._idle)}
+
+
+class PooledConnection:
+    """
+    Connexion empruntée : délègue tout à la connexion SQLite, sauf close()
+    qui la rend au pool (ou à la requête en cours) au lieu de la fermer
+    """
+
+    def __init__(self, conn, on_close):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_on_close', on_close)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        conn, on_close = self._conn, self._on_close
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        on_close(conn)
+
+    def __del__(self):
+        # Connexion oubliée (exception avant close()) : la rendre quand même
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """Pools de connexions d'une application et connexion partagée par requête"""
+
+    def __init__(self, app=None):
+        self._pools = {}
+        self._request_scoped = False
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'request_acquired': 0, 'request_opened': 0, 'max_request_acquired': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['sqlite'] = self
+        self._request_scoped = True
+        app.teardown_appcontext(self._teardown)
+        atexit.register(self.close_all)
+
+    def pool(self, config):
+        """Pool de la base configurée (créé au premier accès, la config peut changer avant)"""
+        path = config.get('DATABASE_PATH', DEFAULT_DATABASE_PATH)
+        with self._lock:
+            pool = self._pools.get(path)
+            if pool is None:
+                pool = self._pools[path] = ConnectionPool(
+                    path,
+                    pragmas=config.get('SQLITE_PRAGMAS'),
+                    max_idle=config.get('SQLITE_POOL_SIZE', 4),
+                    cached_statements=config.get('SQLITE_STATEMENT_CACHE_SIZE', 256)
+                )
+            return pool
+
+    def connect(self, config):
+        """Connexion de la requête en cours, ou empruntée au pool hors requête"""
+        pool = self.pool(config)
+
+        if not (self._request_scoped and has_request_context()):
+            conn, _ = pool.acquire()
+            return PooledConnection(conn, pool.release)
+
+        state = g.get('_sqlite')
+        if state is None or state['pool'] is not pool:
+            if state is not None:
+                self._release_request(state)
+            conn, opened = pool.acquire()
+            state = g._sqlite = {'pool': pool, 'conn': conn, 'handles': 0,
+                                 'acquired': 0, 'opened': int(opened)}
+
+        state['handles'] += 1
+        state['acquired'] += 1
+        return PooledConnection(state['conn'], lambda conn: self._close_handle(state))
+
+    @staticmethod
+    def _close_handle(state):
+        # Dernier utilisateur : même effet qu'une fermeture sur ce qui n'a pas été validé
+        state['handles'] -= 1
+        conn = state['conn']
+        if state['handles'] == 0 and conn is not None:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.isolation_level = ''
+            conn.row_factory = sqlite3.Row
+
+    def _release_request(self, state):
+        conn, state['conn'] = state['conn'], None
+        if conn is None:
+            return
+        state['pool'].release(conn)
+
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['request_acquired'] += state['acquired']
+            self._stats['request_opened'] += state['opened']
+            self._stats['max_request_acquired'] = max(self._stats['max_request_acquired'], state['acquired'])
+
+        logger.debug(f"🔌 Requête : {state['acquired']} accès DB, {state['opened']} connexion(s) ouverte(s)")
+
+    def _teardown(self, exception=None):
+        state = g.pop('_sqlite', None)
+        if state is not None:
+            self._release_request(state)
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close_all()
+
+    def stats(self):
+        """Compteurs globaux et par base"""
+        with self._lock:
+            stats = dict(self._stats)
+            pools = dict(self._pools)
+        stats['pools'] = {path: pool.stats() for path, pool in pools.items()}
+        return stats
+
+
+# Pools utilisés hors application configurée (scripts, benchmarks)
+_default_manager = ConnectionManager()
+
+
+def init_db_connections(app):
+    """Attacher le gestionnaire de connexions à l'application"""
+    return ConnectionManager(app)
+
+
+def get_connection_manager():
+    if current_app:
+        return current_app.extensions.get('sqlite', _default_manager)
+    return _default_manager
+
+
+def get_db_connection():
+    """Connexion à la base SQLite de l'application (partagée par requête, sinon poolée)"""
+    try:
+        config = current_app.config if current_app else {}
+        return get_connection_manager().connect(config)
+    except Exception as e:
+        logger.error(f"Erreur connexion DB: {e}")
+        raise
+
+
+def get_request_db_stats():
+    """
+    Accès à la base de la requête en cours
+
+    Returns:
+        dict: {'acquired': appels à get_db_connection, 'opened': connexions ouvertes},
+              None hors requête ou sans accès
+    """
+    state = g.get('_sqlite') if has_request_context() else None
+    if state is None:
+        return None
+    return {'acquired': state['acquired'], 'opened': state['opened']}
@@ -0,0 +1,633 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Migrations versionnées du schéma SQLite
+
+init_db crée les tables de base (CREATE TABLE IF NOT EXISTS), puis les
+migrations de MIGRATIONS plus récentes que la version enregistrée dans
+la table schema_version sont appliquées dans l'ordre, chacune dans sa
+propre transaction. Une migration est une liste de requêtes SQL et/ou de
+fonctions recevant la connexion ; elle doit rester rejouable sur une base
+créée directement avec le schéma à jour.
+
+Pour faire évoluer le schéma : ajouter une migration en fin de liste,
+ne jamais modifier une migration déjà publiée.
+"""
+
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(conn, table, columns):
+    """Ajouter les colonnes absentes d'une table ((nom, définition), ...)"""
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for column, definition in columns:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _link_schedule_adaptive_columns(conn):
+    add_missing_columns(conn, 'link_schedule', (
+        ('adaptive_interval', 'INTEGER'),
+        ('change_rate', 'REAL'),
+        ('unchanged_runs', 'INTEGER NOT NULL DEFAULT 0'),
+        ('last_change_at', 'TIMESTAMP'),
+    ))
+
+
+def _latest_price_changes(conn):
+    """Date du dernier changement de prix de chaque lien, tenue à jour par le trigger d'insertion"""
+    add_missing_columns(conn, 'link_latest_price', (
+        ('known_price', 'REAL'),       # Dernier prix relevé avec succès
+        ('changed_at', 'TIMESTAMP'),   # Date du relevé où ce prix est apparu
+    ))
+
+    conn.execute('DROP TRIGGER IF EXISTS trg_price_history_latest_insert')
+    conn.execute('''
+        CREATE TRIGGER trg_price_history_latest_insert
+        AFTER INSERT ON price_history
+        BEGIN
+            INSERT INTO link_latest_price (product_link_id, price_history_id, price, currency, is_available,
+                                           error_message, scraped_at, known_price, changed_at)
+            VALUES (NEW.product_link_id, NEW.id, NEW.price, NEW.currency, NEW.is_available,
+                    NEW.error_message, NEW.scraped_at, NEW.price,
+                    CASE WHEN NEW.price IS NOT NULL THEN NEW.scraped_at END)
+            ON CONFLICT(product_link_id) DO UPDATE SET
+                price_history_id = excluded.price_history_id,
+                price            = excluded.price,
+                currency         = excluded.currency,
+                is_available     = excluded.is_available,
+                error_message    = excluded.error_message,
+                scraped_at       = excluded.scraped_at,
+                -- Un relevé en échec ne change pas le dernier prix connu
+                known_price      = COALESCE(excluded.price, link_latest_price.known_price),
+                changed_at       = CASE
+                                       WHEN excluded.price IS NULL THEN link_latest_price.changed_at
+                                       WHEN link_latest_price.known_price IS NULL
+                                           OR ABS(excluded.price - link_latest_price.known_price) > 0.005
+                                           THEN excluded.scraped_at
+                                       ELSE link_latest_price.changed_at
+                                   END
+            WHERE excluded.scraped_at > link_latest_price.scraped_at
+               OR (excluded.scraped_at = link_latest_price.scraped_at
+                   AND excluded.price_history_id > link_latest_price.price_history_id)
+               OR link_latest_price.scraped_at IS NULL;
+        END
+    ''')
+
+    # Après suppression du dernier relevé (trigger de la migration 3), recalculer prix connu et changement
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_link_latest_price_refresh
+        AFTER INSERT ON link_latest_price
+        WHEN NEW.known_price IS NULL
+        BEGIN
+            UPDATE link_latest_price
+            SET known_price = (SELECT price FROM price_history
+                               WHERE product_link_id = NEW.product_link_id AND price IS NOT NULL
+                               ORDER BY scraped_at DESC, id DESC LIMIT 1)
+            WHERE product_link_id = NEW.product_link_id;
+            UPDATE link_latest_price
+            SET changed_at = (SELECT MIN(ph.scraped_at) FROM price_history ph
+                              WHERE ph.product_link_id = NEW.product_link_id
+                                AND ph.price IS NOT NULL
+                                AND ph.scraped_at > COALESCE((SELECT MAX(other.scraped_at) FROM price_history other
+                                                              WHERE other.product_link_id = NEW.product_link_id
+                                                                AND other.price IS NOT NULL
+                                                                AND ABS(other.price - link_latest_price.known_price) > 0.005),
+                                                             ''))
+            WHERE product_link_id = NEW.product_link_id;
+        END
+    ''')
+
+    # Reprise : les lignes existantes sont recalculées par le trigger ci-dessus
+    conn.execute('''
+        INSERT OR REPLACE INTO link_latest_price (product_link_id, price_history_id, price, currency,
+                                                  is_available, error_message, scraped_at)
+        SELECT product_link_id, price_history_id, price, currency, is_available, error_message, scraped_at
+        FROM link_latest_price
+    ''')
+
+
+# Agrégats de l'historique par lien : table -> format du début de l'intervalle (strftime)
+ROLLUP_BUCKETS = {
+    'price_rollup_hourly': '%Y-%m-%d %H:00:00',
+    'price_rollup_daily': '%Y-%m-%d',
+}
+
+
+def _rollup_upsert(table, bucket_format):
+    """Ajout du relevé NEW (prix, date scraped_at) à son intervalle d'agrégat, corps de trigger"""
+    return f'''
+                INSERT INTO {table} (product_link_id, bucket, min_price, max_price, sum_price, samples,
+                                     first_at, last_at, last_price, currency)
+                VALUES (NEW.product_link_id, strftime('{bucket_format}', NEW.scraped_at), NEW.price, NEW.price,
+                        NEW.price, 1, NEW.scraped_at, NEW.scraped_at, NEW.price, NEW.currency)
+                ON CONFLICT(product_link_id, bucket) DO UPDATE SET
+                    min_price  = MIN({table}.min_price, excluded.min_price),
+                    max_price  = MAX({table}.max_price, excluded.max_price),
+                    sum_price  = {table}.sum_price + excluded.sum_price,
+                    samples    = {table}.samples + 1,
+                    first_at   = MIN({table}.first_at, excluded.first_at),
+                    last_price = CASE WHEN excluded.last_at >= {table}.last_at
+                                      THEN excluded.last_price ELSE {table}.last_price END,
+                    currency   = CASE WHEN excluded.last_at >= {table}.last_at
+                                      THEN excluded.currency ELSE {table}.currency END,
+                    last_at    = MAX({table}.last_at, excluded.last_at);'''
+
+
+def _price_rollups(conn):
+    """Tables d'agrégats horaires et journaliers, alimentées à chaque relevé de prix"""
+    for table, bucket_format in ROLLUP_BUCKETS.items():
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                product_link_id INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                min_price REAL NOT NULL,
+                max_price REAL NOT NULL,
+                sum_price REAL NOT NULL,
+                samples INTEGER NOT NULL,
+                first_at TIMESTAMP NOT NULL,
+                last_at TIMESTAMP NOT NULL,
+                last_price REAL NOT NULL,
+                currency TEXT,
+                PRIMARY KEY (product_link_id, bucket)
+            ) WITHOUT ROWID
+        ''')
+
+        # Agrégat incrémental : min/max/somme/nombre cumulés, dernier prix par date de relevé.
+        # Les suppressions de relevés (purge de l'historique) ne modifient pas les agrégats.
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert
+            AFTER INSERT ON price_history
+            WHEN NEW.price IS NOT NULL AND strftime('{bucket_format}', NEW.scraped_at) IS NOT NULL
+            BEGIN{_rollup_upsert(table, bucket_format)}
+            END
+        ''')
+
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_link_delete
+            AFTER DELETE ON product_links
+            BEGIN
+                DELETE FROM {table} WHERE product_link_id = OLD.id;
+            END
+        ''')
+
+        # Reprise de l'historique existant
+        conn.execute(f'''
+            INSERT OR REPLACE INTO {table} (product_link_id, bucket, min_price, max_price, sum_price, samples,
+                                            first_at, last_at, last_price, currency)
+            SELECT product_link_id, bucket, MIN(price), MAX(price), SUM(price), COUNT(*),
+                   MIN(scraped_at), MAX(scraped_at), MAX(last_price), MAX(last_currency)
+            FROM (SELECT product_link_id, price, scraped_at,
+                         strftime('{bucket_format}', scraped_at) AS bucket,
+                         LAST_VALUE(price) OVER bucket_rows AS last_price,
+                         LAST_VALUE(currency) OVER bucket_rows AS last_currency
+                  FROM price_history
+                  WHERE price IS NOT NULL AND strftime('{bucket_format}', scraped_at) IS NOT NULL
+                  WINDOW bucket_rows AS (PARTITION BY product_link_id, strftime('{bucket_format}', scraped_at)
+                                         ORDER BY scraped_at, id
+                                         ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING))
+            GROUP BY product_link_id, bucket
+        ''')
+
+
+
+def _price_history_ranges(conn):
+    """Plage d'observation d'un relevé compacté : scraped_at = dernière observation"""
+    add_missing_columns(conn, 'price_history', (
+        ('first_seen_at', 'TIMESTAMP'),                     # Première observation (NULL : scraped_at)
+        ('observations', 'INTEGER NOT NULL DEFAULT 1'),     # Relevés identiques fusionnés
+    ))
+
+
+def _price_history_extension(conn):
+    """
+    Relevé prolongé (stockage des changements seulement) : scraped_at avancé
+    et observations + 1 sur la même ligne, répercutés comme une insertion
+    """
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_price_history_latest_extend
+        AFTER UPDATE OF scraped_at ON price_history
+        WHEN NEW.observations > OLD.observations
+        BEGIN
+            UPDATE link_latest_price
+            SET scraped_at = MAX(scraped_at, NEW.scraped_at)
+            WHERE product_link_id = NEW.product_link_id AND price_history_id = NEW.id;
+        END
+    ''')
+
+    # Le compactage ne modifie pas scraped_at : ses fusions ne repassent pas dans les agrégats
+    for table, bucket_format in ROLLUP_BUCKETS.items():
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_extend
+            AFTER UPDATE OF scraped_at ON price_history
+            WHEN NEW.observations > OLD.observations
+                AND NEW.price IS NOT NULL AND strftime('{bucket_format}', NEW.scraped_at) IS NOT NULL
+            BEGIN{_rollup_upsert(table, bucket_format)}
+            END
+        ''')
+
+
+
+# Compteurs du tableau de bord (get_global_stats) : colonnes de l'unique ligne de stats_counters
+STATS_COUNTERS = ('products_count', 'links_count', 'total_scrapes', 'successful_scrapes',
+                  'failed_scrapes', 'unique_shops', 'shops_without_success')
+
+# Relevé réussi / en échec (pondéré par observations), mêmes critères que le tableau de bord
+SCRAPE_SUCCESS = '{row}.is_available = 1 AND {row}.price IS NOT NULL'
+SCRAPE_FAILURE = '{row}.scraped_at IS NOT NULL AND ({row}.is_available = 0 OR {row}.price IS NULL)'
+
+
+def _link_has_success(link_id, exclude_id=None):
+    """Le lien a-t-il un relevé réussi ? (recherche dans l'index idx_price_history_link_scraped)"""
+    exclude = f' AND ph.id <> {exclude_id}' if exclude_id else ''
+    return (f'EXISTS (SELECT 1 FROM price_history ph WHERE ph.product_link_id = {link_id}'
+            f' AND {SCRAPE_SUCCESS.format(row="ph")}{exclude})')
+
+
+def _scrape_counts(row, sign='+'):
+    """Mise à jour des compteurs de relevés par la contribution de `row` (NEW / OLD), corps de trigger"""
+    return f'''
+                UPDATE stats_counters
+                SET total_scrapes      = total_scrapes {sign} {row}.observations,
+                    successful_scrapes = successful_scrapes {sign} CASE WHEN {SCRAPE_SUCCESS.format(row=row)}
+                                                                        THEN {row}.observations ELSE 0 END,
+                    failed_scrapes     = failed_scrapes {sign} CASE WHEN {SCRAPE_FAILURE.format(row=row)}
+                                                                    THEN {row}.observations ELSE 0 END;'''
+
+
+def _shop_links(shop_name, link_id, sign):
+    """Ajout (+) ou retrait (-) d'un lien dans les compteurs de sa boutique, corps de trigger"""
+    without = f'CASE WHEN {_link_has_success(link_id)} THEN 0 ELSE 1 END'
+    if sign == '+':
+        return f'''
+                INSERT INTO stats_shop_counters (shop_name, links, links_without_success)
+                VALUES ({shop_name}, 1, {without})
+                ON CONFLICT(shop_name) DO UPDATE SET
+                    links = links + 1,
+                    links_without_success = links_without_success + excluded.links_without_success;'''
+    return f'''
+                UPDATE stats_shop_counters
+                SET links = links - 1,
+                    links_without_success = links_without_success - {without}
+                WHERE shop_name = {shop_name};
+                DELETE FROM stats_shop_counters WHERE shop_name = {shop_name} AND links <= 0;'''
+
+
+def _shop_success(link_id, delta):
+    """Lien passant à « sans relevé réussi » (+1) ou l'inverse (-1) pour sa boutique, corps de trigger"""
+    return f'''
+                UPDATE stats_shop_counters
+                SET links_without_success = links_without_success + ({delta})
+                WHERE shop_name = (SELECT shop_name FROM product_links WHERE id = {link_id});'''
+
+
+# Recalcul complet des compteurs depuis les tables (reprise, ou après modification manuelle de la base)
+STATS_COUNTERS_REBUILD = [
+    'DELETE FROM stats_shop_counters',
+    f'''INSERT INTO stats_shop_counters (shop_name, links, links_without_success)
+        SELECT pl.shop_name, COUNT(*), SUM(CASE WHEN {_link_has_success('pl.id')} THEN 0 ELSE 1 END)
+        FROM product_links pl
+        GROUP BY pl.shop_name''',
+    f'''INSERT OR REPLACE INTO stats_counters (id, {', '.join(STATS_COUNTERS)})
+        SELECT 1,
+               (SELECT COUNT(*) FROM products),
+               (SELECT COUNT(*) FROM product_links),
+               COALESCE(SUM(ph.observations), 0),
+               COALESCE(SUM(CASE WHEN {SCRAPE_SUCCESS.format(row="ph")} THEN ph.observations ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN {SCRAPE_FAILURE.format(row="ph")} THEN ph.observations ELSE 0 END), 0),
+               (SELECT COUNT(*) FROM stats_shop_counters),
+               (SELECT COUNT(*) FROM stats_shop_counters WHERE links_without_success > 0)
+        FROM price_history ph''',
+]
+
+
+def _stats_counters(conn):
+    """
+    Compteurs globaux du tableau de bord, tenus à jour à chaque écriture :
+    la page d'accueil les lit en une requête, quelle que soit la taille de l'historique
+    """
+    # Une seule ligne (une mise à jour par relevé, pas une par compteur)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            {', '.join(f'{name} INTEGER NOT NULL DEFAULT 0' for name in STATS_COUNTERS)}
+        )
+    ''')
+    # Liens par boutique, dont ceux sans aucun relevé réussi (boutique retirée à son dernier lien)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_shop_counters (
+            shop_name TEXT PRIMARY KEY,
+            links INTEGER NOT NULL,
+            links_without_success INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    triggers = {
+        # Produits et liens
+        'trg_stats_products_insert': '''AFTER INSERT ON products BEGIN
+                UPDATE stats_counters SET products_count = products_count + 1;''',
+        'trg_stats_products_delete': '''AFTER DELETE ON products BEGIN
+                UPDATE stats_counters SET products_count = products_count - 1;''',
+        'trg_stats_links_insert': f'''AFTER INSERT ON product_links BEGIN
+                UPDATE stats_counters SET links_count = links_count + 1;{_shop_links('NEW.shop_name', 'NEW.id', '+')}''',
+        'trg_stats_links_delete': f'''AFTER DELETE ON product_links BEGIN
+                UPDATE stats_counters SET links_count = links_count - 1;{_shop_links('OLD.shop_name', 'OLD.id', '-')}''',
+        'trg_stats_links_shop': f'''AFTER UPDATE OF shop_name ON product_links
+            WHEN NEW.shop_name IS NOT OLD.shop_name BEGIN{_shop_links('OLD.shop_name', 'OLD.id', '-')}{_shop_links('NEW.shop_name', 'NEW.id', '+')}''',
+
+        # Relevés : insertion, prolongation / compactage / modification, suppression (purge, compactage)
+        'trg_stats_prices_insert': f'''AFTER INSERT ON price_history BEGIN{_scrape_counts('NEW')}''',
+        'trg_stats_prices_update': f'''AFTER UPDATE OF observations, price, is_available, scraped_at ON price_history
+            BEGIN{_scrape_counts('OLD', '-')}{_scrape_counts('NEW')}''',
+        'trg_stats_prices_delete': f'''AFTER DELETE ON price_history BEGIN{_scrape_counts('OLD', '-')}''',
+
+        # Premier relevé réussi d'un lien, ou disparition du dernier
+        'trg_stats_prices_first_success': f'''AFTER INSERT ON price_history
+            WHEN {SCRAPE_SUCCESS.format(row='NEW')} AND NOT {_link_has_success('NEW.product_link_id', 'NEW.id')}
+            BEGIN{_shop_success('NEW.product_link_id', -1)}''',
+        'trg_stats_prices_success_update': f'''AFTER UPDATE OF price, is_available ON price_history
+            WHEN (CASE WHEN {SCRAPE_SUCCESS.format(row='NEW')} THEN 1 ELSE 0 END)
+                <> (CASE WHEN {SCRAPE_SUCCESS.format(row='OLD')} THEN 1 ELSE 0 END)
+            BEGIN
+                UPDATE stats_shop_counters
+                SET links_without_success = links_without_success
+                    + CASE WHEN {SCRAPE_SUCCESS.format(row='NEW')} THEN -1 ELSE 1 END
+                WHERE shop_name = (SELECT shop_name FROM product_links WHERE id = NEW.product_link_id)
+                  AND NOT {_link_has_success('NEW.product_link_id', 'NEW.id')};''',
+        'trg_stats_prices_last_success': f'''AFTER DELETE ON price_history
+            WHEN {SCRAPE_SUCCESS.format(row='OLD')} AND NOT {_link_has_success('OLD.product_link_id')}
+            BEGIN{_shop_success('OLD.product_link_id', 1)}''',
+
+        # Boutiques : présentes, et ayant au moins un lien sans relevé réussi
+        'trg_stats_shops_insert': '''AFTER INSERT ON stats_shop_counters BEGIN
+                UPDATE stats_counters
+                SET unique_shops          = unique_shops + 1,
+                    shops_without_success = shops_without_success + (NEW.links_without_success > 0);''',
+        'trg_stats_shops_update': '''AFTER UPDATE OF links_without_success ON stats_shop_counters BEGIN
+                UPDATE stats_counters
+                SET shops_without_success = shops_without_success
+                    + (NEW.links_without_success > 0) - (OLD.links_without_success > 0);''',
+        'trg_stats_shops_delete': '''AFTER DELETE ON stats_shop_counters BEGIN
+                UPDATE stats_counters
+                SET unique_shops          = unique_shops - 1,
+                    shops_without_success = shops_without_success - (OLD.links_without_success > 0);''',
+    }
+    for name, body in triggers.items():
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}
+            {body}
+            END
+        ''')
+
+    # Reprise de l'existant
+    for statement in STATS_COUNTERS_REBUILD:
+        conn.execute(statement)
+
+
+# (version, description, requête SQL / fonction(conn), ou liste des deux)
+MIGRATIONS = [
+    (1, "Colonnes de fréquence adaptative de link_schedule", _link_schedule_adaptive_columns),
+    (2, "Index couvrants de l'historique des prix", [
+        # Dernier prix d'un lien, plages de dates par lien (graphiques, statistiques, volatilité) :
+        # recherche sur le lien, parcours dans l'ordre des dates, prix lus dans l'index (id = rowid inclus)
+        '''CREATE INDEX IF NOT EXISTS idx_price_history_link_scraped
+           ON price_history (product_link_id, scraped_at, price, is_available, currency)''',
+        # Jointure pl.product_id = ? : liens d'un produit et leur boutique sans lire la table
+        '''CREATE INDEX IF NOT EXISTS idx_product_links_product
+           ON product_links (product_id, shop_name)''',
+    ]),
+    (3, "Table des derniers prix par lien, tenue à jour par triggers", [
+        '''CREATE TABLE IF NOT EXISTS link_latest_price (
+               product_link_id INTEGER PRIMARY KEY,
+               price_history_id INTEGER NOT NULL,
+               price REAL,
+               currency TEXT,
+               is_available BOOLEAN,
+               error_message TEXT,
+               scraped_at TIMESTAMP
+           )''',
+        # Tout relevé plus récent (ou de même date, inséré après) remplace le dernier prix du lien
+        '''CREATE TRIGGER IF NOT EXISTS trg_price_history_latest_insert
+           AFTER INSERT ON price_history
+           BEGIN
+               INSERT INTO link_latest_price (product_link_id, price_history_id, price, currency,
+                                              is_available, error_message, scraped_at)
+               VALUES (NEW.product_link_id, NEW.id, NEW.price, NEW.currency,
+                       NEW.is_available, NEW.error_message, NEW.scraped_at)
+               ON CONFLICT(product_link_id) DO UPDATE SET
+                   price_history_id = excluded.price_history_id,
+                   price            = excluded.price,
+                   currency         = excluded.currency,
+                   is_available     = excluded.is_available,
+                   error_message    = excluded.error_message,
+                   scraped_at       = excluded.scraped_at
+               WHERE excluded.scraped_at > link_latest_price.scraped_at
+                  OR (excluded.scraped_at = link_latest_price.scraped_at
+                      AND excluded.price_history_id > link_latest_price.price_history_id)
+                  OR link_latest_price.scraped_at IS NULL;
+           END''',
+        # Suppression du dernier relevé d'un lien : le précédent devient le dernier prix
+        '''CREATE TRIGGER IF NOT EXISTS trg_price_history_latest_delete
+           AFTER DELETE ON price_history
+           WHEN OLD.id = (SELECT price_history_id FROM link_latest_price
+                          WHERE product_link_id = OLD.product_link_id)
+           BEGIN
+               DELETE FROM link_latest_price WHERE product_link_id = OLD.product_link_id;
+               INSERT INTO link_latest_price (product_link_id, price_history_id, price, currency,
+                                              is_available, error_message, scraped_at)
+               SELECT product_link_id, id, price, currency, is_available, error_message, scraped_at
+               FROM price_history
+               WHERE product_link_id = OLD.product_link_id
+               ORDER BY scraped_at DESC, id DESC
+               LIMIT 1;
+           END''',
+        # Reprise de l'historique existant
+        '''INSERT OR REPLACE INTO link_latest_price (product_link_id, price_history_id, price, currency,
+                                                    is_available, error_message, scraped_at)
+           SELECT product_link_id, id, price, currency, is_available, error_message, scraped_at
+           FROM (SELECT ph.*,
+                        ROW_NUMBER() OVER (PARTITION BY product_link_id
+                                           ORDER BY scraped_at DESC, id DESC) AS recency
+                 FROM price_history ph)
+           WHERE recency = 1''',
+    ]),
+    (4, "Date du dernier changement de prix et synthèse par produit pour le tri du catalogue", [
+        _latest_price_changes,
+        # Meilleur prix disponible et dernier changement par produit (une ligne par produit)
+        '''CREATE TABLE IF NOT EXISTS product_price_summary (
+               product_id INTEGER PRIMARY KEY,
+               best_price REAL,
+               changed_at TIMESTAMP
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_products_summary_insert
+           AFTER INSERT ON products
+           BEGIN
+               INSERT OR IGNORE INTO product_price_summary (product_id) VALUES (NEW.id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_products_summary_delete
+           AFTER DELETE ON products
+           BEGIN
+               DELETE FROM product_price_summary WHERE product_id = OLD.id;
+           END''',
+        *[f'''CREATE TRIGGER IF NOT EXISTS trg_link_latest_price_summary_{event.split()[0].lower()}
+              AFTER {event} ON link_latest_price
+              BEGIN
+                  UPDATE product_price_summary
+                  SET (best_price, changed_at) = (
+                      SELECT MIN(CASE WHEN lp.is_available AND lp.price IS NOT NULL THEN lp.price END),
+                             MAX(lp.changed_at)
+                      FROM product_links pl
+                               JOIN link_latest_price lp ON lp.product_link_id = pl.id
+                      WHERE pl.product_id = product_price_summary.product_id)
+                  WHERE product_id = (SELECT product_id FROM product_links WHERE id = {row}.product_link_id);
+              END'''
+          for event, row in (('INSERT', 'NEW'), ('UPDATE OF price, is_available, changed_at', 'NEW'),
+                             ('DELETE', 'OLD'))],
+        '''INSERT OR IGNORE INTO product_price_summary (product_id) SELECT id FROM products''',
+        '''UPDATE product_price_summary
+           SET (best_price, changed_at) = (
+               SELECT MIN(CASE WHEN lp.is_available AND lp.price IS NOT NULL THEN lp.price END),
+                      MAX(lp.changed_at)
+               FROM product_links pl
+                        JOIN link_latest_price lp ON lp.product_link_id = pl.id
+               WHERE pl.product_id = product_price_summary.product_id)''',
+        # Tris du catalogue (expressions identiques à CATALOGUE_SORTS) parcourus par index
+        'CREATE INDEX IF NOT EXISTS idx_products_created ON products (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_name ON products (name COLLATE NOCASE, id)',
+        '''CREATE INDEX IF NOT EXISTS idx_product_price_summary_best
+           ON product_price_summary (COALESCE(best_price, 9e999), product_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_product_price_summary_changed
+           ON product_price_summary (COALESCE(changed_at, ''), product_id)''',
+    ]),
+    (5, "Agrégats horaires et journaliers de l'historique des prix", _price_rollups),
+    (6, "Compactage et rétention de l'historique des prix", [
+        _price_history_ranges,
+        # Avancement du compactage par lien : relevés antérieurs à compacted_until déjà compactés
+        '''CREATE TABLE IF NOT EXISTS price_compaction_state (
+               product_link_id INTEGER PRIMARY KEY,
+               compacted_until TIMESTAMP NOT NULL
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_price_compaction_state_link_delete
+           AFTER DELETE ON product_links
+           BEGIN
+               DELETE FROM price_compaction_state WHERE product_link_id = OLD.id;
+           END''',
+        # Relevés en échec, purgés par ancienneté
+        '''CREATE INDEX IF NOT EXISTS idx_price_history_errors
+           ON price_history (scraped_at) WHERE price IS NULL''',
+        # Compte rendu de chaque passe de maintenance
+        '''CREATE TABLE IF NOT EXISTS maintenance_runs (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               started_at TIMESTAMP NOT NULL,
+               finished_at TIMESTAMP,
+               expired_errors INTEGER NOT NULL DEFAULT 0,
+               compacted_rows INTEGER NOT NULL DEFAULT 0,
+               links_compacted INTEGER NOT NULL DEFAULT 0,
+               page_size INTEGER,
+               pages_before INTEGER,
+               pages_after INTEGER,
+               freelist_after INTEGER,
+               vacuum TEXT,
+               duration_ms INTEGER
+           )''',
+    ]),
+    (7, "Prolongation du dernier relevé identique (stockage des changements seulement)", _price_history_extension),
+    (8, "Compteurs globaux du tableau de bord", _stats_counters),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Version du schéma enregistrée (0 pour une base jamais migrée)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn, target_version=None):
+    """
+    Appliquer les migrations en attente
+
+    Chaque migration est appliquée sous BEGIN IMMEDIATE après relecture de
+    la version : plusieurs processus démarrant en même temps (serveur web,
+    scheduler.py) n'appliquent pas deux fois la même migration.
+
+    Args:
+        conn: Connexion SQLite
+        target_version (int, optional): Version à atteindre (défaut : la plus récente)
+
+    Returns:
+        list: Versions appliquées
+    """
+    target = LATEST_VERSION if target_version is None else target_version
+    isolation_level = conn.isolation_level
+    conn.commit()
+    conn.isolation_level = None
+    applied = []
+
+    try:
+        get_schema_version(conn)
+        for version, description, migration in MIGRATIONS:
+            if version > target:
+                break
+
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if get_schema_version(conn) >= version:
+                    conn.execute('COMMIT')
+                    continue
+
+                logger.info(f"🗃️ Migration {version} : {description}")
+                start = time.perf_counter()
+                for statement in (migration if isinstance(migration, list) else [migration]):
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(statement)
+
+                conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                             (version, description))
+                conn.execute('COMMIT')
+                applied.append(version)
+                logger.info(f"✅ Migration {version} appliquée en {time.perf_counter() - start:.1f}s")
+
+            except Exception:
+                conn.execute('ROLLBACK')
+                logger.error(f"❌ Échec de la migration {version} : {description}")
+                raise
+
+        if applied:
+            # Statistiques du planificateur pour les nouveaux index (échantillonnées : rapide sur une grosse base)
+            conn.execute('PRAGMA analysis_limit = 1000')
+            conn.execute('ANALYZE')
+
+    finally:
+        conn.isolation_level = isolation_level
+
+    return applied
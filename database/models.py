@@ -21,36 +21,21 @@ Modèles de base de données pour PriceChecker
 Gestion SQLite avec fonctions utilitaires
 """
 
-import sqlite3
+import json
+import hashlib
 import logging
-import time
 
 import utils.display_helpers
 
 from flask import current_app
 
-logger = logging.getLogger(__name__)
-
-def get_db_connection():
-    """Ouvrir une connexion à la base de données SQLite"""
-    try:
-        # Utiliser la config Flask si disponible
-        if current_app:
-            db_path = current_app.config.get('DATABASE_PATH', 'pricechecker.db')
-        else:
-            db_path = 'pricechecker.db'
+from database.cache import cached, clear_query_cache, invalidate_links, invalidate_products
+from database.connection import get_db_connection
+from database.migrations import ROLLUP_BUCKETS, STATS_COUNTERS, STATS_COUNTERS_REBUILD, apply_migrations
+from database.writer import get_price_writer, scrape_timestamp, store_price
+from utils.decimation import decimate
 
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-
-        if hasattr(current_app.config, 'SQLITE_PRAGMAS'):
-            for pragma, value in current_app.config.SQLITE_PRAGMAS.items():
-                conn.execute(f"PRAGMA {pragma} = {value}")
-
-        return conn
-    except Exception as e:
-        logger.error(f"Erreur connexion DB: {e}")
-        raise
+logger = logging.getLogger(__name__)
 
 def dict_from_row(row):
     """Convertir un objet Row SQLite en dictionnaire Python"""
@@ -58,8 +43,13 @@ def dict_from_row(row):
         return None
     return {key: row[key] for key in row.keys()}
 
-def init_db():
-    """Initialiser la base de données avec les tables nécessaires"""
+def init_db(target_version=None):
+    """
+    Initialiser la base de données avec les tables nécessaires
+
+    Args:
+        target_version (int, optional): Version de schéma à atteindre (défaut : la plus récente)
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -103,8 +93,92 @@ def init_db():
         )
     ''')
 
-# Index pour accélérer les requêtes sur les prix
+    # Stratégie d'extraction gagnante par lien (mode de récupération, sélecteur, chemin de l'élément)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS link_strategies (
+            product_link_id INTEGER PRIMARY KEY,
+            fetch_mode TEXT NOT NULL,
+            selector TEXT,
+            element_path TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_link_id) REFERENCES product_links (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Cache HTTP par URL (requêtes conditionnelles et dernier prix extrait)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS http_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            price REAL,
+            currency TEXT DEFAULT 'EUR',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Étape d'extraction ayant fourni le prix, comptée par boutique
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS extraction_stats (
+            shop_name TEXT NOT NULL,
+            source TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            last_hit_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (shop_name, source)
+        )
+    ''')
+
+    # File de jobs de scraping en arrière-plan (product_id NULL = tout le catalogue)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'queued',
+            total INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            succeeded INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            cancel_requested BOOLEAN NOT NULL DEFAULT 0,
+            worker TEXT,
+            results TEXT,
+            error_message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Planification du scraping automatique par lien (dates en UTC)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS link_schedule (
+            product_link_id INTEGER PRIMARY KEY,
+            interval_seconds INTEGER,
+            next_run_at TIMESTAMP,
+            last_run_at TIMESTAMP,
+            adaptive_interval INTEGER,
+            change_rate REAL,
+            unchanged_runs INTEGER NOT NULL DEFAULT 0,
+            last_change_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_link_id) REFERENCES product_links (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_link_schedule_next_run ON link_schedule (next_run_at)')
+
+    # Un seul job actif par produit (ou pour le catalogue) : les doublons sont fusionnés
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_scrape_jobs_active
+        ON scrape_jobs (COALESCE(product_id, 0))
+        WHERE status IN ('queued', 'running')
+    ''')
+
     conn.commit()
+
+    # Index et évolutions du schéma (voir database/migrations.py)
+    apply_migrations(conn, target_version)
     conn.close()
     print("✅ Base de données initialisée")
 
@@ -122,6 +196,7 @@ def create_product(name, description=None):
     product_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    invalidate_products(product_id)
 
     return product_id
 
@@ -169,6 +244,7 @@ def update_product(product_id, name, description=None):
 
         conn.commit()
         conn.close()
+        invalidate_products(product_id)
 
         logger.info(f"Produit {product_id} mis à jour: {name}")
         return True
@@ -192,6 +268,35 @@ def get_product_by_id(product_id):
 
     return dict_from_row(row) if row else None
 
+def get_product_version(product_id):
+    """
+    Version des données d'un produit (validation des caches et ETag)
+
+    Change avec le produit, ses liens (ajout, suppression, modification) et
+    le dernier relevé de chaque lien (nouveau ou prolongé). Une seule
+    requête sur les index, sans lire l'historique ; les colonnes elles-mêmes
+    sont comparées (updated_at n'est précis qu'à la seconde).
+
+    Returns:
+        str: Empreinte de la version, None si le produit n'existe pas
+    """
+    conn = get_db_connection()
+    rows = conn.execute('''
+                        SELECT p.name, p.description, p.updated_at,
+                               pl.id, pl.shop_name, pl.url, pl.css_selector, pl.updated_at,
+                               lp.price_history_id, lp.scraped_at
+                        FROM products p
+                                 LEFT JOIN product_links pl ON pl.product_id = p.id
+                                 LEFT JOIN link_latest_price lp ON lp.product_link_id = pl.id
+                        WHERE p.id = ?
+                        ORDER BY pl.id
+                        ''', (product_id,)).fetchall()
+    conn.close()
+
+    if not rows:
+        return None
+    return hashlib.sha1(repr([tuple(row) for row in rows]).encode('utf-8')).hexdigest()
+
 def get_all_products():
     """Récupérer tous les produits avec conversion en dictionnaire"""
     conn = get_db_connection()
@@ -264,6 +369,15 @@ def delete_product(product_id):
             deleted_prices = cursor.rowcount
             logger.info(f"Supprimés {deleted_prices} prix pour le produit {product_id}")
 
+            cursor.execute(
+                f'DELETE FROM link_strategies WHERE product_link_id IN ({placeholders})',
+                link_ids_list
+            )
+            cursor.execute(
+                f'DELETE FROM link_schedule WHERE product_link_id IN ({placeholders})',
+                link_ids_list
+            )
+
         # 4. Supprimer tous les liens du produit
         cursor.execute('DELETE FROM product_links WHERE product_id = ?', (product_id,))
         deleted_links = cursor.rowcount
@@ -275,6 +389,7 @@ def delete_product(product_id):
         # 6. Valider toutes les suppressions
         conn.commit()
         conn.close()
+        invalidate_products(product_id)
 
         logger.info(f"Produit supprimé avec succès: {product_name} (ID: {product_id})")
         return True
@@ -299,6 +414,7 @@ def add_product_link(product_id, shop_name, url, css_selector=None):
     link_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    invalidate_products(product_id)
 
     return link_id
 
@@ -353,10 +469,14 @@ def delete_product_link(link_id):
             return False
 
         # Supprimer le lien (les prix associés seront supprimés automatiquement grâce à ON DELETE CASCADE)
+        cursor.execute('DELETE FROM link_strategies WHERE product_link_id = ?', (link_id,))
+        cursor.execute('DELETE FROM link_schedule WHERE product_link_id = ?', (link_id,))
+        cursor.execute('DELETE FROM link_latest_price WHERE product_link_id = ?', (link_id,))
         cursor.execute('DELETE FROM product_links WHERE id = ?', (link_id,))
 
         conn.commit()
         conn.close()
+        invalidate_products(existing['product_id'])
 
         logger.info(f"Lien supprimé: {existing['shop_name']} pour produit {existing['product_id']}")
         return True
@@ -367,308 +487,1244 @@ def delete_product_link(link_id):
         raise
 
 """SCRAPING"""
-def scrape_all_product_links(product_id):
-    """Scraper tous les liens d'un produit"""
-    from scraping.price_scraper import create_price_scraper
+# Étapes d'extraction lisant les données structurées de la page
+STRUCTURED_SOURCES = ('json-ld', 'meta', 'microdata')
 
-    links = get_product_links(product_id)
-    if not links:
-        logger.info(f"Aucun lien à scraper pour le produit {product_id}")
-        return []
+def get_link_strategies(link_ids):
+    """
+    Récupérer les stratégies d'extraction mémorisées pour des liens
 
-    scraper = create_price_scraper()
-    results = []
+    Args:
+        link_ids (list): IDs des liens
 
-    for link in links:
-        logger.info(f"Scraping {link['shop_name']} pour produit {product_id}")
+    Returns:
+        dict: {link_id: {'fetch_mode', 'selector', 'element_path'}}
+    """
+    if not link_ids:
+        return {}
 
-        try:
-            # Scraper le prix
-            price_data = scraper.scrape_price(
-                url=link['url'],
-                css_selector=link['css_selector'],
-                shop_name=link['shop_name']
-            )
+    conn = get_db_connection()
+    cursor = conn.cursor()
 
-            # ✅ Utiliser VOTRE fonction record_price
-            price_id = record_price(
-                product_link_id=link['id'],  # ← Nom correct
-                price=price_data['price'],
-                currency=price_data['currency'],
-                is_available=price_data['is_available'],
-                error_message=price_data['error_message']
-            )
+    placeholders = ','.join('?' * len(link_ids))
+    rows = cursor.execute(f'''
+                          SELECT product_link_id, fetch_mode, selector, element_path
+                          FROM link_strategies
+                          WHERE product_link_id IN ({placeholders})
+                          ''', list(link_ids)).fetchall()
 
-            result = {
-                'link_id': link['id'],
-                'shop_name': link['shop_name'],
-                'price_id': price_id,
-                'success': price_data['is_available'],
-                **price_data
-            }
+    conn.close()
+    return {
+        row['product_link_id']: {
+            'fetch_mode': row['fetch_mode'],
+            'selector': row['selector'],
+            'element_path': row['element_path']
+        }
+        for row in rows
+    }
 
-            results.append(result)
-            time.sleep(1)  # Anti-spam
+LINK_STRATEGY_UPSERT = '''
+    INSERT INTO link_strategies (product_link_id, fetch_mode, selector, element_path, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(product_link_id) DO UPDATE SET
+        fetch_mode   = excluded.fetch_mode,
+        selector     = excluded.selector,
+        element_path = excluded.element_path,
+        updated_at   = CURRENT_TIMESTAMP
+'''
+
+def _execute_write(query, params, writer=None):
+    """Écriture isolée, ou confiée au writer groupé (validée avec son lot en cours)"""
+    if writer is not None:
+        writer.execute(query, params)
+        return
 
-        except Exception as e:
-            logger.error(f"Erreur scraping {link['shop_name']}: {e}")
-            results.append({
-                'link_id': link['id'],
-                'shop_name': link['shop_name'],
-                'success': False,
-                'error_message': str(e)
-            })
+    conn = get_db_connection()
+    conn.execute(query, params)
+    conn.commit()
+    conn.close()
 
-    return results
+def save_link_strategy(product_link_id, strategy, writer=None):
+    """
+    Mémoriser la stratégie d'extraction gagnante d'un lien
 
-"""PRICES"""
-def record_price(product_link_id, price, currency='EUR', is_available=True, error_message=None):
+    Args:
+        product_link_id (int): ID du lien
+        strategy (dict): fetch_mode ('requests' ou 'selenium'), selector, element_path
+        writer (PriceWriter, optional): Écrire avec le lot de relevés en cours
     """
-    Enregistrer un prix pour un lien de produit
+    _execute_write(LINK_STRATEGY_UPSERT, (product_link_id, strategy['fetch_mode'], strategy.get('selector'),
+                                  strategy.get('element_path')), writer)
+
+def clear_link_strategy(product_link_id):
+    """Oublier la stratégie d'un lien (URL ou sélecteur modifiés)"""
+    conn = get_db_connection()
+    conn.execute('DELETE FROM link_strategies WHERE product_link_id = ?', (product_link_id,))
+    conn.commit()
+    conn.close()
+
+def get_http_cache_entries(urls):
+    """
+    Récupérer les entrées du cache HTTP pour des URLs
 
     Args:
-        product_link_id (int): ID du lien de produit
-        price (float): Prix à enregistrer
-        currency (str): Devise du prix (par défaut 'EUR')
-        is_available (bool): Disponibilité du produit (par défaut True)
-        error_message (str, optional): Message d'erreur en cas d'indisponibilité
+        urls (list): URLs des liens
 
     Returns:
-        int: ID du nouvel enregistrement de prix
+        dict: {url: {'etag', 'last_modified', 'content_hash', 'price', 'currency'}}
     """
+    if not urls:
+        return {}
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    try:
-        cursor.execute(
-            '''
-            INSERT INTO price_history
-            (product_link_id, price, currency, is_available, error_message, scraped_at)
-            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''',
-            (product_link_id, price, currency, is_available, error_message)
-        )
-
-        price_history_id = cursor.lastrowid
-        conn.commit()
-        logger.info(f"Prix enregistré avec succès pour le lien {product_link_id}")
-        return price_history_id
+    placeholders = ','.join('?' * len(urls))
+    rows = cursor.execute(f'''
+                          SELECT url, etag, last_modified, content_hash, price, currency
+                          FROM http_cache
+                          WHERE url IN ({placeholders})
+                          ''', list(urls)).fetchall()
 
-    except Exception as e:
-        logger.error(f"Erreur lors de l'enregistrement du prix pour le lien {product_link_id}: {e}")
-        raise
+    conn.close()
+    return {row['url']: dict_from_row(row) for row in rows}
+
+HTTP_CACHE_UPSERT = '''
+    INSERT INTO http_cache (url, etag, last_modified, content_hash, price, currency, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(url) DO UPDATE SET
+        etag          = excluded.etag,
+        last_modified = excluded.last_modified,
+        content_hash  = excluded.content_hash,
+        price         = excluded.price,
+        currency      = excluded.currency,
+        updated_at    = CURRENT_TIMESTAMP
+'''
+
+def save_http_cache(url, validators, price, currency='EUR', writer=None):
+    """
+    Mémoriser les validateurs HTTP et le prix extrait d'une URL
 
-    finally:
-        conn.close()
+    Args:
+        url (str): URL scrapée
+        validators (dict): etag, last_modified, content_hash
+        price (float): Prix extrait de cette version de la page
+        currency (str): Devise du prix
+        writer (PriceWriter, optional): Écrire avec le lot de relevés en cours
+    """
+    _execute_write(HTTP_CACHE_UPSERT, (url, validators.get('etag'), validators.get('last_modified'),
+                               validators.get('content_hash'), price, currency), writer)
 
-def get_latest_prices(product_id):
-    """Récupérer les derniers prix pour un produit - Version simplifiée"""
+def clear_http_cache(url):
+    """Invalider le cache HTTP d'une URL (sélecteur modifié, prix à ré-extraire)"""
     conn = get_db_connection()
-    cursor = conn.cursor()
+    conn.execute('DELETE FROM http_cache WHERE url = ?', (url,))
+    conn.commit()
+    conn.close()
 
-    # Récupérer tous les liens du produit
-    links = cursor.execute('''
-                           SELECT id, shop_name, url, css_selector
-                           FROM product_links
-                           WHERE product_id = ?
-                           ORDER BY shop_name
-                           ''', (product_id,)).fetchall()
+EXTRACTION_HIT_UPSERT = '''
+    INSERT INTO extraction_stats (shop_name, source, hits, last_hit_at)
+    VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT(shop_name, source) DO UPDATE SET
+        hits        = hits + 1,
+        last_hit_at = CURRENT_TIMESTAMP
+'''
 
-    prices = []
+def record_extraction(shop_name, source, writer=None):
+    """
+    Compter l'étape d'extraction ayant abouti pour une boutique
 
-    # Pour chaque lien, récupérer le dernier prix
-    for link in links:
-        latest_price = cursor.execute('''
-                                      SELECT price, currency, is_available, error_message, scraped_at
-                                      FROM price_history
-                                      WHERE product_link_id = ?
-                                      ORDER BY scraped_at DESC, id DESC LIMIT 1
-                                      ''', (link['id'],)).fetchone()
+    Args:
+        shop_name (str): Nom de la boutique
+        source (str): json-ld, meta, microdata, strategy, css, auto, regex, cache ou none
+        writer (PriceWriter, optional): Écrire avec le lot de relevés en cours
+    """
+    _execute_write(EXTRACTION_HIT_UPSERT, (shop_name, source), writer)
 
-        price_data = {
-            'link_id': link['id'],
-            'shop_name': link['shop_name'],
-            'url': link['url'],              # ✅ URL présente ici
-            'css_selector': link['css_selector'],
-            'price': None,
-            'currency': 'EUR',
-            'is_available': False,
-            'error_message': None,
-            'scraped_at': None
-        }
+def get_extraction_stats():
+    """
+    Répartition des étapes d'extraction par boutique
 
-        if latest_price:
-            price_data.update({
-                'price': latest_price['price'],
-                'currency': latest_price['currency'],
-                'is_available': latest_price['is_available'],
-                'error_message': latest_price['error_message'],
-                'scraped_at': latest_price['scraped_at']
-            })
+    Returns:
+        list: Par boutique, total, prix issus des données structurées,
+              taux correspondant (%) et détail par étape
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
 
-        prices.append(price_data)
+    rows = cursor.execute('''
+                          SELECT shop_name, source, hits
+                          FROM extraction_stats
+                          ORDER BY shop_name, hits DESC
+                          ''').fetchall()
 
     conn.close()
-    # Filtrer les prix disponibles
-    available_prices = [price for price in prices if price['is_available'] and price['price'] is not None]
 
-    # Trouver le meilleur prix
-    best_price = None
-    if available_prices:
-        best_price = min(available_prices, key=lambda x: x['price'])
-        # ✅ best_price contient maintenant AUSSI l'URL !
-
-    return {
-        'prices': prices,
-        'best_price': best_price
-    }
+    shops = {}
+    for row in rows:
+        shop = shops.setdefault(row['shop_name'], {
+            'shop_name': row['shop_name'], 'total': 0, 'structured': 0, 'sources': {}
+        })
+        shop['total'] += row['hits']
+        shop['sources'][row['source']] = row['hits']
+        if row['source'] in STRUCTURED_SOURCES:
+            shop['structured'] += row['hits']
 
-    # Convertir en liste de dictionnaires avec debug
-    #prices = []
-    #for row in rows:
-    #    price_dict = dict_from_row(row)
-    #    logger.debug(f"Prix récupéré pour {price_dict['shop_name']}: {price_dict.get('price', 'Aucun')}")
-    #    prices.append(price_dict)
+    for shop in shops.values():
+        shop['structured_rate'] = round(shop['structured'] / max(shop['total'], 1) * 100, 1)
 
-    #return prices
+    return list(shops.values())
 
-def get_price_history(product_id, limit=50):
+def get_all_product_links():
     """
-    Historique complet des prix pour un produit (pour graphiques futurs)
-
-    Args:
-        product_id (int): ID du produit
-        limit (int): Nombre maximum d'entrées
+    Récupérer tous les liens de tous les produits (pour le scraping global)
 
     Returns:
-        list: Historique des prix
+        list: Liens avec l'ID et le nom du produit associé
     """
     conn = get_db_connection()
     cursor = conn.cursor()
 
     rows = cursor.execute('''
-                          SELECT ph.*,
-                                 pl.shop_name,
-                                 pl.url
-                          FROM price_history ph
-                                   JOIN product_links pl ON ph.product_link_id = pl.id
-                          WHERE pl.product_id = ?
-                          ORDER BY ph.scraped_at DESC LIMIT ?
-                          ''', (product_id, limit)).fetchall()
+                          SELECT pl.id, pl.product_id, pl.shop_name, pl.url, pl.css_selector,
+                                 p.name as product_name
+                          FROM product_links pl
+                                   JOIN products p ON pl.product_id = p.id
+                          ORDER BY p.name, pl.shop_name
+                          ''').fetchall()
 
     conn.close()
     return [dict_from_row(row) for row in rows]
 
-def get_price_history_data(product_id, days=30):
+def create_scrape_engine():
+    """Créer un moteur de scraping concurrent à partir de la configuration Flask"""
+    from scraping.engine import ScrapeEngine
+
+    return ScrapeEngine(
+        max_workers=current_app.config.get('SCRAPING_MAX_WORKERS', 8),
+        max_per_domain=current_app.config.get('SCRAPING_MAX_PER_DOMAIN', 1),
+        default_delay=current_app.config.get('SCRAPING_DELAY', 2),  # Anti-spam
+        domain_delays=current_app.config.get('SCRAPING_DOMAIN_DELAYS')
+    )
+
+def scrape_links(links, on_progress=None, cancel=None):
     """
-    Récupérer les données d'historique pour les graphiques
+    Scraper une liste de liens en parallèle et enregistrer les prix
+
+    Les requêtes sont faites par le pool de threads du moteur. Avec le writer
+    groupé, toutes les écritures (relevés, statistiques d'extraction, cache
+    HTTP, stratégies) lui sont confiées et validées par lots, toutes écrites
+    au retour de la fonction ; sinon elles restent dans le thread appelant.
 
     Args:
-        product_id (int): ID du produit
-        days (int): Nombre de jours d'historique (par défaut 30)
+        links (list): Liens à scraper (id, shop_name, url, css_selector)
+        on_progress (callable): Appelé avec le résultat de chaque lien enregistré
+        cancel (threading.Event): Arrêter de lancer de nouveaux liens une fois levé
 
     Returns:
-        dict: Données formatées pour Chart.js
+        list: Un résultat par lien
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Récupérer l'historique par boutique
-    rows = cursor.execute('''
-                          SELECT pl.shop_name,
-                                 ph.price,
-                                 ph.currency,
-                                 ph.is_available,
-                                 ph.scraped_at, DATE (ph.scraped_at) as scrape_date
-                          FROM price_history ph
-                              JOIN product_links pl
-                          ON ph.product_link_id = pl.id
-                          WHERE pl.product_id = ?
-                            AND ph.scraped_at >= datetime('now'
-                              , '-' || ? || ' days')
-                            AND ph.price IS NOT NULL
-                          ORDER BY ph.scraped_at ASC
-                          ''', (product_id, days)).fetchall()
+    if not links:
+        return []
 
-    conn.close()
+    # Joindre les stratégies mémorisées et le cache HTTP pour éviter le travail inutile
+    strategies = get_link_strategies([link['id'] for link in links])
+    http_cache = get_http_cache_entries([link['url'] for link in links])
+    links = [
+        {**link, 'strategy': strategies.get(link['id']), 'http_cache': http_cache.get(link['url'])}
+        for link in links
+    ]
+    writer = get_price_writer()
+    pending = []
+
+    def _record(link, price_data):
+        strategy = price_data.pop('strategy', None)
+        # Avec le writer, aucune écriture dans ce thread : tout est validé avec le lot de relevés
+        if strategy and strategy != link['strategy']:
+            save_link_strategy(link['id'], strategy, writer)
+
+        validators = price_data.pop('http_cache', None)
+        if validators:
+            save_http_cache(link['url'], validators, price_data['price'], price_data['currency'], writer)
+
+        # Un prix issu du cache prolonge le dernier relevé du lien (observation inchangée)
+        if price_data.get('cache_hit'):
+            logger.info(f"Prix inchangé pour {link['shop_name']} (cache HTTP)")
+
+        record_extraction(link['shop_name'], price_data.pop('source', None) or 'none', writer)
+
+        price_row = dict(
+            product_link_id=link['id'],
+            price=price_data['price'],
+            currency=price_data['currency'],
+            is_available=price_data['is_available'],
+            error_message=price_data['error_message'],
+            unchanged=bool(price_data.get('cache_hit'))
+        )
+        price_id = writer.submit(**price_row) if writer else record_price(**price_row)
 
-    if not rows:
-        return {
-            'labels': [],
-            'datasets': [],
-            'stats': {}
+        result = {
+            'link_id': link['id'],
+            'product_id': link.get('product_id'),
+            'shop_name': link['shop_name'],
+            'price_id': None if writer else price_id,
+            # Un produit en rupture dont le prix a été lu reste un scraping réussi
+            'success': price_data['price'] is not None,
+            **price_data
         }
 
-    # Organiser les données par boutique
-    shops_data = {}
-    all_dates = set()
-
-    for row in rows:
-        shop = row['shop_name']
-        date = row['scrape_date']
-        price = float(row['price'])
+        if writer:
+            pending.append((result, price_id))
+        if on_progress:
+            on_progress(result)
 
-        if shop not in shops_data:
-            shops_data[shop] = {}
+        return result
 
-        # Garder le dernier prix du jour
-        shops_data[shop][date] = price
-        all_dates.add(date)
+    try:
+        return create_scrape_engine().run(links, on_result=_record, cancel=cancel)
+    finally:
+        # Relevés lisibles en base dès le retour, identifiants reportés dans les résultats
+        if writer:
+            timeout = current_app.config.get('PRICE_WRITER_FLUSH_TIMEOUT', 30)
+            if not writer.flush(timeout=timeout):
+                logger.error(f"⏱️ Relevés de prix toujours en attente après {timeout} s")
+            for result, future in pending:
+                try:
+                    result['price_id'] = future.result(timeout=0)
+                except Exception:
+                    # Écriture en échec, ou pas encore faite après le délai
+                    result['price_id'] = None
 
-    # Créer les labels (dates triées)
-    sorted_dates = sorted(all_dates)
+def scrape_all_product_links(product_id):
+    """Scraper tous les liens d'un produit"""
+    links = get_product_links(product_id)
+    if not links:
+        logger.info(f"Aucun lien à scraper pour le produit {product_id}")
+        return []
 
-    # Couleurs pour les boutiques
-    colors = [
-        'rgb(255, 99, 132)',  # Rouge
-        'rgb(54, 162, 235)',  # Bleu
-        'rgb(255, 205, 86)',  # Jaune
-        'rgb(75, 192, 192)',  # Vert
-        'rgb(153, 102, 255)',  # Violet
-        'rgb(255, 159, 64)',  # Orange
-    ]
+    logger.info(f"Scraping de {len(links)} lien(s) pour produit {product_id}")
+    return scrape_links(links)
 
-    # Créer les datasets pour Chart.js
-    datasets = []
-    color_index = 0
+"""JOBS"""
+JOB_ACTIVE_STATUSES = ('queued', 'running')
 
-    for shop, price_data in shops_data.items():
-        # Créer la série de données pour cette boutique
-        data_points = []
-        for date in sorted_dates:
-            if date in price_data:
-                data_points.append(price_data[date])
-            else:
-                # Si pas de prix ce jour, garder le dernier prix connu
-                data_points.append(data_points[-1] if data_points else None)
+def _job_from_row(row):
+    """Job sous forme de dictionnaire (résultats JSON décodés)"""
+    job = dict_from_row(row)
+    if job is None:
+        return None
+    job['results'] = json.loads(job['results']) if job['results'] else []
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    job['progress'] = round(job['completed'] / job['total'] * 100, 1) if job['total'] else 0
+    return job
 
-        datasets.append({
-            'label': shop,
-            'data': data_points,
-            'borderColor': colors[color_index % len(colors)],
-            'backgroundColor': colors[color_index % len(colors)].replace('rgb', 'rgba').replace(')', ', 0.1)'),
-            'tension': 0.1,
-            'fill': False
-        })
-        color_index += 1
+def enqueue_scrape_job(product_id=None):
+    """
+    Mettre en file un job de scraping, ou rejoindre le job actif équivalent
 
-    # Calculer les statistiques
-    all_prices = [float(row['price']) for row in rows]
-    stats = {
-        'min_price': min(all_prices) if all_prices else 0,
-        'max_price': max(all_prices) if all_prices else 0,
-        'avg_price': sum(all_prices) / len(all_prices) if all_prices else 0,
-        'total_records': len(rows),
-        'shops_count': len(shops_data),
-        'date_range': f"{sorted_dates[0]} à {sorted_dates[-1]}" if sorted_dates else "Aucune donnée"
-    }
+    Args:
+        product_id (int): Produit à scraper, None pour tout le catalogue
 
-    return {
-        'labels': sorted_dates,
+    Returns:
+        dict: Job créé ou existant, avec 'merged' = True si la demande a été fusionnée
+    """
+    conn = get_db_connection()
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+
+        # Même cible déjà en file ou en cours, ou catalogue complet pas encore démarré
+        row = conn.execute('''
+                           SELECT * FROM scrape_jobs
+                           WHERE status IN ('queued', 'running') AND product_id IS ?
+                           UNION ALL
+                           SELECT * FROM scrape_jobs
+                           WHERE status = 'queued' AND product_id IS NULL AND ? IS NOT NULL
+                           LIMIT 1
+                           ''', (product_id, product_id)).fetchone()
+
+        if row:
+            conn.execute('COMMIT')
+            logger.info(f"Job de scraping {row['id']} déjà actif, demande fusionnée")
+            return {**_job_from_row(row), 'merged': True}
+
+        cursor = conn.execute('INSERT INTO scrape_jobs (product_id) VALUES (?)', (product_id,))
+        job_id = cursor.lastrowid
+        row = conn.execute('SELECT * FROM scrape_jobs WHERE id = ?', (job_id,)).fetchone()
+        conn.execute('COMMIT')
+
+        logger.info(f"📥 Job de scraping {job_id} en file ({'produit ' + str(product_id) if product_id else 'catalogue'})")
+        return {**_job_from_row(row), 'merged': False}
+
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+def claim_scrape_job(worker):
+    """
+    Réserver le plus ancien job en file (sûr entre threads et processus)
+
+    Args:
+        worker (str): Nom du worker qui exécute le job
+
+    Returns:
+        dict: Job passé à l'état 'running', ou None si la file est vide
+    """
+    conn = get_db_connection()
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('''
+                           SELECT id FROM scrape_jobs
+                           WHERE status = 'queued'
+                           ORDER BY id
+                           LIMIT 1
+                           ''').fetchone()
+
+        if not row:
+            conn.execute('COMMIT')
+            return None
+
+        conn.execute('''
+                     UPDATE scrape_jobs
+                     SET status = 'running', worker = ?, started_at = CURRENT_TIMESTAMP,
+                         updated_at = CURRENT_TIMESTAMP
+                     WHERE id = ?
+                     ''', (worker, row['id']))
+        job = conn.execute('SELECT * FROM scrape_jobs WHERE id = ?', (row['id'],)).fetchone()
+        conn.execute('COMMIT')
+        return _job_from_row(job)
+
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+def update_scrape_job_progress(job_id, total=None, completed=0, succeeded=0, failed=0):
+    """
+    Mettre à jour l'avancement d'un job en cours
+
+    Returns:
+        bool: True si l'annulation du job a été demandée
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+                   UPDATE scrape_jobs
+                   SET total = COALESCE(?, total), completed = ?, succeeded = ?, failed = ?,
+                       updated_at = CURRENT_TIMESTAMP
+                   WHERE id = ?
+                   ''', (total, completed, succeeded, failed, job_id))
+    row = cursor.execute('SELECT cancel_requested FROM scrape_jobs WHERE id = ?', (job_id,)).fetchone()
+
+    conn.commit()
+    conn.close()
+    return bool(row and row['cancel_requested'])
+
+def finish_scrape_job(job_id, status, results=None, error_message=None):
+    """
+    Clore un job ('done', 'failed' ou 'cancelled')
+
+    Args:
+        job_id (int): ID du job
+        status (str): État final
+        results (list): Résultat par lien (shop_name, price, success, ...)
+        error_message (str): Erreur ayant interrompu le job
+    """
+    conn = get_db_connection()
+    conn.execute('''
+                 UPDATE scrape_jobs
+                 SET status = ?, results = ?, error_message = ?,
+                     updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+                 WHERE id = ?
+                 ''', (status, json.dumps(results or [], default=str), error_message, job_id))
+    conn.commit()
+    conn.close()
+
+def get_scrape_job(job_id):
+    """Récupérer un job de scraping par son ID"""
+    conn = get_db_connection()
+    row = conn.execute('SELECT * FROM scrape_jobs WHERE id = ?', (job_id,)).fetchone()
+    conn.close()
+    return _job_from_row(row)
+
+def cancel_scrape_job(job_id):
+    """
+    Annuler un job : immédiatement s'il est en file, au prochain lien s'il est en cours
+
+    Returns:
+        dict: Job mis à jour, ou None s'il n'existe pas
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+                   UPDATE scrape_jobs
+                   SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = ? AND status = 'queued'
+                   ''', (job_id,))
+    cursor.execute('''
+                   UPDATE scrape_jobs
+                   SET cancel_requested = 1, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = ? AND status = 'running'
+                   ''', (job_id,))
+
+    conn.commit()
+    conn.close()
+    return get_scrape_job(job_id)
+
+def requeue_stale_scrape_jobs(stale_after=600):
+    """
+    Remettre en file les jobs 'running' sans nouvelles depuis `stale_after`
+    secondes (worker arrêté en cours de job)
+
+    Returns:
+        int: Nombre de jobs remis en file
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+                   UPDATE scrape_jobs
+                   SET status = 'queued', worker = NULL, updated_at = CURRENT_TIMESTAMP
+                   WHERE status = 'running' AND updated_at < datetime('now', ?)
+                   ''', (f'-{int(stale_after)} seconds',))
+    count = cursor.rowcount
+
+    conn.commit()
+    conn.close()
+
+    if count:
+        logger.warning(f"{count} job(s) de scraping interrompu(s) remis en file")
+    return count
+
+"""SCHEDULE"""
+def get_link_schedules(link_ids):
+    """
+    Récupérer la planification de liens
+
+    Args:
+        link_ids (list): IDs des liens
+
+    Returns:
+        dict: {link_id: {'interval_seconds', 'next_run_at', 'last_run_at', 'adaptive_interval',
+                         'change_rate', 'unchanged_runs', 'last_change_at'}}
+    """
+    if not link_ids:
+        return {}
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    placeholders = ','.join('?' * len(link_ids))
+    rows = cursor.execute(f'''
+                          SELECT product_link_id, interval_seconds, next_run_at, last_run_at,
+                                 adaptive_interval, change_rate, unchanged_runs, last_change_at
+                          FROM link_schedule
+                          WHERE product_link_id IN ({placeholders})
+                          ''', list(link_ids)).fetchall()
+
+    conn.close()
+    return {row['product_link_id']: dict_from_row(row) for row in rows}
+
+def set_link_interval(product_link_id, interval_seconds):
+    """
+    Régler la fréquence de scraping d'un lien (None = fréquence de la boutique ou globale)
+
+    La prochaine date est recalculée par le planificateur.
+    """
+    conn = get_db_connection()
+    conn.execute('''
+                 INSERT INTO link_schedule (product_link_id, interval_seconds, updated_at)
+                 VALUES (?, ?, CURRENT_TIMESTAMP)
+                 ON CONFLICT(product_link_id) DO UPDATE SET
+                     interval_seconds = excluded.interval_seconds,
+                     next_run_at      = NULL,
+                     updated_at       = CURRENT_TIMESTAMP
+                 ''', (product_link_id, interval_seconds))
+    conn.commit()
+    conn.close()
+
+def get_unscheduled_links():
+    """Liens sans prochaine date de scraping (nouveaux liens ou fréquence modifiée)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    rows = cursor.execute('''
+                          SELECT pl.id, pl.url, ls.interval_seconds, ls.adaptive_interval, ls.last_run_at
+                          FROM product_links pl
+                                   LEFT JOIN link_schedule ls ON ls.product_link_id = pl.id
+                          WHERE ls.next_run_at IS NULL
+                          ''').fetchall()
+
+    conn.close()
+    return [dict_from_row(row) for row in rows]
+
+def schedule_link_runs(next_runs):
+    """
+    Enregistrer les prochaines dates de scraping
+
+    Args:
+        next_runs (list): Couples (link_id, timestamp epoch)
+    """
+    if not next_runs:
+        return
+
+    conn = get_db_connection()
+    conn.executemany('''
+                     INSERT INTO link_schedule (product_link_id, next_run_at, updated_at)
+                     VALUES (?, datetime(?, 'unixepoch'), CURRENT_TIMESTAMP)
+                     ON CONFLICT(product_link_id) DO UPDATE SET
+                         next_run_at = excluded.next_run_at,
+                         updated_at  = CURRENT_TIMESTAMP
+                     ''', [(link_id, int(run_at)) for link_id, run_at in next_runs])
+    conn.commit()
+    conn.close()
+
+def claim_due_links(lease_seconds=900, limit=500):
+    """
+    Réserver les liens dont la date de scraping est passée
+
+    Leur prochaine date est repoussée de `lease_seconds` pendant le scraping,
+    ce qui évite qu'un autre planificateur (autre processus) les reprenne.
+
+    Returns:
+        list: Liens dus (id, product_id, shop_name, url, css_selector, interval_seconds,
+              adaptive_interval, unchanged_runs)
+    """
+    conn = get_db_connection()
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute('''
+                            SELECT pl.id, pl.product_id, pl.shop_name, pl.url, pl.css_selector,
+                                   ls.interval_seconds, ls.adaptive_interval, ls.unchanged_runs
+                            FROM link_schedule ls
+                                     JOIN product_links pl ON pl.id = ls.product_link_id
+                            WHERE ls.next_run_at <= datetime('now')
+                            ORDER BY ls.next_run_at
+                            LIMIT ?
+                            ''', (limit,)).fetchall()
+
+        if rows:
+            conn.executemany('''
+                             UPDATE link_schedule
+                             SET next_run_at = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                             WHERE product_link_id = ?
+                             ''', [(f'+{int(lease_seconds)} seconds', row['id']) for row in rows])
+
+        conn.execute('COMMIT')
+        return [dict_from_row(row) for row in rows]
+
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+def mark_link_run(product_link_id, next_run_at, adaptive=None):
+    """
+    Enregistrer un scraping planifié effectué et la date du suivant
+
+    Args:
+        product_link_id (int): ID du lien
+        next_run_at (float): Prochaine date de scraping (timestamp epoch)
+        adaptive (dict, optional): État de la fréquence adaptative
+            (adaptive_interval, change_rate, unchanged_runs, changed)
+    """
+    conn = get_db_connection()
+    if adaptive is None:
+        conn.execute('''
+                     UPDATE link_schedule
+                     SET last_run_at = CURRENT_TIMESTAMP,
+                         next_run_at = datetime(?, 'unixepoch'),
+                         updated_at  = CURRENT_TIMESTAMP
+                     WHERE product_link_id = ?
+                     ''', (int(next_run_at), product_link_id))
+    else:
+        conn.execute('''
+                     UPDATE link_schedule
+                     SET last_run_at       = CURRENT_TIMESTAMP,
+                         next_run_at       = datetime(?, 'unixepoch'),
+                         adaptive_interval = ?,
+                         change_rate       = ?,
+                         unchanged_runs    = ?,
+                         last_change_at    = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE last_change_at END,
+                         updated_at        = CURRENT_TIMESTAMP
+                     WHERE product_link_id = ?
+                     ''', (int(next_run_at), adaptive.get('adaptive_interval'), adaptive.get('change_rate'),
+                           adaptive.get('unchanged_runs', 0), bool(adaptive.get('changed')), product_link_id))
+    conn.commit()
+    conn.close()
+
+def get_link_volatility(link_ids, days=30):
+    """
+    Volatilité récente des prix de liens (avant un nouveau scraping)
+
+    Un changement est une différence de prix ou de disponibilité entre deux
+    relevés réussis consécutifs de la fenêtre ; un relevé prolongé ou compacté
+    compte pour toutes ses observations.
+
+    Args:
+        link_ids (list): IDs des liens
+        days (int): Fenêtre d'observation (jours)
+
+    Returns:
+        dict: {link_id: {'observations', 'changes', 'span_seconds', 'last_price', 'last_available'}}
+    """
+    if not link_ids:
+        return {}
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    placeholders = ','.join('?' * len(link_ids))
+    rows = cursor.execute(f'''
+                          WITH recent AS (
+                              SELECT product_link_id, price, is_available, scraped_at, observations,
+                                     COALESCE(first_seen_at, scraped_at) AS first_seen_at,
+                                     LAG(price) OVER w        AS previous_price,
+                                     LAG(is_available) OVER w AS previous_available,
+                                     ROW_NUMBER() OVER (PARTITION BY product_link_id
+                                                        ORDER BY scraped_at DESC, id DESC) AS recency
+                              FROM price_history
+                              WHERE product_link_id IN ({placeholders})
+                                AND price IS NOT NULL
+                                AND scraped_at >= datetime('now', ?)
+                              WINDOW w AS (PARTITION BY product_link_id ORDER BY scraped_at, id)
+                          )
+                          SELECT product_link_id,
+                                 SUM(observations) AS observations,
+                                 SUM(previous_price IS NOT NULL
+                                     AND (ABS(price - previous_price) > 0.005
+                                          OR is_available != previous_available)) AS changes,
+                                 strftime('%s', 'now') - strftime('%s', MAX(MIN(first_seen_at),
+                                                                            datetime('now', ?))) AS span_seconds,
+                                 MAX(CASE WHEN recency = 1 THEN price END) AS last_price,
+                                 MAX(CASE WHEN recency = 1 THEN is_available END) AS last_available
+                          FROM recent
+                          GROUP BY product_link_id
+                          ''', list(link_ids) + [f'-{int(days)} days'] * 2).fetchall()
+
+    conn.close()
+    return {row['product_link_id']: dict_from_row(row) for row in rows}
+
+"""PRICES"""
+def record_price(product_link_id, price, currency='EUR', is_available=True, error_message=None, unchanged=False):
+    """
+    Enregistrer un prix pour un lien de produit
+
+    Avec PRICE_STORAGE_MODE = 'changes', ou pour un relevé connu inchangé
+    (unchanged), un relevé identique au dernier relevé du lien prolonge
+    celui-ci au lieu de créer une ligne.
+
+    Args:
+        product_link_id (int): ID du lien de produit
+        price (float): Prix à enregistrer
+        currency (str): Devise du prix (par défaut 'EUR')
+        is_available (bool): Disponibilité du produit (par défaut True)
+        error_message (str, optional): Message d'erreur en cas d'indisponibilité
+        unchanged (bool): Prix repris du cache HTTP (304 ou page identique)
+
+    Returns:
+        int: ID de l'enregistrement de prix (nouveau ou prolongé)
+    """
+    conn = get_db_connection()
+    changes_only = unchanged or (current_app.config.get('PRICE_STORAGE_MODE', 'every') == 'changes'
+                                 if current_app else False)
+
+    try:
+        price_history_id, extended = store_price(
+            conn,
+            (product_link_id, price, currency, is_available, error_message, scrape_timestamp()),
+            changes_only
+        )
+        conn.commit()
+        invalidate_links(conn, [product_link_id])
+        if extended:
+            logger.info(f"Prix inchangé prolongé pour le lien {product_link_id}")
+        else:
+            logger.info(f"Prix enregistré avec succès pour le lien {product_link_id}")
+        return price_history_id
+
+    except Exception as e:
+        logger.error(f"Erreur lors de l'enregistrement du prix pour le lien {product_link_id}: {e}")
+        raise
+
+    finally:
+        conn.close()
+
+def _summarize_latest_prices(rows):
+    """Prix par lien (lignes de link_latest_price jointes aux liens) et meilleur prix disponible"""
+    prices = []
+    for row in rows:
+        prices.append({
+            'link_id': row['link_id'],
+            'shop_name': row['shop_name'],
+            'url': row['url'],
+            'css_selector': row['css_selector'],
+            'price': row['price'],
+            'currency': row['currency'] or 'EUR',
+            'is_available': row['is_available'] if row['price_history_id'] is not None else False,
+            'error_message': row['error_message'],
+            'scraped_at': row['scraped_at']
+        })
+
+    # Meilleur prix parmi les prix disponibles (contient aussi l'URL de la boutique)
+    available_prices = [price for price in prices if price['is_available'] and price['price'] is not None]
+    best_price = min(available_prices, key=lambda x: x['price']) if available_prices else None
+
+    return {
+        'prices': prices,
+        'best_price': best_price
+    }
+
+LATEST_PRICES_QUERY = '''
+                      SELECT pl.product_id,
+                             pl.id AS link_id,
+                             pl.shop_name,
+                             pl.url,
+                             pl.css_selector,
+                             lp.price_history_id,
+                             lp.price,
+                             lp.currency,
+                             lp.is_available,
+                             lp.error_message,
+                             lp.scraped_at
+                      FROM product_links pl
+                               LEFT JOIN link_latest_price lp ON lp.product_link_id = pl.id
+                      '''
+
+@cached
+def get_latest_prices(product_id):
+    """
+    Derniers prix d'un produit, boutique par boutique
+
+    Lus dans link_latest_price (tenue à jour par triggers) : une seule
+    requête, indépendante de la taille de l'historique.
+
+    Returns:
+        dict: prices (un élément par lien, trié par boutique), best_price
+    """
+    conn = get_db_connection()
+    rows = conn.execute(LATEST_PRICES_QUERY + '''
+                        WHERE pl.product_id = ?
+                        ORDER BY pl.shop_name
+                        ''', (product_id,)).fetchall()
+    conn.close()
+
+    return _summarize_latest_prices(rows)
+
+def get_catalogue_latest_prices():
+    """
+    Derniers prix de tous les produits en une requête (pages de liste)
+
+    Returns:
+        dict: {product_id: {'prices', 'best_price'}} (produits ayant au moins un lien)
+    """
+    conn = get_db_connection()
+    rows = conn.execute(LATEST_PRICES_QUERY + '''
+                        ORDER BY pl.product_id, pl.shop_name
+                        ''').fetchall()
+    conn.close()
+
+    by_product = {}
+    for row in rows:
+        by_product.setdefault(row['product_id'], []).append(row)
+
+    return {product_id: _summarize_latest_prices(product_rows)
+            for product_id, product_rows in by_product.items()}
+
+# Tris du catalogue : (clé de tri SQL, colonne d'ID, ordre par défaut) ; les produits sans valeur
+# viennent en dernier. Les clés reprennent les expressions indexées (migration 4).
+CATALOGUE_SORTS = {
+    'created': ('p.created_at', 'p.id', 'desc'),
+    'name': ('p.name COLLATE NOCASE', 'p.id', 'asc'),
+    'best_price': ('COALESCE(s.best_price, 9e999)', 's.product_id', 'asc'),
+    'latest_change': ("COALESCE(s.changed_at, '')", 's.product_id', 'desc'),
+}
+
+def get_catalogue(sort='created', order=None, limit=50, after=None, recent_limit=3):
+    """
+    Page du catalogue : produits avec meilleur prix, boutiques disponibles et prix récents
+
+    Une seule requête, paginée par clé (keyset) : la page est lue dans
+    l'index du tri à partir du dernier produit de la page précédente,
+    sans OFFSET, puis seuls ses liens sont joints. Le coût d'une page
+    ne dépend ni de sa profondeur ni de la taille du catalogue.
+
+    Args:
+        sort (str): Tri (voir CATALOGUE_SORTS : created, name, best_price, latest_change)
+        order (str, optional): 'asc' ou 'desc' (défaut propre au tri)
+        limit (int): Nombre de produits par page
+        after (list, optional): Curseur [clé de tri, id] du dernier produit de la page précédente
+        recent_limit (int): Nombre de prix disponibles conservés par produit
+
+    Returns:
+        dict: products, next_cursor (None en fin de catalogue), total, sort, order
+    """
+    if sort not in CATALOGUE_SORTS:
+        raise ValueError(f"Tri inconnu : {sort}")
+    sort_key, id_column, default_order = CATALOGUE_SORTS[sort]
+    order = (order or default_order).lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"Ordre inconnu : {order}")
+
+    # Forme développée de (clé, id) > (?, ?) : seule la borne sur la clé permet un parcours d'index
+    comparison = '>' if order == 'asc' else '<'
+    keyset = ''
+    params = []
+    if after:
+        keyset = (f'WHERE {sort_key} {comparison}= ? '
+                  f'AND ({sort_key} {comparison} ? OR {id_column} {comparison} ?)')
+        params = [after[0], after[0], after[1]]
+
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+                        WITH page AS (
+                            SELECT p.id, p.name, p.description, p.created_at, p.updated_at,
+                                   {sort_key} AS sort_value
+                            FROM products p
+                                     JOIN product_price_summary s ON s.product_id = p.id
+                            {keyset}
+                            ORDER BY {sort_key} {order}, {id_column} {order}
+                            LIMIT ?
+                        )
+                        SELECT page.*,
+                               pl.id AS link_id,
+                               pl.shop_name,
+                               pl.url,
+                               lp.price,
+                               lp.currency,
+                               lp.scraped_at,
+                               lp.changed_at,
+                               COALESCE(lp.is_available AND lp.price IS NOT NULL, 0) AS available
+                        FROM page
+                                 LEFT JOIN product_links pl ON pl.product_id = page.id
+                                 LEFT JOIN link_latest_price lp ON lp.product_link_id = pl.id
+                        ORDER BY page.sort_value {order}, page.id {order}, available DESC, lp.price, pl.shop_name
+                        ''', params + [limit + 1]).fetchall()
+
+    total = conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+    conn.close()
+
+    products = []
+    for row in rows:
+        if not products or products[-1]['id'] != row['id']:
+            products.append({
+                'id': row['id'],
+                'name': row['name'],
+                'description': row['description'],
+                'created_at': row['created_at'],
+                'updated_at': row['updated_at'],
+                'sort_value': row['sort_value'],
+                'best_price': None,
+                'available_shops': 0,
+                'has_prices': False,
+                'changed_at': None,
+                'recent_prices': [],
+            })
+        product = products[-1]
+
+        if row['link_id'] is None:
+            continue
+        product['has_prices'] = True
+        if row['changed_at'] and (product['changed_at'] is None or row['changed_at'] > product['changed_at']):
+            product['changed_at'] = row['changed_at']
+
+        if row['available']:
+            price = {
+                'link_id': row['link_id'],
+                'shop_name': row['shop_name'],
+                'url': row['url'],
+                'price': row['price'],
+                'currency': row['currency'] or 'EUR',
+                'is_available': True,
+                'scraped_at': row['scraped_at'],
+            }
+            # Lignes triées par prix : le premier prix disponible est le meilleur
+            if product['best_price'] is None:
+                product['best_price'] = price
+            product['available_shops'] += 1
+            if len(product['recent_prices']) < recent_limit:
+                product['recent_prices'].append(price)
+
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = [products[-1]['sort_value'], products[-1]['id']]
+
+    for product in products:
+        del product['sort_value']
+
+    return {
+        'products': products,
+        'next_cursor': next_cursor,
+        'total': total,
+        'sort': sort,
+        'order': order,
+    }
+
+def get_price_history(product_id, limit=50):
+    """
+    Historique complet des prix pour un produit (pour graphiques futurs)
+
+    Args:
+        product_id (int): ID du produit
+        limit (int): Nombre maximum d'entrées
+
+    Returns:
+        list: Historique des prix
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    rows = cursor.execute('''
+                          SELECT ph.*,
+                                 pl.shop_name,
+                                 pl.url
+                          FROM price_history ph
+                                   JOIN product_links pl ON ph.product_link_id = pl.id
+                          WHERE pl.product_id = ?
+                          ORDER BY ph.scraped_at DESC LIMIT ?
+                          ''', (product_id, limit)).fetchall()
+
+    conn.close()
+    return [dict_from_row(row) for row in rows]
+
+def iter_price_history(product_id=None, shop=None, since=None, until=None, batch_size=1000):
+    """
+    Relevés de prix pour l'export, lus au fil du curseur SQLite (sans limite)
+
+    Les relevés sont parcourus par produit, boutique puis date, dans l'ordre
+    des index : pas de tri en mémoire, seuls batch_size relevés sont chargés
+    à la fois. Un relevé prolongé ou compacté est retenu si sa plage
+    d'observation (first_seen_at -> scraped_at) recoupe la période.
+
+    Args:
+        product_id (int, optional): Produit à exporter (par défaut tout le catalogue)
+        shop (str, optional): Filtrer par boutique
+        since (str, optional): Premier jour inclus (YYYY-MM-DD)
+        until (str, optional): Dernier jour inclus (YYYY-MM-DD)
+        batch_size (int): Relevés lus par lot
+
+    Yields:
+        dict: Relevé avec son produit, sa boutique et son URL
+    """
+    conditions, params = [], []
+    if product_id is not None:
+        conditions.append('p.id = ?')
+        params.append(product_id)
+    if shop:
+        conditions.append('pl.shop_name = ?')
+        params.append(shop)
+    if since:
+        conditions.append('ph.scraped_at >= ?')
+        params.append(since)
+    if until:
+        conditions.append("COALESCE(ph.first_seen_at, ph.scraped_at) < date(?, '+1 day')")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(f'''
+                              SELECT p.id                                    AS product_id,
+                                     p.name                                  AS product_name,
+                                     pl.shop_name,
+                                     pl.url,
+                                     ph.price,
+                                     ph.currency,
+                                     ph.is_available,
+                                     ph.error_message,
+                                     COALESCE(ph.first_seen_at, ph.scraped_at) AS first_seen_at,
+                                     ph.scraped_at,
+                                     ph.observations
+                              FROM products p
+                                       -- Ordre de jointure imposé : parcours des index dans l'ordre du tri
+                                       CROSS JOIN product_links pl ON pl.product_id = p.id
+                                       CROSS JOIN price_history ph ON ph.product_link_id = pl.id
+                              {where}
+                              ORDER BY p.id, pl.shop_name, pl.id, ph.scraped_at
+                              ''', params)
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict_from_row(row)
+    finally:
+        conn.close()
+
+def get_price_history_rows(after_id=0, ids=(), limit=10000):
+    """
+    Relevés par identifiant croissant, joints à leur lien et produit (snapshot analytique)
+
+    Args:
+        after_id (int): Relevés d'ID strictement supérieur (reprise incrémentale)
+        ids (iterable): Relevés précis à relire à la place (relevés mis en attente)
+        limit (int): Relevés au plus
+
+    Returns:
+        list: Relevés ; is_open indique le dernier relevé du lien, qui peut encore
+              être prolongé (PRICE_STORAGE_MODE = 'changes') ou compacté
+    """
+    ids = list(ids)
+    if ids:
+        condition, params = f"ph.id IN ({','.join('?' * len(ids))})", ids
+    else:
+        condition, params = 'ph.id > ?', [after_id]
+
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+                        SELECT ph.id                                        AS price_id,
+                               p.id                                         AS product_id,
+                               p.name                                       AS product_name,
+                               pl.id                                        AS product_link_id,
+                               pl.shop_name,
+                               pl.url,
+                               ph.price,
+                               ph.currency,
+                               ph.is_available,
+                               ph.error_message,
+                               COALESCE(ph.first_seen_at, ph.scraped_at)    AS first_seen_at,
+                               ph.scraped_at,
+                               ph.observations,
+                               lp.price_history_id IS NOT NULL              AS is_open
+                        FROM price_history ph
+                                 JOIN product_links pl ON pl.id = ph.product_link_id
+                                 JOIN products p ON p.id = pl.product_id
+                                 LEFT JOIN link_latest_price lp ON lp.product_link_id = ph.product_link_id
+                                                               AND lp.price_history_id = ph.id
+                        WHERE {condition}
+                        ORDER BY ph.id
+                        LIMIT ?
+                        ''', params + [limit]).fetchall()
+
+    conn.close()
+    return [dict_from_row(row) for row in rows]
+
+@cached
+def get_price_history_data(product_id, days=30):
+    """
+    Récupérer les données d'historique pour les graphiques (un point par jour)
+
+    Args:
+        product_id (int): ID du produit
+        days (int): Nombre de jours d'historique (par défaut 30)
+
+    Returns:
+        dict: Données formatées pour Chart.js
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Dernier prix de chaque jour par boutique (agrégats journaliers)
+    rows = cursor.execute('''
+                          SELECT pl.shop_name,
+                                 r.bucket AS scrape_date,
+                                 r.last_price AS price,
+                                 r.min_price,
+                                 r.max_price,
+                                 r.sum_price,
+                                 r.samples
+                          FROM product_links pl
+                              JOIN price_rollup_daily r
+                          ON r.product_link_id = pl.id
+                          WHERE pl.product_id = ?
+                            AND r.bucket >= date('now'
+                              , '-' || ? || ' days')
+                          ORDER BY r.bucket ASC, r.last_at ASC
+                          ''', (product_id, days)).fetchall()
+
+    conn.close()
+
+    if not rows:
+        return {
+            'labels': [],
+            'datasets': [],
+            'stats': {}
+        }
+
+    # Organiser les données par boutique
+    shops_data = {}
+    all_dates = set()
+
+    for row in rows:
+        shop = row['shop_name']
+        date = row['scrape_date']
+        price = float(row['price'])
+
+        if shop not in shops_data:
+            shops_data[shop] = {}
+
+        # Garder le dernier prix du jour
+        shops_data[shop][date] = price
+        all_dates.add(date)
+
+    # Créer les labels (dates triées)
+    sorted_dates = sorted(all_dates)
+
+    # Couleurs pour les boutiques
+    colors = [
+        'rgb(255, 99, 132)',  # Rouge
+        'rgb(54, 162, 235)',  # Bleu
+        'rgb(255, 205, 86)',  # Jaune
+        'rgb(75, 192, 192)',  # Vert
+        'rgb(153, 102, 255)',  # Violet
+        'rgb(255, 159, 64)',  # Orange
+    ]
+
+    # Créer les datasets pour Chart.js
+    datasets = []
+    color_index = 0
+
+    for shop, price_data in shops_data.items():
+        # Créer la série de données pour cette boutique
+        data_points = []
+        for date in sorted_dates:
+            if date in price_data:
+                data_points.append(price_data[date])
+            else:
+                # Si pas de prix ce jour, garder le dernier prix connu
+                data_points.append(data_points[-1] if data_points else None)
+
+        datasets.append({
+            'label': shop,
+            'data': data_points,
+            'borderColor': colors[color_index % len(colors)],
+            'backgroundColor': colors[color_index % len(colors)].replace('rgb', 'rgba').replace(')', ', 0.1)'),
+            'tension': 0.1,
+            'fill': False
+        })
+        color_index += 1
+
+    # Calculer les statistiques
+    total_records = sum(row['samples'] for row in rows)
+    stats = {
+        'min_price': min(row['min_price'] for row in rows),
+        'max_price': max(row['max_price'] for row in rows),
+        'avg_price': sum(row['sum_price'] for row in rows) / total_records,
+        'total_records': total_records,
+        'shops_count': len(shops_data),
+        'date_range': f"{sorted_dates[0]} à {sorted_dates[-1]}" if sorted_dates else "Aucune donnée"
+    }
+
+    return {
+        'labels': sorted_dates,
         'datasets': datasets,
         'stats': stats
     }
 
+@cached
 def get_price_history_table(product_id, page=1, per_page=50, shop_filter=None):
     """
     Historique paginé pour tableau
@@ -706,6 +1762,8 @@ def get_price_history_table(product_id, page=1, per_page=50, shop_filter=None):
     rows = cursor.execute(f'''
         SELECT 
             ph.scraped_at,
+            ph.first_seen_at,
+            ph.observations,
             ph.price,
             ph.currency,
             ph.is_available,
@@ -733,6 +1791,7 @@ def get_price_history_table(product_id, page=1, per_page=50, shop_filter=None):
         }
     }
 
+@cached
 def get_price_alerts_data(product_id):
     """
     Données pour les alertes de prix
@@ -800,64 +1859,30 @@ def get_price_alerts_data(product_id):
     return alerts
 
 """STATS"""
+# Résolutions des graphiques et statistiques, de la plus fine à la plus grossière :
+# (nom, table d'agrégats, durée d'un intervalle en secondes)
+HISTORY_RESOLUTIONS = (
+    ('hourly', 'price_rollup_hourly', 3600),
+    ('daily', 'price_rollup_daily', 86400),
+)
+
 def get_global_stats():
-    """Récupérer les statistiques globales de l'application"""
+    """
+    Récupérer les statistiques globales de l'application
+
+    Lues dans stats_counters (tenue à jour par triggers, voir la migration 8) :
+    une seule requête, indépendante de la taille de l'historique. Un relevé
+    prolongé ou compacté compte toutes ses observations.
+    """
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Nombre d'articles suivis
-        products_count = cursor.execute('SELECT COUNT(*) FROM products').fetchone()[0]
-
-        # Nombre de liens suivis
-        links_count = cursor.execute('SELECT COUNT(*) FROM product_links').fetchone()[0]
-
-        # Nombre total de scraping
-        total_scrapes = cursor.execute('SELECT COUNT(*) FROM price_history').fetchone()[0]
-
-        # Nombre de scraping réussis
-        successful_scrapes = cursor.execute('''
-                                            SELECT COUNT(*)
-                                            FROM price_history
-                                            WHERE is_available = 1
-                                              AND price IS NOT NULL
-                                            ''').fetchone()[0]
-
-        # Nombre de scraping échoués
-        failed_scrapes = cursor.execute('''
-                                        SELECT COUNT(*)
-                                        FROM price_history
-                                        WHERE scraped_at IS NOT NULL
-                                          AND (is_available = 0 OR price IS NULL)
-                                        ''').fetchone()[0]
-
-        # Nombre de boutiques différentes
-        unique_shops = cursor.execute('''
-                                      SELECT COUNT(DISTINCT shop_name)
-                                      FROM product_links
-                                      ''').fetchone()[0]
-
-        # Nombre de boutiques sans aucun scraping réussi
-        shops_without_success = cursor.execute('''
-                                               SELECT COUNT(DISTINCT pl.shop_name)
-                                               FROM product_links pl
-                                                        LEFT JOIN price_history ph ON pl.id = ph.product_link_id
-                                                   AND ph.is_available = 1 AND ph.price IS NOT NULL
-                                               WHERE ph.id IS NULL
-                                               ''').fetchone()[0]
-
+        counters = conn.execute(f"SELECT {', '.join(STATS_COUNTERS)} FROM stats_counters").fetchone()
         conn.close()
 
-        return {
-            'products_count': products_count,
-            'links_count': links_count,
-            'total_scrapes': total_scrapes,
-            'successful_scrapes': successful_scrapes,
-            'failed_scrapes': failed_scrapes,
-            'unique_shops': unique_shops,
-            'shops_without_success': shops_without_success,
-            'success_rate': round((successful_scrapes / total_scrapes * 100) if total_scrapes > 0 else 0, 1)
-        }
+        stats = {name: counters[name] if counters else 0 for name in STATS_COUNTERS}
+        total_scrapes, successful_scrapes = stats['total_scrapes'], stats['successful_scrapes']
+        stats['success_rate'] = round((successful_scrapes / total_scrapes * 100) if total_scrapes > 0 else 0, 1)
+        return stats
 
     except Exception as e:
         logger.error(f"Erreur récupération statistiques globales: {e}")
@@ -872,168 +1897,545 @@ def get_global_stats():
             'success_rate': 0
         }
 
-def get_scraping_stats(product_id):
-    """Statistiques de scraping pour un produit"""
+def rebuild_stats_counters():
+    """
+    Recalculer les compteurs du tableau de bord depuis les tables
+    (après une modification manuelle de la base)
+
+    Returns:
+        dict: Compteurs corrigés {nom: (valeur enregistrée, valeur recalculée)}
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        counters = f"SELECT {', '.join(STATS_COUNTERS)} FROM stats_counters"
+        before = dict_from_row(conn.execute(counters).fetchone()) or {}
+        for statement in STATS_COUNTERS_REBUILD:
+            conn.execute(statement)
+        after = dict_from_row(conn.execute(counters).fetchone())
+        conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+    drift = {name: (before.get(name), value) for name, value in after.items() if before.get(name) != value}
+    if drift:
+        logger.warning(f"🔢 Compteurs du tableau de bord corrigés : {drift}")
+    return drift
+
+def get_scraping_stats(product_id):
+    """Statistiques de scraping pour un produit (voir get_product_statistics)"""
+    return get_product_statistics(product_id)['scraping']
+
+@cached
+def get_product_statistics(product_id, days=30, scraping=True):
+    """
+    Statistiques d'un produit en une requête : derniers prix, statistiques de
+    la période, détail par boutique et compteurs de scraping
 
-    stats = cursor.execute('''
-                           SELECT COUNT(*)                                                as total_scrapes,
-                                  COUNT(CASE WHEN ph.is_available = 1 THEN 1 END)        as successful_scrapes,
-                                  COUNT(CASE WHEN ph.error_message IS NOT NULL THEN 1 END) as errors,
-                                  MAX(ph.scraped_at)                                      as last_scrape
-                           FROM price_history ph
-                                    JOIN product_links pl ON ph.product_link_id = pl.id
-                           WHERE pl.product_id = ?
-                           ''', (product_id,)).fetchone()
+    Une ligne par lien : dernier prix (link_latest_price), agrégats de la
+    période et de tout l'historique, compteurs de relevés ; les totaux par
+    produit et par boutique sont calculés par fonctions de fenêtre sur ces
+    lignes. Chaque agrégat est lu lien par lien dans l'ordre de son index.
 
+    Args:
+        product_id (int): ID du produit
+        days (int): Période des statistiques de prix (jours)
+        scraping (bool): Calculer les compteurs de scraping (seul parcours de l'historique brut)
+
+    Returns:
+        dict: prices et best_price (voir get_latest_prices), price_stats
+              (voir get_price_statistics), scraping (voir get_scraping_stats, None si non demandé)
+    """
+    _, table, bucket_format = get_history_resolution(days)
+
+    product_links = 'SELECT id FROM product_links WHERE product_id = ?'
+    if scraping:
+        scrapes = f'''
+                  SELECT ph.product_link_id,
+                         SUM(ph.observations)                                                        AS total_scrapes,
+                         SUM(CASE WHEN ph.is_available = 1 THEN ph.observations ELSE 0 END)          AS successful_scrapes,
+                         SUM(CASE WHEN ph.error_message IS NOT NULL THEN ph.observations ELSE 0 END) AS errors
+                  FROM price_history ph
+                  WHERE ph.product_link_id IN ({product_links})
+                  GROUP BY ph.product_link_id
+                  '''
+        params = (product_id, product_id, product_id, days, product_id)
+    else:
+        scrapes = 'SELECT NULL AS product_link_id, NULL AS total_scrapes, NULL AS successful_scrapes, NULL AS errors'
+        params = (product_id, product_id, days, product_id)
+
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+                        SELECT links.*,
+                               period.samples                          AS period_samples,
+                               -- Produit, période demandée
+                               MIN(period.min_price) OVER product      AS min_price,
+                               MAX(period.max_price) OVER product      AS max_price,
+                               SUM(period.sum_price) OVER product
+                                   / SUM(period.samples) OVER product  AS avg_price,
+                               COALESCE(SUM(period.samples) OVER product, 0) AS total_samples,
+                               MIN(period.first_at) OVER product       AS first_scrape,
+                               MAX(period.last_at) OVER product        AS last_scrape,
+                               -- Boutique, tout l'historique
+                               SUM(overall.samples) OVER shop          AS shop_records_count,
+                               MIN(overall.min_price) OVER shop        AS shop_min_price,
+                               MAX(overall.max_price) OVER shop        AS shop_max_price,
+                               SUM(overall.sum_price) OVER shop
+                                   / SUM(overall.samples) OVER shop    AS shop_avg_price,
+                               MAX(overall.last_at) OVER shop          AS shop_last_scrape,
+                               -- Produit, scraping
+                               COALESCE(SUM(scrapes.total_scrapes) OVER product, 0)      AS total_scrapes,
+                               COALESCE(SUM(scrapes.successful_scrapes) OVER product, 0) AS successful_scrapes,
+                               COALESCE(SUM(scrapes.errors) OVER product, 0)             AS errors,
+                               MAX(links.scraped_at) OVER product      AS last_scraped_at
+                        FROM ({LATEST_PRICES_QUERY} WHERE pl.product_id = ?) links
+                                 -- Sous-requêtes restreintes aux liens du produit : recherche par index, pas de parcours complet
+                                 LEFT JOIN ({scrapes}) scrapes ON scrapes.product_link_id = links.link_id
+                                 LEFT JOIN (
+                                     SELECT r.product_link_id,
+                                            MIN(r.min_price) AS min_price, MAX(r.max_price) AS max_price,
+                                            SUM(r.sum_price) AS sum_price, SUM(r.samples) AS samples,
+                                            MIN(r.first_at)  AS first_at,  MAX(r.last_at)   AS last_at
+                                     FROM {table} r
+                                     WHERE r.product_link_id IN ({product_links})
+                                       AND r.bucket >= strftime('{bucket_format}', 'now', '-' || ? || ' days')
+                                     GROUP BY r.product_link_id
+                                 ) period ON period.product_link_id = links.link_id
+                                 LEFT JOIN (
+                                     SELECT r.product_link_id,
+                                            MIN(r.min_price) AS min_price, MAX(r.max_price) AS max_price,
+                                            SUM(r.sum_price) AS sum_price, SUM(r.samples) AS samples,
+                                            MAX(r.last_at)   AS last_at
+                                     FROM price_rollup_daily r
+                                     WHERE r.product_link_id IN ({product_links})
+                                     GROUP BY r.product_link_id
+                                 ) overall ON overall.product_link_id = links.link_id
+                        WINDOW product AS (),
+                               shop AS (PARTITION BY links.shop_name)
+                        ORDER BY links.shop_name
+                        ''', params).fetchall()
     conn.close()
 
-    if stats:
-        return {
-            'total_scrapes': stats['total_scrapes'] or 0,
-            'successful_scrapes': stats['successful_scrapes'] or 0,
-            'errors': stats['errors'] or 0,
-            'last_scrape': stats['last_scrape'],
-            'success_rate': round((stats['successful_scrapes'] / max(stats['total_scrapes'], 1)) * 100, 1)
-        }
+    statistics = _summarize_latest_prices(rows)
+    totals = rows[0] if rows else None
 
-    return {
-        'total_scrapes': 0,
-        'successful_scrapes': 0,
-        'errors': 0,
-        'last_scrape': None,
-        'success_rate': 0
+    total_scrapes = totals['total_scrapes'] if totals else 0
+    statistics['scraping'] = None if not scraping else {
+        'total_scrapes': total_scrapes,
+        'successful_scrapes': totals['successful_scrapes'] if totals else 0,
+        'errors': totals['errors'] if totals else 0,
+        'last_scrape': totals['last_scraped_at'] if totals else None,
+        'success_rate': round((totals['successful_scrapes'] / max(total_scrapes, 1)) * 100, 1) if totals else 0
+    }
+
+    if not totals or totals['total_samples'] == 0:
+        statistics['price_stats'] = None
+        return statistics
+
+    # Meilleur prix actuel : relevé disponible le plus récent, le moins cher à date égale
+    available = [row for row in rows if row['price'] is not None and row['is_available']]
+    best_current = max(available, key=lambda row: (row['scraped_at'] or '', -row['price'])) if available else None
+
+    by_shop = {}
+    for row in rows:
+        if row['shop_records_count'] and row['shop_name'] not in by_shop:
+            by_shop[row['shop_name']] = {
+                'shop_name': row['shop_name'],
+                'records_count': row['shop_records_count'],
+                'min_price': row['shop_min_price'],
+                'max_price': row['shop_max_price'],
+                'avg_price': row['shop_avg_price'],
+                'last_scrape': row['shop_last_scrape'],
+            }
+
+    raw = {
+        'min_price': totals['min_price'],
+        'max_price': totals['max_price'],
+        'avg_price': totals['avg_price'],
+        'total_scrapes': totals['total_samples'],
+        'shops_count': len({row['shop_name'] for row in rows if row['period_samples']}),
+        'first_scrape': totals['first_scrape'],
+        'last_scrape': totals['last_scrape'],
+    }
+    statistics['price_stats'] = {
+        'min_price': round(raw['min_price'], 2) if raw['min_price'] else 0,
+        'max_price': round(raw['max_price'], 2) if raw['max_price'] else 0,
+        'avg_price': round(raw['avg_price'], 2) if raw['avg_price'] else 0,
+
+        'total_scrapes': raw['total_scrapes'],
+        'shops_count': raw['shops_count'],
+        'first_scrape': raw['first_scrape'],
+        'last_scrape': raw['last_scrape'],
+
+        'best_current': {
+            'price': round(best_current['price'], 2),
+            'shop': best_current['shop_name'],
+            'date': best_current['scraped_at']
+        } if best_current else None,
+
+        'by_shop': sorted(by_shop.values(), key=lambda shop: shop['avg_price']),
+        'global': raw  # doublon, mais format de données brutes utilisé dans l'API
     }
+    return statistics
 
 def get_price_statistics(product_id, days=30):
     """
     Statistiques détaillées des prix
 
+    Calculées sur les agrégats horaires ou journaliers (selon la période) :
+    la fenêtre commence au début de l'intervalle contenant 'now - days'.
+    Voir get_product_statistics pour obtenir aussi derniers prix et scraping.
+
     Returns:
         dict: Statistiques complètes
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    return get_product_statistics(product_id, days, scraping=False)['price_stats']
 
-    stats = cursor.execute('''
-                           SELECT MIN(ph.price)                as min_price,
-                                  MAX(ph.price)                as max_price,
-                                  AVG(ph.price)                as avg_price,
-                                  COUNT(ph.id)                 as total_scrapes,
-                                  COUNT(DISTINCT pl.shop_name) as shops_count,
-                                  MIN(ph.scraped_at)           as first_scrape,
-                                  MAX(ph.scraped_at)           as last_scrape
-                           FROM price_history ph
-                                    JOIN product_links pl ON ph.product_link_id = pl.id
-                           WHERE pl.product_id = ?
-                             AND ph.price IS NOT NULL
-                             AND ph.scraped_at >= datetime('now', '-' || ? || ' days')
-                           ''', (product_id, days)).fetchone()
-
-    # Meilleur prix actuel
-    best_current = cursor.execute('''
-                                  SELECT ph.price, pl.shop_name, ph.scraped_at
-                                  FROM price_history ph
-                                           JOIN product_links pl ON ph.product_link_id = pl.id
-                                  WHERE pl.product_id = ?
-                                    AND ph.price IS NOT NULL
-                                    AND ph.is_available = 1
-                                  ORDER BY ph.scraped_at DESC, ph.price ASC LIMIT 1
-                                  ''', (product_id,)).fetchone()
-
-    # Stats par boutique
-    shop_stats = cursor.execute('''
-                                SELECT pl.shop_name,
-                                       COUNT(*)           as records_count,
-                                       MIN(ph.price)      as min_price,
-                                       MAX(ph.price)      as max_price,
-                                       AVG(ph.price)      as avg_price,
-                                       MAX(ph.scraped_at) as last_scrape
-                                FROM price_history ph
-                                         JOIN product_links pl ON ph.product_link_id = pl.id
-                                WHERE pl.product_id = ?
-                                  AND ph.price IS NOT NULL
-                                GROUP BY pl.shop_name
-                                ORDER BY avg_price ASC
-                                ''', (product_id,)).fetchall()
-    conn.close()
+def get_history_resolution(days, max_points=None):
+    """
+    Agrégats les plus fins dont le nombre de points par lien tient dans max_points
 
-    if not stats or stats['total_scrapes'] == 0:
-        return None
+    Args:
+        days (int): Période demandée (jours)
+        max_points (int, optional): Points par lien au plus (défaut : CHART_MAX_POINTS)
 
-    return {
-        'min_price': round(stats['min_price'], 2) if stats['min_price'] else 0,
-        'max_price': round(stats['max_price'], 2) if stats['max_price'] else 0,
-        'avg_price': round(stats['avg_price'], 2) if stats['avg_price'] else 0,
+    Returns:
+        tuple: (nom de la résolution, table d'agrégats, format strftime du début d'intervalle)
+    """
+    if max_points is None:
+        max_points = current_app.config.get('CHART_MAX_POINTS', 400) if current_app else 400
 
-        'total_scrapes': stats['total_scrapes'],
-        'shops_count': stats['shops_count'],
-        'first_scrape': stats['first_scrape'],
-        'last_scrape': stats['last_scrape'],
+    for name, table, seconds in HISTORY_RESOLUTIONS:
+        if days * 86400 / seconds <= max_points:
+            break
+    return name, table, ROLLUP_BUCKETS[table]
 
-        'best_current': {
-            'price': round(best_current['price'], 2) if best_current else 0,
-            'shop': best_current['shop_name'] if best_current else 'Aucun',
-            'date': best_current['scraped_at'] if best_current else None
-        } if best_current else None,
+def get_chart_resolution(days):
+    """
+    Agrégats lus pour un graphique : les plus fins dont le nombre de points par
+    lien tient dans CHART_SOURCE_MAX_POINTS (décimés ensuite, voir get_price_history_for_chart)
 
-        'by_shop': [dict_from_row(row) for row in shop_stats],
-        'global': dict_from_row(stats) if stats else {}  # doublon, mais format de données brutes utilisé dans l'API
-    }
+    Returns:
+        tuple: Voir get_history_resolution
+    """
+    source_points = current_app.config.get('CHART_SOURCE_MAX_POINTS', 400) if current_app else 400
+    return get_history_resolution(days, max_points=source_points)
 
-def get_price_history_for_chart(product_id, days=30):
+@cached
+def get_price_history_for_chart(product_id, days=30, shop=None, max_points=None, method='lttb'):
     """
     Données d'historique optimisées pour graphiques Chart.js
 
+    Un point par lien et par intervalle d'agrégat (heure ou jour selon la
+    période, voir get_chart_resolution) : dernier prix de l'intervalle, à la
+    date de ce relevé. Chaque boutique est ensuite décimée à max_points
+    points (voir utils.decimation) : quelques centaines de points par série,
+    quelle que soit la période.
+
     Args:
         product_id (int): ID du produit
-        days (int): Nombre de jours d'historique (7, 30, 90)
+        days (int): Nombre de jours d'historique (7, 30, 90, 365)
+        shop (str, optional): Boutique seule (filtrée en SQL)
+        max_points (int, optional): Points par boutique au plus (défaut : CHART_MAX_POINTS)
+        method (str): Décimation 'lttb' ou 'minmax'
 
     Returns:
         dict: Données formatées pour Chart.js
     """
+    if max_points is None:
+        max_points = current_app.config.get('CHART_MAX_POINTS', 400) if current_app else 400
+    resolution, table, bucket_format = get_chart_resolution(days)
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    rows = cursor.execute('''
+    query = f'''
         SELECT 
-            ph.scraped_at,
-            ph.price,
-            ph.currency,
-            ph.is_available,
+            CAST(strftime('%s', r.last_at) AS INTEGER) AS timestamp,
+            r.last_price AS price,
+            r.last_at AS scraped_at,
+            r.currency,
             pl.shop_name
-        FROM price_history ph
-        JOIN product_links pl ON ph.product_link_id = pl.id
+        FROM product_links pl
+        JOIN {table} r ON r.product_link_id = pl.id
         WHERE pl.product_id = ? 
-        AND ph.scraped_at >= datetime('now', '-{} days')
-        AND ph.price IS NOT NULL
-        ORDER BY ph.scraped_at ASC
-    '''.format(days), (product_id,)).fetchall()
+        AND r.bucket >= strftime('{bucket_format}', 'now', '-' || ? || ' days')
+    '''
+    params = [product_id, days]
+    if shop:
+        query += ' AND pl.shop_name = ?'
+        params.append(shop)
+
+    rows = cursor.execute(query + ' ORDER BY r.bucket ASC, r.last_at ASC', params).fetchall()
 
     conn.close()
 
     # Organiser par boutique
-    shops_data = {}
+    series = {}
     for row in rows:
-        shop = row['shop_name']
-        if shop not in shops_data:
-            shops_data[shop] = {
-                'label': shop,
-                'data': [],
-                'borderColor': utils.display_helpers._get_shop_color(shop),
-                'backgroundColor': utils.display_helpers._get_shop_color(shop, alpha=0.1),
-                'tension': 0.1
-            }
+        series.setdefault(row['shop_name'], []).append((row['timestamp'], float(row['price']), row['scraped_at']))
 
-        shops_data[shop]['data'].append({
-            'x': row['scraped_at'][:16],  # Format YYYY-MM-DD HH:MM
-            'y': float(row['price'])
+    datasets = []
+    decimated = False
+    for shop_name, points in series.items():
+        kept = decimate(points, max_points, method)
+        decimated = decimated or len(kept) < len(points)
+        datasets.append({
+            'label': shop_name,
+            'data': [{'x': scraped_at[:16], 'y': price}  # Format YYYY-MM-DD HH:MM
+                     for _, price, scraped_at in kept],
+            'borderColor': utils.display_helpers._get_shop_color(shop_name),
+            'backgroundColor': utils.display_helpers._get_shop_color(shop_name, alpha=0.1),
+            'tension': 0.1
         })
 
     return {
-        'datasets': list(shops_data.values()),
-        'currency': rows[0]['currency'] if rows else 'EUR'
+        'datasets': datasets,
+        'currency': rows[0]['currency'] if rows else 'EUR',
+        'resolution': resolution,
+        'decimation': method if decimated else None
+    }
+
+"""MAINTENANCE"""
+def _compaction_plan(rows):
+    """
+    Fusion des suites de relevés identiques (prix, devise, disponibilité) d'un lien
+
+    Le dernier relevé de chaque suite est conservé : il porte la plage
+    d'observation (first_seen_at -> scraped_at) et le nombre de relevés fusionnés.
+    Un relevé en échec (sans prix ou avec message d'erreur) n'est jamais fusionné
+    et clôt la suite en cours : la plage ne couvre pas la panne, même une fois
+    l'échec purgé par expire_error_prices.
+
+    Args:
+        rows (list): Relevés du lien, échecs compris, dans l'ordre (scraped_at, id)
+
+    Returns:
+        tuple: (mises à jour (first_seen_at, observations, id), ids à supprimer)
+    """
+    updates, deletes = [], []
+    run = []
+
+    def _close_run():
+        if len(run) > 1:
+            kept = run[-1]
+            updates.append((min(row['first_seen_at'] for row in run),
+                            sum(row['observations'] for row in run), kept['id']))
+            deletes.extend(row['id'] for row in run[:-1])
+
+    for row in rows:
+        if row['price'] is None or row['error_message'] is not None:
+            _close_run()
+            run = []
+            continue
+
+        key = (row['price'], row['currency'], bool(row['is_available']))
+        if run and key != (run[-1]['price'], run[-1]['currency'], bool(run[-1]['is_available'])):
+            _close_run()
+            run = []
+        run.append(row)
+    _close_run()
+
+    return updates, deletes
+
+def compact_price_links(after_link_id=0, batch_links=50, batch_rows=5000):
+    """
+    Compacter l'historique d'un lot de liens (une transaction courte)
+
+    Seuls les relevés postérieurs au dernier compactage du lien sont relus ;
+    les relevés en échec ne sont pas fusionnés et séparent les suites
+    (voir _compaction_plan et expire_error_prices).
+
+    Args:
+        after_link_id (int): Reprendre après ce lien (parcours par id croissant)
+        batch_links (int): Liens au plus dans le lot
+        batch_rows (int): Relevés relus au plus par lien (le lien est repris au lot suivant)
+
+    Returns:
+        dict: links (liens traités), compacted_rows (relevés supprimés),
+              last_link_id (reprise du lot suivant, None en fin de parcours)
+    """
+    conn = get_db_connection()
+    conn.isolation_level = None
+    compacted_rows = 0
+    compacted_links = []
+    resume = None
+
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+
+        # Liens ayant reçu des relevés depuis leur dernier compactage
+        links = conn.execute('''
+                             SELECT pl.id, cs.compacted_until
+                             FROM product_links pl
+                                      JOIN link_latest_price lp ON lp.product_link_id = pl.id
+                                      LEFT JOIN price_compaction_state cs ON cs.product_link_id = pl.id
+                             WHERE pl.id > ?
+                               AND (cs.compacted_until IS NULL OR lp.scraped_at > cs.compacted_until)
+                             ORDER BY pl.id
+                             LIMIT ?
+                             ''', (after_link_id, batch_links)).fetchall()
+
+        for link in links:
+            rows = conn.execute('''
+                                SELECT id, price, currency, is_available, error_message, scraped_at,
+                                       COALESCE(first_seen_at, scraped_at) AS first_seen_at, observations
+                                FROM price_history
+                                WHERE product_link_id = ?
+                                  AND scraped_at >= ?
+                                ORDER BY scraped_at, id
+                                LIMIT ?
+                                ''', (link['id'], link['compacted_until'] or '', batch_rows)).fetchall()
+            if not rows:
+                continue
+
+            updates, deletes = _compaction_plan(rows)
+            conn.executemany('UPDATE price_history SET first_seen_at = ?, observations = ? WHERE id = ?', updates)
+            conn.executemany('DELETE FROM price_history WHERE id = ?', [(row_id,) for row_id in deletes])
+            compacted_rows += len(deletes)
+            if deletes:
+                compacted_links.append(link['id'])
+
+            # Le dernier relevé conservé amorce la suite du prochain compactage
+            conn.execute('''
+                         INSERT INTO price_compaction_state (product_link_id, compacted_until)
+                         VALUES (?, ?)
+                         ON CONFLICT(product_link_id) DO UPDATE SET compacted_until = excluded.compacted_until
+                         ''', (link['id'], rows[-1]['scraped_at']))
+
+            if len(rows) == batch_rows:
+                resume = link['id'] - 1
+                break
+
+        conn.execute('COMMIT')
+        invalidate_links(conn, compacted_links)
+
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+    if resume is None and len(links) == batch_links:
+        resume = links[-1]['id']
+
+    return {'links': len(links), 'compacted_rows': compacted_rows, 'last_link_id': resume}
+
+def expire_error_prices(older_than_days, batch_size=1000):
+    """
+    Supprimer un lot de relevés en échec plus anciens que la durée de rétention
+
+    Returns:
+        int: Relevés supprimés (moins que batch_size : plus rien à purger)
+    """
+    conn = get_db_connection()
+    cursor = conn.execute('''
+                          DELETE FROM price_history
+                          WHERE id IN (SELECT id FROM price_history
+                                       WHERE price IS NULL
+                                         AND scraped_at < datetime('now', '-' || ? || ' days')
+                                       LIMIT ?)
+                          ''', (older_than_days, batch_size))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    if deleted:
+        clear_query_cache()
+    return deleted
+
+def get_database_pages():
+    """Taille de la base : page_size, page_count, freelist_count et mode auto_vacuum (2 = incrémental)"""
+    conn = get_db_connection()
+    pages = {pragma: conn.execute(f'PRAGMA {pragma}').fetchone()[0]
+             for pragma in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')}
+    conn.close()
+    return pages
+
+def reclaim_free_pages(max_pages=1000):
+    """
+    Rendre au système au plus max_pages pages libres (auto_vacuum incrémental requis)
+
+    Returns:
+        int: Pages libérées
+    """
+    conn = get_db_connection()
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    # executescript exécute le pragma jusqu'au bout (execute() ne libère qu'une page par appel)
+    conn.executescript(f'PRAGMA incremental_vacuum({int(max_pages)});')
+    after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.close()
+    return before - after
+
+def vacuum_database():
+    """Reconstruire la base (VACUUM) en passant en auto_vacuum incrémental"""
+    conn = get_db_connection()
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    conn.close()
+
+def record_maintenance_run(report):
+    """
+    Enregistrer le compte rendu d'une passe de maintenance
+
+    Returns:
+        int: ID de la passe
+    """
+    columns = ('started_at', 'finished_at', 'expired_errors', 'compacted_rows', 'links_compacted',
+               'page_size', 'pages_before', 'pages_after', 'freelist_after', 'vacuum', 'duration_ms')
+    conn = get_db_connection()
+    cursor = conn.execute(f'''
+                          INSERT INTO maintenance_runs ({', '.join(columns)})
+                          VALUES ({', '.join('?' * len(columns))})
+                          ''', [report.get(column) for column in columns])
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+def get_last_maintenance_run(vacuum=None):
+    """Dernière passe de maintenance (éventuellement avec ce type de VACUUM), ou None"""
+    conn = get_db_connection()
+    row = conn.execute('''
+                       SELECT * FROM maintenance_runs
+                       WHERE ? IS NULL OR vacuum = ?
+                       ORDER BY id DESC LIMIT 1
+                       ''', (vacuum, vacuum)).fetchone()
+    conn.close()
+    return dict_from_row(row)
+
+def get_maintenance_report(limit=10):
+    """
+    Compte rendu de la maintenance de l'historique
+
+    Returns:
+        dict: runs (dernières passes, avec reclaimed_bytes), database (taille actuelle),
+              history (relevés, relevés compactés, observations représentées, échecs)
+    """
+    conn = get_db_connection()
+    runs = conn.execute('SELECT * FROM maintenance_runs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+    history = conn.execute('''
+                           SELECT COUNT(*)                                       AS total_rows,
+                                  COALESCE(SUM(observations > 1), 0)            AS compacted_rows,
+                                  COALESCE(SUM(observations), 0)                AS observations,
+                                  COALESCE(SUM(price IS NULL), 0)               AS error_rows
+                           FROM price_history
+                           ''').fetchone()
+    conn.close()
+
+    pages = get_database_pages()
+    return {
+        'runs': [{**dict_from_row(run),
+                  'reclaimed_bytes': ((run['pages_before'] or 0) - (run['pages_after'] or 0)) * (run['page_size'] or 0)}
+                 for run in runs],
+        'database': {**pages,
+                     'size_bytes': pages['page_count'] * pages['page_size'],
+                     'free_bytes': pages['freelist_count'] * pages['page_size']},
+        'history': dict_from_row(history)
     }
 
 """MISCELLANEOUS"""
@@ -0,0 +1,379 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Écriture groupée des relevés de prix
+
+Un thread unique par base possède la connexion d'écriture : les scrapers
+lui confient leurs relevés, insérés par executemany dans des transactions
+d'au plus PRICE_WRITER_BATCH_SIZE lignes, ou après PRICE_WRITER_FLUSH_INTERVAL
+secondes. Un seul fsync par lot, et pas de contention `database is locked`
+entre scrapers concurrents. Les autres écritures d'un scraping (statistiques
+d'extraction, cache HTTP, stratégie du lien) passent par execute() et sont
+validées dans la même transaction que les relevés.
+
+En mode « changements seulement » (PRICE_STORAGE_MODE = 'changes'), un relevé
+identique au dernier relevé du lien (prix, devise, disponibilité) ne crée pas
+de ligne : il prolonge celle-ci (scraped_at avancé, observations + 1).
+"""
+
+import atexit
+import itertools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from database.cache import get_query_cache
+from database.connection import get_connection_manager
+
+logger = logging.getLogger(__name__)
+
+PRICE_INSERT_QUERY = '''
+    INSERT INTO price_history
+    (product_link_id, price, currency, is_available, error_message, scraped_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# Dernier relevé du lien prolongé s'il est identique (mêmes critères que le compactage)
+PRICE_EXTEND_QUERY = '''
+    UPDATE price_history
+    SET first_seen_at = COALESCE(first_seen_at, scraped_at),
+        observations  = observations + 1,
+        scraped_at    = ?
+    WHERE id = (SELECT price_history_id FROM link_latest_price WHERE product_link_id = ?)
+      AND price = ?
+      AND currency IS ?
+      AND is_available = ?
+      AND error_message IS NULL
+      AND scraped_at <= ?
+'''
+
+_FLUSH = 'flush'
+_STOP = 'stop'
+
+# Troisième élément d'une requête confiée par execute() (à la place de `unchanged`)
+_STATEMENT = 'statement'
+
+
+def scrape_timestamp():
+    """Date d'un relevé, au format de CURRENT_TIMESTAMP"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+
+def store_price(conn, row, changes_only=False):
+    """
+    Écrire un relevé (product_link_id, price, currency, is_available, error_message, scraped_at)
+
+    Args:
+        conn: Connexion SQLite (la transaction est laissée à l'appelant)
+        row (tuple): Relevé dans l'ordre de PRICE_INSERT_QUERY
+        changes_only (bool): Prolonger le dernier relevé du lien s'il est identique
+
+    Returns:
+        tuple: (ID du relevé inséré ou prolongé, True s'il a été prolongé)
+    """
+    product_link_id, price, currency, is_available, error_message, scraped_at = row
+
+    # Les échecs restent des lignes distinctes (purgés par la maintenance)
+    if changes_only and price is not None and error_message is None:
+        extended = conn.execute(PRICE_EXTEND_QUERY, (scraped_at, product_link_id, price, currency,
+                                                     bool(is_available), scraped_at))
+        if extended.rowcount:
+            return conn.execute('SELECT price_history_id FROM link_latest_price WHERE product_link_id = ?',
+                                (product_link_id,)).fetchone()[0], True
+
+    return conn.execute(PRICE_INSERT_QUERY, row).lastrowid, False
+
+
+class PriceWriter:
+    """Thread d'écriture des relevés de prix, par lots transactionnels"""
+
+    def __init__(self, pool, batch_size=200, flush_interval=1.0, changes_only=False, cache=None):
+        """
+        Args:
+            pool: ConnectionPool de la base (la connexion d'écriture y est empruntée)
+            batch_size: Relevés au plus par transaction
+            flush_interval: Délai maximal (secondes) avant l'écriture d'un lot incomplet
+            changes_only: Prolonger le dernier relevé d'un lien plutôt que d'en insérer un identique
+            cache: QueryCache de la base, invalidé pour les produits des relevés écrits
+        """
+        self.pool = pool
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.changes_only = changes_only
+        self.cache = cache
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'rows': 0, 'extended': 0, 'statements': 0, 'batches': 0, 'failed': 0,
+                       'last_batch_ms': None}
+
+    def start(self):
+        """Démarrer le thread d'écriture (sans effet s'il tourne déjà)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='price-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, product_link_id, price, currency='EUR', is_available=True, error_message=None,
+               unchanged=False):
+        """
+        Confier un relevé de prix au thread d'écriture
+
+        Args:
+            unchanged: Prix repris du cache HTTP : prolonge le dernier relevé du lien
+                       s'il est identique, même hors mode « changements seulement »
+
+        Returns:
+            Future: ID du relevé une fois la transaction validée
+        """
+        future = Future()
+        self.start()
+        self._queue.put((future, (product_link_id, price, currency, is_available, error_message,
+                                  scrape_timestamp()), unchanged))
+        return future
+
+    def execute(self, query, params=()):
+        """
+        Confier une requête d'écriture (upsert...) au thread d'écriture, validée avec le lot en cours
+
+        Returns:
+            Future: None une fois la transaction validée
+        """
+        future = Future()
+        self.start()
+        self._queue.put((future, (query, tuple(params)), _STATEMENT))
+        return future
+
+    def flush(self, timeout=None):
+        """
+        Attendre l'écriture de tous les relevés confiés jusqu'ici
+
+        Returns:
+            bool: False si le délai a expiré
+        """
+        return self._signal(_FLUSH, timeout)
+
+    def close(self, timeout=None):
+        """Écrire les relevés en attente puis arrêter le thread"""
+        done = self._signal(_STOP, timeout)
+        if done:
+            with self._lock:
+                self._thread = None
+        return done
+
+    def _signal(self, command, timeout):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return True
+        event = threading.Event()
+        self._queue.put((command, event))
+        return event.wait(timeout)
+
+    def _collect(self):
+        """Lot suivant : relevés jusqu'à batch_size, expiration du délai ou commande"""
+        batch, signals = [], []
+
+        item = self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if isinstance(item[0], Future):
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+            else:
+                signals.append(item)
+                break
+
+            try:
+                item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+
+        return batch, signals
+
+    def _loop(self):
+        conn = None
+        batch, signals = [], []
+        try:
+            conn, _ = self.pool.acquire()
+            conn.isolation_level = None
+            while True:
+                batch, signals = self._collect()
+                if batch:
+                    self._write(conn, batch)
+                for _, event in signals:
+                    event.set()
+                if any(command == _STOP for command, _ in signals):
+                    break
+                batch, signals = [], []
+        except Exception as e:
+            logger.error(f"💥 Thread d'écriture des prix arrêté: {e}")
+            self._abort(e, batch + signals)
+        finally:
+            if conn is not None:
+                self.pool.release(conn)
+
+    def _abort(self, error, items):
+        """Thread arrêté sur erreur : relevés en attente en échec, attentes (flush, close) libérées"""
+        # Un prochain submit() relance un thread
+        with self._lock:
+            self._thread = None
+
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for first, second, *_ in items:
+            if isinstance(first, Future):
+                if not first.done():
+                    first.set_exception(error)
+                    with self._lock:
+                        self._stats['failed'] += 1
+            else:
+                second.set()
+
+    def _write(self, conn, batch):
+        start = time.perf_counter()
+        prices = [item for item in batch if item[2] is not _STATEMENT]
+        statements = [item for item in batch if item[2] is _STATEMENT]
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if not prices:
+                ids, extended = (), ()
+            elif self.changes_only or any(unchanged for _, _, unchanged in prices):
+                # Chaque relevé dépend du précédent du même lien : une requête par relevé
+                ids, extended = zip(*(store_price(conn, row, changes_only=self.changes_only or unchanged)
+                                      for _, row, unchanged in prices))
+            else:
+                conn.executemany(PRICE_INSERT_QUERY, [row for _, row, _ in prices])
+                last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+                # Verrou d'écriture tenu pendant le lot : identifiants AUTOINCREMENT consécutifs
+                ids, extended = range(last_id - len(prices) + 1, last_id + 1), ()
+            # Requêtes identiques consécutives (un upsert par lien) : un seul executemany
+            for query, items in itertools.groupby(statements, key=lambda item: item[1][0]):
+                conn.executemany(query, [params for _, (_, params), _ in items])
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            logger.warning(f"Lot de {len(batch)} écritures rejeté ({e}), écriture ligne par ligne")
+            self._write_each(conn, batch)
+            return
+
+        # Lectures en cache périmées avant que les appelants n'apprennent l'écriture
+        self._invalidate(conn, [row[0] for _, row, _ in prices])
+        for (future, _, _), price_id in zip(prices, ids):
+            future.set_result(price_id)
+        for future, _, _ in statements:
+            future.set_result(None)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats['rows'] += len(prices)
+            self._stats['extended'] += sum(extended)
+            self._stats['statements'] += len(statements)
+            self._stats['batches'] += 1
+            self._stats['last_batch_ms'] = round(elapsed, 2)
+        logger.debug(f"💾 {len(prices)} relevé(s) de prix et {len(statements)} autre(s) écriture(s) "
+                     f"en {elapsed:.1f} ms")
+
+    def _write_each(self, conn, batch):
+        for future, row, unchanged in batch:
+            try:
+                if unchanged is _STATEMENT:
+                    conn.execute(*row)
+                    future.set_result(None)
+                    with self._lock:
+                        self._stats['statements'] += 1
+                    continue
+
+                price_id, extended = store_price(conn, row, self.changes_only or unchanged)
+                self._invalidate(conn, [row[0]])
+                future.set_result(price_id)
+                with self._lock:
+                    self._stats['rows'] += 1
+                    self._stats['extended'] += extended
+            except sqlite3.Error as e:
+                if unchanged is _STATEMENT:
+                    logger.error(f"Erreur d'écriture groupée ({row[0].split()[0]}...): {e}")
+                else:
+                    logger.error(f"Erreur lors de l'enregistrement du prix pour le lien {row[0]}: {e}")
+                future.set_exception(e)
+                with self._lock:
+                    self._stats['failed'] += 1
+
+    def _invalidate(self, conn, link_ids):
+        if self.cache is None:
+            return
+        try:
+            self.cache.invalidate_links(conn, link_ids)
+        except sqlite3.Error as e:
+            # Relevés écrits : le cache se résorbe à l'expiration du TTL
+            logger.warning(f"Invalidation du cache impossible après écriture ({e}), vidage complet")
+            self.cache.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'pending': self._queue.qsize()}
+
+
+def init_price_writer(app):
+    """Activer l'écriture groupée des prix pour l'application (un writer par base)"""
+    writers = app.extensions['price_writers'] = {}
+
+    def _close_all():
+        for writer in list(writers.values()):
+            writer.close(timeout=30)
+
+    atexit.register(_close_all)
+
+
+def get_price_writer():
+    """
+    Writer de la base de l'application courante
+
+    Returns:
+        PriceWriter: None hors application ou si l'écriture groupée est désactivée
+    """
+    if not current_app or not current_app.config.get('PRICE_WRITER_ENABLED', True):
+        return None
+
+    writers = current_app.extensions.get('price_writers')
+    if writers is None:
+        return None
+
+    pool = get_connection_manager().pool(current_app.config)
+    writer = writers.get(pool.path)
+    if writer is None:
+        writer = writers.setdefault(pool.path, PriceWriter(
+            pool,
+            batch_size=current_app.config.get('PRICE_WRITER_BATCH_SIZE', 200),
+            flush_interval=current_app.config.get('PRICE_WRITER_FLUSH_INTERVAL', 1.0),
+            changes_only=current_app.config.get('PRICE_STORAGE_MODE', 'every') == 'changes',
+            cache=get_query_cache()
+        ))
+    return writer
@@ -0,0 +1,84 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Maintenance de l'historique des prix à la demande
+
+Purge les relevés en échec anciens, compacte les relevés identiques et
+rend l'espace libéré (voir app/maintenance.py), puis affiche le compte rendu.
+
+Usage:
+    python maintenance.py                 # Une passe (VACUUM complet s'il est dû)
+    python maintenance.py --full-vacuum   # Forcer le VACUUM complet
+    python maintenance.py --report        # Afficher le compte rendu sans rien lancer
+    python maintenance.py --rebuild-counters  # Recalculer les compteurs du tableau de bord
+"""
+
+import os
+import logging
+import argparse
+from dotenv import load_dotenv
+from app import create_app
+from database.models import get_maintenance_report, rebuild_stats_counters
+
+# Charger les variables du fichier .env
+load_dotenv()
+
+
+def print_report(report):
+    database = report['database']
+    history = report['history']
+    print(f"📦 Base : {database['size_bytes'] / 1024 ** 2:.1f} Mo "
+          f"(dont {database['free_bytes'] / 1024 ** 2:.1f} Mo libres, "
+          f"auto_vacuum {'incrémental' if database['auto_vacuum'] == 2 else 'inactif'})")
+    print(f"📈 Historique : {history['total_rows']} relevés pour {history['observations']} observations "
+          f"({history['compacted_rows']} compactés, {history['error_rows']} en échec)")
+
+    for run in report['runs']:
+        print(f"  {run['started_at']}  {run['compacted_rows']:>8} compactés  {run['expired_errors']:>6} purgés  "
+              f"{run['reclaimed_bytes'] / 1024 ** 2:8.1f} Mo récupérés  VACUUM {run['vacuum'] or '-'}  "
+              f"{(run['duration_ms'] or 0) / 1000:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--full-vacuum', action='store_true', help='Forcer le VACUUM complet')
+    parser.add_argument('--report', action='store_true', help='Afficher le compte rendu sans lancer de passe')
+    parser.add_argument('--rebuild-counters', action='store_true',
+                        help='Recalculer les compteurs du tableau de bord (après une modification manuelle de la base)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    # Aucun scraping : pas de navigateur préchauffé
+    app = create_app(overrides={'SELENIUM_WARM_SIZE': 0})
+    if args.rebuild_counters:
+        with app.app_context():
+            drift = rebuild_stats_counters()
+        for name, (stored, actual) in drift.items():
+            print(f"🔢 {name} : {stored} -> {actual}")
+        print(f"✅ Compteurs du tableau de bord recalculés ({len(drift)} corrigé(s))")
+        raise SystemExit(0)
+
+    if not args.report:
+        print("🧹 Maintenance de l'historique des prix...")
+        app.extensions['history_maintenance'].run(full_vacuum=True if args.full_vacuum else None)
+
+    with app.app_context():
+        print_report(get_maintenance_report())
@@ -0,0 +1,50 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Point d'entrée du planificateur de scraping (processus séparé du serveur web)
+
+Remplace l'appel de /scrape-all par cron : les liens sont scrapés au fil
+de l'eau selon leur fréquence, sans occuper un worker web.
+"""
+
+import os
+import logging
+from dotenv import load_dotenv
+from app import create_app
+
+# Charger les variables du fichier .env
+load_dotenv()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    app = create_app()
+    scheduler = app.extensions['scrape_scheduler']
+
+    if not app.config.get('AUTO_UPDATE_ENABLED'):
+        print("⏸️ AUTO_UPDATE_ENABLED est désactivé, rien à planifier")
+    elif app.config.get('AUTO_UPDATE_IN_PROCESS'):
+        print("ℹ️ Le planificateur tourne déjà dans le processus web (AUTO_UPDATE_IN_PROCESS)")
+    else:
+        print("⏰ Lancement du planificateur PriceChecker...")
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
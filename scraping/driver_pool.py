@@ -0,0 +1,304 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Pool de navigateurs Selenium réutilisables pour PriceChecker
+
+Démarrer un navigateur headless coûte plus cher que charger la page :
+les drivers sont donc gardés chauds et partagés entre les scrapings.
+Un driver est recyclé après `max_pages` pages, si sa mémoire dépasse
+`max_memory_mb` (psutil requis) ou s'il ne répond plus.
+"""
+
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import psutil
+except ImportError:  # Optionnel : seul le recyclage sur la mémoire en dépend
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_driver_factory(browser: str = 'chrome') -> Callable:
+    """Fabrique de drivers pour le navigateur demandé ('chrome' ou 'firefox')"""
+    if browser == 'firefox':
+        from scraping.firefox_driver import create_firefox_driver
+        return create_firefox_driver
+
+    from scraping.chrome_driver import create_chrome_driver
+    return create_chrome_driver
+
+
+class PooledDriver:
+    """Driver Selenium et ses métadonnées d'usage"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.monotonic()
+        self.initial_memory_mb = None
+
+
+class DriverPool:
+    """Pool borné de drivers Selenium chauds"""
+
+    def __init__(self, factory: Optional[Callable] = None, max_size: int = 2, warm_size: int = 1,
+                 max_pages: int = 50, max_memory_mb: Optional[int] = None,
+                 max_memory_growth_mb: Optional[int] = None, page_load_timeout: int = 15,
+                 acquire_timeout: float = 60):
+        """
+        Args:
+            factory: Fonction sans argument qui crée un driver
+            max_size: Nombre maximum de navigateurs ouverts simultanément
+            warm_size: Nombre de navigateurs gardés prêts
+            max_pages: Recycler un driver après ce nombre de pages
+            max_memory_mb: Recycler un driver dont la mémoire (navigateur inclus) dépasse ce seuil
+            max_memory_growth_mb: Recycler un driver dont la mémoire a augmenté de plus de ce
+                                  seuil depuis son démarrage
+            page_load_timeout: Timeout de chargement d'une page (secondes)
+            acquire_timeout: Attente maximale d'un driver libre (secondes)
+        """
+        self.factory = factory or get_driver_factory('chrome')
+        self.max_size = max(1, int(max_size))
+        self.warm_size = max(0, min(int(warm_size), self.max_size))
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.max_memory_growth_mb = max_memory_growth_mb
+        self.page_load_timeout = page_load_timeout
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _create(self) -> PooledDriver:
+        """Démarrer un nouveau navigateur"""
+        start = time.perf_counter()
+        driver = self.factory()
+        driver.set_page_load_timeout(self.page_load_timeout)
+        pooled = PooledDriver(driver)
+        pooled.initial_memory_mb = self._memory_mb(pooled)
+        logger.info(f"🌐 Navigateur démarré en {time.perf_counter() - start:.1f}s")
+        return pooled
+
+    def warm_up(self):
+        """Démarrer des navigateurs jusqu'à avoir `warm_size` drivers ouverts"""
+        while True:
+            with self._condition:
+                if self._closed or self._size >= self.warm_size:
+                    return
+                self._size += 1
+
+            try:
+                pooled = self._create()
+            except Exception as e:
+                logger.warning(f"Préchauffage du navigateur impossible: {e}")
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                return
+
+            with self._condition:
+                self._idle.append(pooled)
+                self._condition.notify()
+
+    def acquire(self) -> PooledDriver:
+        """
+        Emprunter un driver (chaud si possible)
+
+        Raises:
+            TimeoutError: Si aucun driver ne se libère à temps
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError('Pool de navigateurs fermé')
+
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    pooled = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError('Aucun navigateur disponible')
+                    self._condition.wait(remaining)
+                    continue
+
+            if pooled is None:
+                try:
+                    return self._create()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+
+            if self.is_healthy(pooled):
+                return pooled
+
+            logger.info("♻️ Navigateur inactif hors service, remplacement")
+            self._discard(pooled)
+
+    def release(self, pooled: PooledDriver, discard: bool = False):
+        """Rendre un driver au pool, ou le recycler s'il a trop servi"""
+        pooled.pages += 1
+
+        if discard or self._should_recycle(pooled):
+            self._discard(pooled)
+            if self.warm_size:
+                threading.Thread(target=self.warm_up, daemon=True, name='driver-warmup').start()
+            return
+
+        with self._condition:
+            if self._closed:
+                self._quit(pooled)
+                self._size -= 1
+                return
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    @contextmanager
+    def driver(self):
+        """Context manager : emprunte un driver et le rend (ou le jette en cas d'erreur navigateur)"""
+        from selenium.common.exceptions import WebDriverException
+
+        pooled = self.acquire()
+        discard = False
+        try:
+            yield pooled.driver
+        except WebDriverException:
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def is_healthy(self, pooled: PooledDriver) -> bool:
+        """Vérifier que le navigateur répond encore"""
+        try:
+            return pooled.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def _should_recycle(self, pooled: PooledDriver) -> bool:
+        if self.max_pages and pooled.pages >= self.max_pages:
+            logger.info(f"♻️ Recyclage du navigateur après {pooled.pages} pages")
+            return True
+
+        if self.max_memory_mb or self.max_memory_growth_mb:
+            memory = self._memory_mb(pooled)
+            if memory is None:
+                return False
+
+            if self.max_memory_mb and memory > self.max_memory_mb:
+                logger.info(f"♻️ Recyclage du navigateur: {memory:.0f} Mo > {self.max_memory_mb} Mo")
+                return True
+
+            # Croissance depuis le démarrage (fuites des pages visitées)
+            if self.max_memory_growth_mb and pooled.initial_memory_mb is not None:
+                growth = memory - pooled.initial_memory_mb
+                if growth > self.max_memory_growth_mb:
+                    logger.info(f"♻️ Recyclage du navigateur: +{growth:.0f} Mo depuis son démarrage "
+                                f"> {self.max_memory_growth_mb} Mo")
+                    return True
+
+        return False
+
+    @staticmethod
+    def _memory_mb(pooled: PooledDriver) -> Optional[float]:
+        """Mémoire résidente du driver et de ses processus navigateur (None sans psutil)"""
+        if psutil is None:
+            return None
+        try:
+            process = psutil.Process(pooled.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except Exception:
+            return None
+
+    def _discard(self, pooled: PooledDriver):
+        self._quit(pooled)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _quit(pooled: PooledDriver):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.debug(f"Erreur fermeture navigateur: {e}")
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {'size': self._size, 'idle': len(self._idle), 'max_size': self.max_size}
+
+    def close(self):
+        """Fermer tous les navigateurs inactifs ; les autres seront fermés à leur retour"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+
+        for pooled in idle:
+            self._quit(pooled)
+
+
+_pool = None
+_pool_settings = {}
+_pool_lock = threading.Lock()
+
+
+def configure_driver_pool(browser: str = 'chrome', **settings):
+    """
+    Configurer le pool partagé
+
+    Avec warm_size > 0, les navigateurs sont démarrés tout de suite en arrière-plan :
+    le premier repli Selenium ne paie pas le démarrage du navigateur.
+
+    Args:
+        browser: 'chrome' ou 'firefox'
+        **settings: Paramètres de DriverPool (max_size, warm_size, max_pages, ...)
+    """
+    global _pool_settings
+    with _pool_lock:
+        _pool_settings = {'factory': get_driver_factory(browser), **settings}
+
+    if settings.get('warm_size'):
+        threading.Thread(target=get_driver_pool().warm_up, daemon=True, name='driver-warmup').start()
+
+
+def get_driver_pool() -> DriverPool:
+    """Pool de navigateurs partagé par tous les scrapers du processus"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool(**_pool_settings)
+            atexit.register(_pool.close)
+        return _pool
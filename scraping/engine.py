@@ -0,0 +1,177 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Moteur de scraping concurrent pour PriceChecker
+
+Les liens sont scrapés par un pool de threads borné :
+- un plafond global (max_workers) limite le nombre de requêtes simultanées
+- un plafond par domaine (max_per_domain) limite la charge sur chaque boutique
+- l'ordonnanceur de politesse (DomainScheduler) espace les requêtes vers
+  une même boutique et choisit l'ordre des liens
+"""
+
+import time
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from scraping.politeness import DomainScheduler, get_link_domain
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeEngine:
+    """Pool de threads borné pour scraper un ensemble de liens"""
+
+    def __init__(self, max_workers: int = 8, max_per_domain: int = 1, default_delay: float = 2.0,
+                 domain_delays: Optional[Dict[str, float]] = None,
+                 scraper_factory: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            max_workers: Nombre maximum de scrapings simultanés (toutes boutiques)
+            max_per_domain: Nombre maximum de scrapings simultanés par domaine
+            default_delay: Délai (secondes) entre deux requêtes vers un même domaine
+            domain_delays: Délais spécifiques par domaine, ex. {'amazon.fr': 5}
+            scraper_factory: Fabrique de scrapers (un scraper par thread)
+        """
+        if scraper_factory is None:
+            from scraping.price_scraper import create_price_scraper
+            scraper_factory = create_price_scraper
+
+        self.max_workers = max(1, int(max_workers))
+        self.max_per_domain = max(1, int(max_per_domain))
+        self.default_delay = default_delay
+        self.domain_delays = domain_delays or {}
+        self.scraper_factory = scraper_factory
+        self.domain_stats = {}
+        self._local = threading.local()
+
+    def _get_scraper(self):
+        """Scraper propre au thread courant (la session requests n'est pas thread-safe)"""
+        scraper = getattr(self._local, 'scraper', None)
+        if scraper is None:
+            scraper = self.scraper_factory()
+            self._local.scraper = scraper
+        return scraper
+
+    def _scrape_link(self, link: Dict[str, Any]) -> Dict[str, Any]:
+        """Scraper un lien (exécuté dans un thread du pool)"""
+        logger.info(f"Scraping {link['shop_name']} ({link['url']})")
+        return self._get_scraper().scrape_price(
+            url=link['url'],
+            css_selector=link.get('css_selector'),
+            shop_name=link['shop_name'],
+            strategy=link.get('strategy'),
+            http_cache=link.get('http_cache')
+        )
+
+    def run(self, links: Iterable[Dict[str, Any]],
+            on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = None,
+            cancel: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+        """
+        Scraper tous les liens en respectant les plafonds global et par domaine
+
+        Args:
+            links: Liens à scraper (dictionnaires avec id, shop_name, url, css_selector
+                   et éventuellement strategy, http_cache)
+            on_result: Callback appelé dans le thread appelant pour chaque lien terminé,
+                       avec (link, price_data). Sa valeur de retour remplace le résultat.
+            cancel: Événement d'annulation : plus aucun lien n'est lancé une fois levé,
+                    les scrapings en cours se terminent normalement
+
+        Returns:
+            list: Résultats dans l'ordre de fin de scraping
+        """
+        scheduler = DomainScheduler(self.default_delay, self.domain_delays)
+        scheduler.add_all(links)
+
+        if not len(scheduler):
+            return []
+
+        active = defaultdict(int)
+        inflight = {}
+        results = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scrape') as executor:
+            while len(scheduler) or inflight:
+                cancelled = cancel is not None and cancel.is_set()
+                if cancelled and not inflight:
+                    logger.info(f"⏹️ Scraping annulé, {len(scheduler)} lien(s) non traité(s)")
+                    break
+
+                busy = {domain for domain, count in active.items() if count >= self.max_per_domain}
+
+                # Remplir le pool avec les liens dont la boutique est disponible
+                while not cancelled and len(inflight) < self.max_workers:
+                    ready = scheduler.next_ready(busy)
+                    if ready is None:
+                        break
+
+                    domain, link = ready
+                    active[domain] += 1
+                    if active[domain] >= self.max_per_domain:
+                        busy.add(domain)
+                    inflight[executor.submit(self._scrape_link, link)] = (domain, link)
+
+                # Attendre une fin de scraping ou la fin de pause d'une boutique
+                timeout = None
+                if not cancelled and len(inflight) < self.max_workers:
+                    timeout = scheduler.wait_time(busy)
+
+                if not inflight:
+                    if timeout is not None:
+                        time.sleep(timeout)
+                    continue
+
+                done, _ = wait(list(inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    domain, link = inflight.pop(future)
+                    active[domain] -= 1
+                    results.append(self._handle_result(future, link, on_result))
+
+        self.domain_stats = scheduler.stats()
+        for domain, stats in self.domain_stats.items():
+            logger.info(f"📊 {domain}: {stats['requests']} requête(s), {stats['requests_per_second']} req/s "
+                        f"(délai {stats['delay']}s)")
+
+        return results
+
+    def _handle_result(self, future, link, on_result):
+        """Construire le résultat d'un lien terminé"""
+        try:
+            price_data = future.result()
+            if on_result:
+                return on_result(link, price_data)
+            return {
+                'link_id': link['id'],
+                'shop_name': link['shop_name'],
+                'success': price_data['is_available'],
+                **price_data
+            }
+        except Exception as e:
+            logger.error(f"Erreur scraping {link['shop_name']}: {e}")
+            return {
+                'link_id': link['id'],
+                'shop_name': link['shop_name'],
+                'success': False,
+                'error_message': str(e)
+            }
@@ -0,0 +1,286 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Couche de parsing HTML pour PriceChecker
+
+Backends disponibles, du plus rapide au plus lent :
+- 'selectolax' : moteur lexbor (optionnel, pip install selectolax)
+- 'lxml'       : BeautifulSoup + lxml (optionnel, pip install lxml)
+- 'html.parser': BeautifulSoup + parser de la bibliothèque standard
+
+Tous les backends exposent le sous-ensemble de l'API BeautifulSoup utilisé
+par le scraper (select, select_one, get_text, name, parent, find_all).
+
+Le pré-scan en flux permet d'arrêter la lecture d'une page dès que la
+zone du prix ou un bloc JSON-LD a été reçu.
+"""
+
+import re
+import logging
+from typing import Iterable, List, Optional
+
+from bs4 import BeautifulSoup
+from bs4.dammit import EncodingDetector
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser
+    except ImportError:
+        SelectolaxParser = None
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('selectolax', 'lxml', 'html.parser')
+
+# Backend choisi par la configuration (HTML_PARSER), résolu au premier parsing
+_configured_backend = 'auto'
+
+
+def available_backends() -> List[str]:
+    """Backends installés, du plus rapide au plus lent"""
+    installed = {
+        'selectolax': SelectolaxParser is not None,
+        'lxml': HAS_LXML,
+        'html.parser': True,
+    }
+    return [backend for backend in BACKENDS if installed[backend]]
+
+
+def get_default_backend(preferred: Optional[str] = None) -> str:
+    """Backend demandé s'il est installé, sinon le plus rapide disponible"""
+    backends = available_backends()
+    if preferred and preferred != 'auto':
+        if preferred in backends:
+            return preferred
+        logger.warning(f"Parser HTML '{preferred}' indisponible, repli sur '{backends[0]}'")
+    return backends[0]
+
+
+class SelectolaxNode:
+    """Adaptateur d'un nœud selectolax vers l'API BeautifulSoup utilisée par le scraper"""
+
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    @property
+    def name(self):
+        tag = self._node.tag
+        return '[document]' if tag == '-document' else tag
+
+    @property
+    def parent(self):
+        parent = self._node.parent
+        return SelectolaxNode(parent) if parent is not None else None
+
+    def get_text(self, separator: str = '', strip: bool = False) -> str:
+        return self._node.text(deep=True, separator=separator, strip=strip)
+
+    def select(self, selector: str) -> list:
+        return [SelectolaxNode(node) for node in self._node.css(selector)]
+
+    def select_one(self, selector: str):
+        node = self._node.css_first(selector)
+        return SelectolaxNode(node) if node is not None else None
+
+    def find_all(self, name: str, recursive: bool = False) -> list:
+        if recursive:
+            return self.select(name)
+        return [SelectolaxNode(child) for child in self._node.iter() if child.tag == name]
+
+    def __eq__(self, other):
+        # Même nœud du document (selectolax compare les nœuds par contenu)
+        return isinstance(other, SelectolaxNode) and self._node.mem_id == other._node.mem_id
+
+    def __hash__(self):
+        return hash(self._node.mem_id)
+
+
+class SelectolaxDocument(SelectolaxNode):
+    """Document selectolax (racine)"""
+
+    __slots__ = ('_tree',)
+
+    def __init__(self, content):
+        self._tree = SelectolaxParser(content)
+        super().__init__(self._tree.root)
+
+    @property
+    def name(self):
+        return '[document]'
+
+    def get_text(self, separator: str = '', strip: bool = False) -> str:
+        body = self._tree.body or self._tree.root
+        return body.text(deep=True, separator=separator, strip=strip) if body is not None else ''
+
+
+def configure_html_parser(backend: str = 'auto'):
+    """Choisir le backend utilisé par défaut ('auto' = le plus rapide installé)"""
+    global _configured_backend
+    _configured_backend = get_default_backend(backend)
+    logger.info(f"🧩 Parser HTML: {_configured_backend}")
+
+
+def parse_html(content, backend: Optional[str] = None):
+    """
+    Parser une page HTML
+
+    Args:
+        content: HTML (bytes ou str)
+        backend: 'selectolax', 'lxml', 'html.parser' ou None (backend configuré)
+
+    Returns:
+        Document compatible BeautifulSoup (select, select_one, get_text)
+    """
+    backend = get_default_backend(backend or _configured_backend)
+
+    if backend == 'selectolax' and SelectolaxParser is not None:
+        if isinstance(content, bytes):
+            encoding = EncodingDetector.find_declared_encoding(content, is_html=True) or 'utf-8'
+            try:
+                content = content.decode(encoding, errors='replace')
+            except LookupError:
+                content = content.decode('utf-8', errors='replace')
+        return SelectolaxDocument(content)
+
+    if backend == 'lxml' and HAS_LXML:
+        return BeautifulSoup(content, 'lxml')
+
+    return BeautifulSoup(content, 'html.parser')
+
+
+"""PRÉ-SCAN EN FLUX"""
+
+# Bloc JSON-LD complet mentionnant un prix
+JSON_LD_PATTERN = re.compile(
+    rb'<script[^>]+application/ld\+json[^>]*>(?:(?!</script>).)*?"price(?:Specification)?"(?:(?!</script>).)*?</script>',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Balise meta de prix (OpenGraph / produit)
+META_PRICE_PATTERN = re.compile(
+    rb'<meta[^>]+(?:product|og):price:amount[^>]*>',
+    re.IGNORECASE
+)
+
+# Octets conservés après le début de la zone du prix (contenu de l'élément)
+PRESCAN_MARGIN = 4096
+
+# Fin de l'en-tête : les balises meta de devise et de disponibilité suivent souvent celle du prix
+HEAD_END_PATTERN = re.compile(rb'</head\s*>|<body[\s>]', re.IGNORECASE)
+
+# Fin du tampon re-scannée à chaque morceau reçu
+PRESCAN_LOOKBACK = 65536
+
+CHUNK_SIZE = 16384
+
+
+def selector_pattern(selector: Optional[str]):
+    """
+    Motif d'octets repérant la zone d'un sélecteur simple (.classe ou #id)
+
+    Seul le dernier composant du sélecteur est utilisé ; les sélecteurs
+    d'attributs ou de position ne permettent pas de pré-scan (None).
+    """
+    if not selector:
+        return None
+
+    last = selector.strip().split()[-1].split('>')[-1]
+    match = re.fullmatch(r'(?:[a-zA-Z][\w-]*)?([.#])([\w-]+)', last)
+    if not match:
+        return None
+
+    kind, name = match.groups()
+    attribute = rb'class' if kind == '.' else rb'id'
+    token = re.escape(name.encode())
+    return re.compile(
+        attribute + rb'\s*=\s*["\']?[^"\'>]*?(?<![\w-])' + token + rb'(?![\w-])',
+        re.IGNORECASE
+    )
+
+
+def prescan(chunks: Iterable[bytes], pattern=None, structured: bool = False):
+    """
+    Lire une page en flux jusqu'à la zone du prix
+
+    Args:
+        chunks: Itérateur d'octets (ex. response.iter_content())
+        pattern: Motif de la zone du prix (voir selector_pattern)
+        structured: Arrêter aussi après un bloc JSON-LD de prix, ou à la fin de
+                    l'en-tête contenant une balise meta de prix
+
+    Returns:
+        tuple: (préfixe à parser, type de zone trouvée ou None, itérateur du reste de la page)
+    """
+    iterator = iter(chunks)
+    buffer = bytearray()
+    region_end = None
+    meta_start = None
+
+    for chunk in iterator:
+        if not chunk:
+            continue
+
+        # Ne re-scanner que la fin du tampon (les blocs peuvent chevaucher deux morceaux)
+        start = max(0, len(buffer) - PRESCAN_LOOKBACK)
+        buffer += chunk
+        stops = []
+
+        if structured:
+            match = JSON_LD_PATTERN.search(buffer, start)
+            if match:
+                stops.append((match.end(), 'json-ld'))
+
+            if meta_start is None:
+                match = META_PRICE_PATTERN.search(buffer, start)
+                if match:
+                    meta_start = match.end()
+            if meta_start is not None:
+                match = HEAD_END_PATTERN.search(buffer, max(start, meta_start))
+                if match:
+                    stops.append((match.end(), 'meta'))
+
+        if pattern is not None and region_end is None:
+            match = pattern.search(buffer, start)
+            if match:
+                region_end = match.end() + PRESCAN_MARGIN
+
+        if region_end is not None and len(buffer) >= region_end:
+            stops.append((region_end, 'selector'))
+
+        if stops:
+            end, kind = min(stops)
+            return bytes(buffer[:end]), kind, _chain(bytes(buffer[end:]), iterator)
+
+    return bytes(buffer), None, iter(())
+
+
+def _chain(head: bytes, iterator):
+    if head:
+        yield head
+    yield from iterator
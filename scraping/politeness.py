@@ -0,0 +1,181 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Ordonnanceur de politesse par domaine pour PriceChecker
+
+Chaque domaine (boutique) possède un seau à jetons : une requête consomme
+un jeton, les jetons se rechargent au rythme d'un par délai configuré.
+L'ordonnanceur choisit toujours un lien dont le domaine a un jeton
+disponible, de sorte que les autres boutiques sont scrapées pendant
+qu'une boutique est en pause.
+"""
+
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+from urllib.parse import urlparse
+
+
+def get_link_domain(url: str) -> str:
+    """Extraire le domaine (boutique) d'une URL, sans le préfixe www."""
+    host = (urlparse(url).hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+class TokenBucket:
+    """Seau à jetons : `capacity` requêtes en rafale, puis une par `delay` secondes"""
+
+    def __init__(self, delay: float, capacity: int = 1, now: float = 0.0):
+        self.delay = max(0.0, float(delay))
+        self.capacity = max(1, int(capacity))
+        self.tokens = float(self.capacity)
+        self.updated_at = now
+
+    def _refill(self, now: float):
+        if self.delay == 0:
+            self.tokens = float(self.capacity)
+        elif now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) / self.delay)
+        self.updated_at = max(self.updated_at, now)
+
+    def try_acquire(self, now: float) -> bool:
+        """Consommer un jeton s'il y en a un"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now: float) -> float:
+        """Temps (secondes) avant qu'un jeton soit disponible"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.delay
+
+
+class DomainScheduler:
+    """File d'attente de liens ordonnancée par domaine"""
+
+    def __init__(self, default_delay: float = 2.0, domain_delays: Optional[Dict[str, float]] = None,
+                 burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            default_delay: Délai (secondes) entre deux requêtes vers un même domaine
+            domain_delays: Délais spécifiques par domaine, ex. {'amazon.fr': 5}
+                           (s'applique aussi aux sous-domaines)
+            burst: Nombre de requêtes autorisées en rafale par domaine
+            clock: Horloge monotone (injectable pour les tests)
+        """
+        self.default_delay = max(0.0, float(default_delay))
+        self.domain_delays = {
+            get_link_domain(f'http://{domain}'): float(delay)
+            for domain, delay in (domain_delays or {}).items()
+        }
+        self.burst = burst
+        self.clock = clock
+        self._queues: Dict[str, deque] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._requests: Dict[str, list] = {}
+
+    def delay_for(self, domain: str) -> float:
+        """Délai configuré pour un domaine (ou l'un de ses domaines parents)"""
+        parts = domain.split('.')
+        for i in range(len(parts)):
+            candidate = '.'.join(parts[i:])
+            if candidate in self.domain_delays:
+                return self.domain_delays[candidate]
+        return self.default_delay
+
+    def _bucket(self, domain: str) -> TokenBucket:
+        if domain not in self._buckets:
+            self._buckets[domain] = TokenBucket(self.delay_for(domain), self.burst, self.clock())
+        return self._buckets[domain]
+
+    def add(self, link: Dict[str, Any]):
+        """Ajouter un lien à scraper"""
+        domain = get_link_domain(link['url'])
+        self._queues.setdefault(domain, deque()).append(link)
+
+    def add_all(self, links: Iterable[Dict[str, Any]]):
+        for link in links:
+            self.add(link)
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def next_ready(self, busy: Optional[Set[str]] = None):
+        """
+        Retirer le prochain lien dont le domaine peut être sollicité maintenant
+
+        Parmi les domaines prêts, celui qui a le plus de liens en attente passe
+        en premier : c'est lui qui détermine la durée totale de la campagne.
+
+        Args:
+            busy: Domaines à ignorer (plafond de concurrence atteint)
+
+        Returns:
+            tuple: (domaine, lien) ou None si aucun domaine n'est prêt
+        """
+        now = self.clock()
+        candidates = sorted(
+            (domain for domain in self._queues if not busy or domain not in busy),
+            key=lambda d: len(self._queues[d]),
+            reverse=True
+        )
+
+        for domain in candidates:
+            if self._bucket(domain).try_acquire(now):
+                link = self._queues[domain].popleft()
+                if not self._queues[domain]:
+                    del self._queues[domain]
+                self._requests.setdefault(domain, []).append(now)
+                return domain, link
+
+        return None
+
+    def wait_time(self, busy: Optional[Set[str]] = None) -> Optional[float]:
+        """Temps avant qu'un domaine non occupé redevienne disponible (None si aucun)"""
+        now = self.clock()
+        waits = [
+            self._bucket(domain).wait_time(now)
+            for domain in self._queues
+            if not busy or domain not in busy
+        ]
+        return min(waits) if waits else None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Débit effectif par domaine
+
+        Returns:
+            dict: {domaine: {'requests', 'delay', 'requests_per_second'}}
+        """
+        report = {}
+        for domain, times in self._requests.items():
+            elapsed = times[-1] - times[0]
+            rate = (len(times) - 1) / elapsed if len(times) > 1 and elapsed > 0 else 0.0
+            report[domain] = {
+                'requests': len(times),
+                'delay': self.delay_for(domain),
+                'requests_per_second': round(rate, 3)
+            }
+        return report
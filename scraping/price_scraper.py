@@ -21,22 +21,40 @@ Module de scraping des prix pour PriceChecker
 """
 
 import re
-import time
+import hashlib
 import logging
 from typing import Optional, Dict, Any, Tuple
 import requests
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from fake_useragent import UserAgent
 
+from scraping.driver_pool import get_driver_pool
+from scraping.parsers import CHUNK_SIZE, SelectolaxNode, parse_html, prescan, selector_pattern
+from scraping.structured_data import extract_structured_price
+
 logger = logging.getLogger(__name__)
 
 class PriceScraper:
     """Classe principale pour le scraping des prix"""
 
-    def __init__(self):
+    # Sélecteurs CSS communs pour les prix
+    COMMON_PRICE_SELECTORS = [
+        '.price', '.product-price', '.price-current', '.price-value',
+        '#price', '#product-price', '.price-box .price',
+        '[class*="price"]', '[id*="price"]', '.cost', '.amount',
+        '.price-display', '.current-price', '.sale-price'
+    ]
+
+    # Attente maximale de l'élément prix avec Selenium (secondes)
+    SELENIUM_WAIT_TIMEOUT = 10
+
+    def __init__(self, driver_pool=None, parser: Optional[str] = None):
+        self.driver_pool = driver_pool
+        self.parser = parser
         self.ua = UserAgent()
         self.session = requests.Session()
         self.session.headers.update({
@@ -49,7 +67,9 @@ class PriceScraper:
             'Upgrade-Insecure-Requests': '1',
         })
 
-    def scrape_price(self, url: str, css_selector: Optional[str] = None, shop_name: str = "") -> Dict[str, Any]:
+    def scrape_price(self, url: str, css_selector: Optional[str] = None, shop_name: str = "",
+                     strategy: Optional[Dict[str, Any]] = None,
+                     http_cache: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Scraper le prix d'une URL donnée
 
@@ -57,22 +77,47 @@ class PriceScraper:
             url: URL à scraper
             css_selector: Sélecteur CSS spécifique pour le prix
             shop_name: Nom de la boutique (pour logs)
+            strategy: Stratégie gagnante mémorisée lors d'un précédent scraping
+                      (fetch_mode, selector, element_path)
+            http_cache: Dernière réponse connue (etag, last_modified, content_hash,
+                        price, currency) pour une requête conditionnelle
 
         Returns:
-            Dict contenant price, currency, is_available, error_message
+            Dict contenant price, currency, is_available, error_message,
+            source (étape d'extraction : json-ld, meta, microdata, strategy,
+            css, auto, regex ou cache),
+            strategy (stratégie gagnante, None si aucun prix trouvé),
+            cache_hit (prix réutilisé sans parsing) et http_cache
+            (validateurs à mémoriser, si le prix vient de requests)
         """
         logger.info(f"🔍 Scraping prix pour {shop_name}: {url}")
 
         try:
+            # Lien connu pour nécessiter JavaScript : Selenium directement
+            if strategy and strategy.get('fetch_mode') == 'selenium':
+                result = self._scrape_with_selenium(url, css_selector, shop_name, strategy)
+                if result['price']:
+                    return self._with_strategy(result, 'selenium')
+
+                logger.info(f"Stratégie mémorisée en échec pour {shop_name}, recherche complète")
+                strategy = None
+
             # Essayer d'abord avec requests (plus rapide)
-            result = self._scrape_with_requests(url, css_selector, shop_name)
+            result = self._scrape_with_requests(url, css_selector, shop_name, strategy, http_cache)
+            fetch_mode = 'requests'
+
+            # Page inchangée : la stratégie mémorisée reste valable
+            if result.get('cache_hit'):
+                result['strategy'] = strategy
+                return result
 
             # Si échec, essayer avec Selenium pour contenu dynamique
             if not result['is_available'] and not result['price']:
                 logger.info(f"Tentative avec Selenium pour {shop_name}")
                 result = self._scrape_with_selenium(url, css_selector, shop_name)
+                fetch_mode = 'selenium'
 
-            return result
+            return self._with_strategy(result, fetch_mode)
 
         except Exception as e:
             logger.error(f"Erreur scraping {shop_name}: {e}")
@@ -80,29 +125,98 @@ class PriceScraper:
                 'price': None,
                 'currency': 'EUR',
                 'is_available': False,
-                'error_message': f'Erreur de scraping: {str(e)}'
+                'error_message': f'Erreur de scraping: {str(e)}',
+                'strategy': None
             }
 
-    def _scrape_with_requests(self, url: str, css_selector: Optional[str], shop_name: str) -> Dict[str, Any]:
-        """Scraping avec requests + BeautifulSoup"""
+    @staticmethod
+    def _with_strategy(result: Dict[str, Any], fetch_mode: str) -> Dict[str, Any]:
+        """Remplacer les détails d'extraction par la stratégie gagnante"""
+        selector = result.pop('selector', None)
+        element_path = result.pop('element_path', None)
+
+        result['strategy'] = {
+            'fetch_mode': fetch_mode,
+            'selector': selector,
+            'element_path': element_path
+        } if result['price'] else None
+
+        return result
+
+    def _scrape_with_requests(self, url: str, css_selector: Optional[str], shop_name: str,
+                              strategy: Optional[Dict[str, Any]] = None,
+                              http_cache: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Scraping avec requests + BeautifulSoup
+
+        Avec une entrée de cache HTTP, la requête est conditionnelle
+        (If-None-Match / If-Modified-Since) : sur un 304 ou un contenu
+        identique, le dernier prix extrait est réutilisé sans parsing.
+
+        La page est lue en flux : avec un sélecteur simple connu, seul le
+        début de page jusqu'à la zone du prix est parsé.
+        """
         try:
             # Rotation du User-Agent
             self.session.headers['User-Agent'] = self.ua.random
 
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            cached_price = http_cache and http_cache.get('price') is not None
+            headers = {}
+            if cached_price:
+                if http_cache.get('etag'):
+                    headers['If-None-Match'] = http_cache['etag']
+                if http_cache.get('last_modified'):
+                    headers['If-Modified-Since'] = http_cache['last_modified']
 
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # Extraire le prix
-            price_info = self._extract_price_from_soup(soup, css_selector, shop_name)
+            response = self.session.get(url, timeout=10, headers=headers, stream=True)
+            try:
+                response.raise_for_status()
+
+                if cached_price and response.status_code == 304:
+                    logger.info(f"♻️ Page inchangée (304) pour {shop_name}, prix réutilisé")
+                    return self._cached_result(http_cache)
+
+                # Pré-scan : ne lire la page que jusqu'à la zone du sélecteur connu,
+                # ou jusqu'aux données structurées quand aucun sélecteur n'est imposé
+                hint = (strategy and strategy.get('selector')) or css_selector
+                content, region, rest = prescan(response.iter_content(CHUNK_SIZE), selector_pattern(hint),
+                                                structured=not css_selector)
+
+                content_hash = hashlib.sha256(content).hexdigest()
+                if cached_price and content_hash == http_cache.get('content_hash'):
+                    logger.info(f"♻️ Contenu identique pour {shop_name}, prix réutilisé")
+                    return self._cached_result(http_cache)
+
+                price_info = None
+                if region == 'selector':
+                    price_info = self._extract_from_prefix(parse_html(content, self.parser), hint, strategy)
+                elif region:
+                    price_info = extract_structured_price(content)
+
+                # Zone du prix absente du début de page : lecture et extraction complètes
+                if not price_info:
+                    content += b''.join(rest)
+                    content_hash = hashlib.sha256(content).hexdigest()
+                    price_info = self._extract_price(content, css_selector, shop_name, strategy)
+            finally:
+                response.close()
+
+            # Validateurs HTTP à mémoriser pour le prochain scraping
+            validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': content_hash
+            }
 
             if price_info['price']:
                 logger.info(f"✅ Prix trouvé avec requests: {price_info['price']} {price_info['currency']}")
+                available = price_info.pop('is_available', True)
                 return {
                     **price_info,
-                    'is_available': True,
-                    'error_message': None
+                    'is_available': available,
+                    'error_message': None if available else 'Produit indisponible',
+                    # Le cache HTTP ne mémorise que des prix disponibles
+                    'http_cache': validators if available else None
                 }
             else:
                 return {
@@ -120,36 +234,42 @@ class PriceScraper:
                 'error_message': f'Erreur réseau: {str(e)}'
             }
 
-    def _scrape_with_selenium(self, url: str, css_selector: Optional[str], shop_name: str) -> Dict[str, Any]:
-        """Scraping avec Selenium pour contenu dynamique"""
-        driver = None
+    @staticmethod
+    def _cached_result(http_cache: Dict[str, Any]) -> Dict[str, Any]:
+        """Résultat reconstruit depuis le cache HTTP (page non modifiée)"""
+        return {
+            'price': http_cache['price'],
+            'currency': http_cache.get('currency') or 'EUR',
+            'is_available': True,
+            'error_message': None,
+            'source': 'cache',
+            'cache_hit': True
+        }
+
+    def _scrape_with_selenium(self, url: str, css_selector: Optional[str], shop_name: str,
+                              strategy: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Scraping avec Selenium pour contenu dynamique (navigateur emprunté au pool partagé)"""
+        pool = self.driver_pool or get_driver_pool()
         try:
-            # Configuration Chrome headless
-            options = Options()
-            options.add_argument('--headless')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_argument(f'--user-agent={self.ua.random}')
-
-            driver = webdriver.Chrome(options=options)
-            driver.set_page_load_timeout(15)
+            with pool.driver() as driver:
+                driver.get(url)
 
-            driver.get(url)
+                # Attendre l'apparition du prix plutôt qu'un délai fixe
+                hinted_selector = strategy and (strategy.get('element_path') or strategy.get('selector'))
+                self._wait_for_price(driver, hinted_selector or css_selector)
 
-            # Attendre un peu pour le chargement dynamique
-            time.sleep(2)
+                page_source = driver.page_source
 
             # Extraire le prix
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            price_info = self._extract_price_from_soup(soup, css_selector, shop_name)
+            price_info = self._extract_price(page_source, css_selector, shop_name, strategy)
 
             if price_info['price']:
                 logger.info(f"✅ Prix trouvé avec Selenium: {price_info['price']} {price_info['currency']}")
+                available = price_info.pop('is_available', True)
                 return {
                     **price_info,
-                    'is_available': True,
-                    'error_message': None
+                    'is_available': available,
+                    'error_message': None if available else 'Produit indisponible'
                 }
             else:
                 return {
@@ -158,7 +278,7 @@ class PriceScraper:
                     'error_message': 'Prix non trouvé'
                 }
 
-        except (TimeoutException, WebDriverException) as e:
+        except (TimeoutException, WebDriverException, TimeoutError) as e:
             logger.warning(f"Erreur Selenium pour {shop_name}: {e}")
             return {
                 'price': None,
@@ -166,13 +286,53 @@ class PriceScraper:
                 'is_available': False,
                 'error_message': f'Erreur navigateur: {str(e)}'
             }
-        finally:
-            if driver:
-                driver.quit()
 
-    def _extract_price_from_soup(self, soup: BeautifulSoup, css_selector: Optional[str], shop_name: str) -> Dict[str, Any]:
+    def _wait_for_price(self, driver, css_selector: Optional[str]):
+        """Attendre explicitement qu'un élément prix soit présent dans la page"""
+        selector = css_selector or ', '.join(self.COMMON_PRICE_SELECTORS)
+        try:
+            WebDriverWait(driver, self.SELENIUM_WAIT_TIMEOUT).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+            )
+        except TimeoutException:
+            # On tente quand même l'extraction (regex sur le texte de la page)
+            logger.debug(f"Élément prix '{selector}' absent après {self.SELENIUM_WAIT_TIMEOUT}s")
+
+    def _extract_price(self, content, css_selector: Optional[str], shop_name: str,
+                       strategy: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Extraire le prix d'une page complète
+
+        Les données structurées (JSON-LD, meta, microdata) sont lues avant
+        toute construction du DOM ; avec un sélecteur imposé, elles ne servent
+        que de repli si le sélecteur ne trouve rien.
+        """
+        if not css_selector:
+            structured = extract_structured_price(content)
+            if structured:
+                logger.info(f"Prix trouvé dans les données structurées ({structured['source']}): {structured['price']}")
+                return structured
+
+        price_info = self._extract_price_from_soup(parse_html(content, self.parser), css_selector, shop_name, strategy)
+
+        if css_selector and not price_info['price']:
+            structured = extract_structured_price(content)
+            if structured:
+                logger.info(f"Sélecteur en échec, prix des données structurées ({structured['source']})")
+                return structured
+
+        return price_info
+
+    def _extract_price_from_soup(self, soup: BeautifulSoup, css_selector: Optional[str], shop_name: str,
+                                 strategy: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Extraire le prix depuis BeautifulSoup"""
 
+        # Stratégie mémorisée : élément exact puis sélecteur gagnant
+        if strategy:
+            price_info = self._extract_with_strategy(soup, strategy)
+            if price_info['price']:
+                return price_info
+
         # Si sélecteur CSS fourni, l'utiliser en priorité
         if css_selector:
             return self._extract_with_css_selector(soup, css_selector, shop_name)
@@ -180,6 +340,69 @@ class PriceScraper:
         # Sinon, essayer l'auto-détection
         return self._auto_detect_price(soup, shop_name)
 
+    def _extract_from_prefix(self, soup, selector: Optional[str],
+                             strategy: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Extraire le prix d'un début de page, uniquement via la stratégie ou
+        le sélecteur ciblé (l'auto-détection exige la page complète)
+        """
+        if strategy:
+            price_info = self._extract_with_strategy(soup, strategy)
+            if price_info['price']:
+                return price_info
+
+        try:
+            for element in soup.select(selector):
+                price, currency = self._parse_price_text(element.get_text(strip=True))
+                if price:
+                    return {'price': price, 'currency': currency, 'source': 'css',
+                            'selector': selector, 'element_path': self._element_path(element)}
+        except Exception as e:
+            logger.debug(f"Sélecteur '{selector}' inutilisable sur le début de page: {e}")
+
+        return None
+
+    def _extract_with_strategy(self, soup: BeautifulSoup, strategy: Dict[str, Any]) -> Dict[str, Any]:
+        """Extraire avec la stratégie mémorisée, sans recherche"""
+        element_path = strategy.get('element_path')
+        selector = strategy.get('selector')
+
+        try:
+            if element_path:
+                element = soup.select_one(element_path)
+                if element is not None:
+                    price, currency = self._parse_price_text(element.get_text(strip=True))
+                    if price:
+                        return {'price': price, 'currency': currency, 'source': 'strategy',
+                                'selector': selector, 'element_path': element_path}
+
+            if selector:
+                for element in soup.select(selector):
+                    price, currency = self._parse_price_text(element.get_text(strip=True))
+                    if price:
+                        return {'price': price, 'currency': currency, 'source': 'strategy',
+                                'selector': selector, 'element_path': self._element_path(element)}
+        except Exception as e:
+            logger.debug(f"Stratégie mémorisée inutilisable ({element_path or selector}): {e}")
+
+        return {'price': None, 'currency': 'EUR'}
+
+    @staticmethod
+    def _element_path(element) -> Optional[str]:
+        """Chemin CSS exact d'un élément (tag:nth-of-type depuis la racine)"""
+        parts = []
+        while element is not None and element.name and element.name != '[document]':
+            parent = element.parent
+            if parent is None:
+                break
+            siblings = parent.find_all(element.name, recursive=False)
+            # Par identité : des frères identiques (même prix affiché) sont égaux pour bs4
+            index = next(i for i, sibling in enumerate(siblings)
+                         if sibling is element or (isinstance(sibling, SelectolaxNode) and sibling == element))
+            parts.append(f"{element.name}:nth-of-type({index + 1})")
+            element = parent
+        return ' > '.join(reversed(parts)) or None
+
     def _extract_with_css_selector(self, soup: BeautifulSoup, css_selector: str, shop_name: str) -> Dict[str, Any]:
         """Extraire avec sélecteur CSS spécifique"""
         try:
@@ -191,7 +414,8 @@ class PriceScraper:
 
                 if price:
                     logger.info(f"Prix trouvé avec CSS '{css_selector}': {price_text}")
-                    return {'price': price, 'currency': currency}
+                    return {'price': price, 'currency': currency, 'source': 'css',
+                            'selector': css_selector, 'element_path': self._element_path(element)}
 
             logger.warning(f"Aucun prix trouvé avec CSS '{css_selector}' pour {shop_name}")
             return {'price': None, 'currency': 'EUR'}
@@ -203,16 +427,8 @@ class PriceScraper:
     def _auto_detect_price(self, soup: BeautifulSoup, shop_name: str) -> Dict[str, Any]:
         """Auto-détection du prix avec patterns communs"""
 
-        # Sélecteurs CSS communs pour les prix
-        common_selectors = [
-            '.price', '.product-price', '.price-current', '.price-value',
-            '#price', '#product-price', '.price-box .price',
-            '[class*="price"]', '[id*="price"]', '.cost', '.amount',
-            '.price-display', '.current-price', '.sale-price'
-        ]
-
-        # Essayer chaque sélecteur
-        for selector in common_selectors:
+        # Essayer chaque sélecteur commun
+        for selector in self.COMMON_PRICE_SELECTORS:
             try:
                 elements = soup.select(selector)
                 for element in elements:
@@ -221,7 +437,8 @@ class PriceScraper:
 
                     if price:
                         logger.info(f"Prix auto-détecté avec '{selector}': {price_text}")
-                        return {'price': price, 'currency': currency}
+                        return {'price': price, 'currency': currency, 'source': 'auto',
+                                'selector': selector, 'element_path': self._element_path(element)}
             except:
                 continue
 
@@ -249,7 +466,7 @@ class PriceScraper:
                     price, currency = self._parse_price_text(match)
                     if price and price > 0.01:  # Prix minimum raisonnable
                         logger.info(f"Prix trouvé par regex: {match}")
-                        return {'price': price, 'currency': currency}
+                        return {'price': price, 'currency': currency, 'source': 'regex'}
 
         logger.warning(f"Aucun prix détecté pour {shop_name}")
         return {'price': None, 'currency': 'EUR'}
@@ -296,6 +513,6 @@ class PriceScraper:
         return None, currency
 
 # Fonction utilitaire pour l'export
-def create_price_scraper() -> PriceScraper:
+def create_price_scraper(parser: Optional[str] = None) -> PriceScraper:
     """Factory function pour créer un scraper"""
-    return PriceScraper()
\ No newline at end of file
+    return PriceScraper(parser=parser)
\ No newline at end of file
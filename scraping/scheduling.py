@@ -0,0 +1,153 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Calcul des prochaines dates de scraping des liens
+
+Chaque lien a sa fréquence (réglage du lien, de sa boutique ou global)
+et une phase stable dérivée de son ID :
+- fréquence inférieure à un jour : le lien est scrapé sur une grille
+  régulière décalée de sa phase (les liens horaires se répartissent
+  sur toute l'heure)
+- fréquence d'un jour ou plus : le lien est scrapé dans la fenêtre
+  quotidienne (AUTO_UPDATE_HOUR + AUTO_UPDATE_WINDOW_HOURS), à la
+  position donnée par sa phase
+
+Le volume de requêtes reste ainsi étalé au lieu d'une rafale à heure fixe.
+Les dates sont des timestamps epoch ; la fenêtre est en heure locale.
+
+Sans fréquence imposée, la fréquence s'adapte à la volatilité observée :
+un lien dont le prix change souvent est scrapé plus souvent que la
+fréquence de base, et chaque scraping sans changement multiplie
+l'intervalle (recul exponentiel) jusqu'à un plafond. Un changement
+ramène immédiatement le lien à sa fréquence de base.
+"""
+
+import time
+from typing import Dict, Optional
+
+from scraping.politeness import get_link_domain
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Scrapings visés entre deux changements de prix attendus
+SAMPLES_PER_CHANGE = 2
+
+# Constante multiplicative de Knuth : répartit uniformément des IDs consécutifs
+_PHASE_MULTIPLIER = 2654435761
+
+
+def link_phase(link_id: int) -> float:
+    """Position stable du lien dans sa période, dans [0, 1)"""
+    return ((int(link_id) * _PHASE_MULTIPLIER) % 2 ** 32) / 2 ** 32
+
+
+def interval_for(link: Dict, default_interval: float, domain_intervals: Optional[Dict[str, float]] = None) -> float:
+    """
+    Fréquence de scraping d'un lien (secondes)
+
+    Priorité : réglage du lien (interval_seconds), puis de sa boutique
+    (domaine ou domaine parent dans domain_intervals, en heures), puis défaut.
+    """
+    if link.get('interval_seconds'):
+        return float(link['interval_seconds'])
+
+    domain = get_link_domain(link.get('url', ''))
+    for configured, hours in (domain_intervals or {}).items():
+        configured = configured.lower()
+        if configured.startswith('www.'):
+            configured = configured[4:]
+        if domain == configured or domain.endswith('.' + configured):
+            return float(hours) * HOUR
+
+    return float(default_interval)
+
+
+def change_rate(changes: int, span_seconds: float) -> float:
+    """Nombre de changements de prix par jour observés sur une période (d'au moins une heure)"""
+    if not changes:
+        return 0.0
+    return changes * DAY / max(float(span_seconds or 0), HOUR)
+
+
+def adaptive_interval(base_interval: float, rate: float, unchanged_runs: int, min_interval: float,
+                      max_interval: float, backoff: float = 2.0) -> float:
+    """
+    Fréquence adaptée à la volatilité d'un lien (secondes)
+
+    Args:
+        base_interval: Fréquence de base (boutique ou globale)
+        rate: Changements de prix par jour observés (voir change_rate)
+        unchanged_runs: Scrapings consécutifs sans changement de prix
+        min_interval: Plancher de la fréquence
+        max_interval: Plafond du recul exponentiel
+        backoff: Facteur appliqué par scraping sans changement
+    """
+    target = float(base_interval)
+    if rate > 0:
+        # Volatilité observée : viser SAMPLES_PER_CHANGE scrapings par changement
+        target = min(target, DAY / (rate * SAMPLES_PER_CHANGE))
+
+    # Exposant borné : au-delà, le plafond est de toute façon atteint
+    interval = target * max(float(backoff), 1.0) ** min(max(int(unchanged_runs), 0), 64)
+    return float(min(max(interval, min_interval), max(max_interval, min_interval)))
+
+
+def _window_slot(link_id: int, day: float, window_start_hour: int, window_hours: float) -> float:
+    """Position du lien dans la fenêtre quotidienne du jour contenant `day`"""
+    date = time.localtime(day)
+    window_start = time.mktime((date.tm_year, date.tm_mon, date.tm_mday,
+                                int(window_start_hour), 0, 0, 0, 0, -1))
+    return window_start + link_phase(link_id) * max(float(window_hours), 0) * HOUR
+
+
+def next_run_time(link_id: int, interval: float, now: float, window_start_hour: int = 6,
+                  window_hours: float = 6) -> float:
+    """
+    Prochaine date de scraping d'un lien (timestamp epoch, strictement après `now`)
+
+    Args:
+        link_id: ID du lien (phase stable)
+        interval: Fréquence du lien (secondes)
+        now: Date courante (timestamp epoch)
+        window_start_hour: Début de la fenêtre quotidienne (heure locale)
+        window_hours: Durée de la fenêtre quotidienne
+    """
+    interval = max(float(interval), 60.0)
+
+    if interval < DAY:
+        offset = link_phase(link_id) * interval
+        periods = (now - offset) // interval + 1
+        return periods * interval + offset
+
+    # Fenêtre du jour cible ; le créneau peut précéder `now + interval` de quelques heures
+    slot = _window_slot(link_id, now + interval, window_start_hour, window_hours)
+    while slot <= now:
+        slot += DAY
+    return slot
+
+
+def first_run_time(link_id: int, interval: float, now: float, window_start_hour: int = 6,
+                   window_hours: float = 6) -> float:
+    """Première date de scraping d'un lien jamais planifié : son prochain créneau"""
+    if interval < DAY:
+        return next_run_time(link_id, interval, now, window_start_hour, window_hours)
+
+    slot = _window_slot(link_id, now, window_start_hour, window_hours)
+    return slot if slot > now else slot + DAY
@@ -0,0 +1,230 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Extraction du prix depuis les données structurées des pages produit
+
+Sources lues, par ordre de priorité :
+- 'json-ld'   : <script type="application/ld+json"> (schema.org Product / Offer)
+- 'meta'      : balises OpenGraph / produit (product:price:amount, og:price:amount)
+- 'microdata' : attributs itemprop="price" / "priceCurrency" / "availability"
+
+Seuls ces blocs et balises sont lus, par expressions régulières : aucun
+arbre DOM n'est construit.
+"""
+
+import re
+import json
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JSON_LD_BLOCK = re.compile(
+    r'<script[^>]+application/ld\+json[^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL
+)
+
+META_TAG = re.compile(r'<meta\b[^>]*>', re.IGNORECASE)
+
+# Balises hors <meta> portant une propriété d'offre en microdata
+ITEMPROP_TAG = re.compile(
+    r'<(?!meta\b)[a-z][\w-]*\b[^>]*\bitemprop\s*=\s*["\']?(?:price|pricecurrency|availability)\b[^>]*>',
+    re.IGNORECASE
+)
+
+ATTRIBUTE = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+
+META_FIELDS = {
+    'product:price:amount': 'price',
+    'og:price:amount': 'price',
+    'product:price:currency': 'currency',
+    'og:price:currency': 'currency',
+    'product:availability': 'availability',
+    'og:availability': 'availability',
+}
+
+MICRODATA_FIELDS = {
+    'price': 'price',
+    'pricecurrency': 'currency',
+    'availability': 'availability',
+}
+
+# Valeurs schema.org / OpenGraph normalisées (minuscules, sans espaces)
+IN_STOCK = {'instock', 'instoreonly', 'onlineonly', 'limitedavailability', 'preorder', 'presale', 'available'}
+OUT_OF_STOCK = {'outofstock', 'soldout', 'discontinued', 'oos', 'unavailable'}
+
+OFFER_TYPES = {'offer', 'aggregateoffer'}
+
+
+def extract_structured_price(content) -> Optional[Dict[str, Any]]:
+    """
+    Extraire prix, devise et disponibilité des données structurées d'une page
+
+    Args:
+        content: HTML (bytes ou str), éventuellement tronqué par le pré-scan
+
+    Returns:
+        Dict avec price, currency, is_available et source, ou None si la page
+        ne déclare pas de prix exploitable
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+
+    for extract in (_from_json_ld, _from_meta, _from_microdata):
+        result = extract(content)
+        if result:
+            return result
+
+    return None
+
+
+def _from_json_ld(html: str) -> Optional[Dict[str, Any]]:
+    for block in JSON_LD_BLOCK.findall(html):
+        try:
+            data = json.loads(block.strip(), strict=False)
+        except ValueError:
+            logger.debug("Bloc JSON-LD invalide ignoré")
+            continue
+
+        for offer in _iter_offers(data):
+            result = _offer_result(offer)
+            if result:
+                return _build(**result, source='json-ld')
+
+    return None
+
+
+def _iter_offers(data):
+    """Parcourir un document JSON-LD et produire les offres (Offer / AggregateOffer)"""
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_offers(item)
+        return
+
+    if not isinstance(data, dict):
+        return
+
+    types = data.get('@type')
+    types = {str(t).lower() for t in (types if isinstance(types, list) else [types])}
+
+    if types & OFFER_TYPES:
+        yield data
+
+    for key in ('@graph', 'offers', 'mainEntity', 'itemListElement'):
+        if key in data:
+            yield from _iter_offers(data[key])
+
+
+def _offer_result(offer: dict) -> Optional[Dict[str, Any]]:
+    price = offer.get('price', offer.get('lowPrice'))
+    currency = offer.get('priceCurrency')
+
+    specification = offer.get('priceSpecification')
+    if isinstance(specification, list):
+        specification = specification[0] if specification else None
+    if price is None and isinstance(specification, dict):
+        price = specification.get('price')
+        currency = currency or specification.get('priceCurrency')
+
+    price = _to_float(price)
+    if price is None:
+        return None
+
+    return {'price': price, 'currency': currency, 'availability': offer.get('availability')}
+
+
+def _from_meta(html: str) -> Optional[Dict[str, Any]]:
+    fields = {}
+    for tag in META_TAG.findall(html):
+        attributes = _attributes(tag)
+        field = META_FIELDS.get((attributes.get('property') or attributes.get('name') or '').lower())
+        if field and field not in fields and attributes.get('content'):
+            fields[field] = attributes['content']
+
+    price = _to_float(fields.get('price'))
+    if price is None:
+        return None
+    return _build(price, fields.get('currency'), fields.get('availability'), source='meta')
+
+
+def _from_microdata(html: str) -> Optional[Dict[str, Any]]:
+    fields = {}
+    tags = [tag for tag in META_TAG.findall(html) if 'itemprop' in tag.lower()] + ITEMPROP_TAG.findall(html)
+    for tag in tags:
+        attributes = _attributes(tag)
+        field = MICRODATA_FIELDS.get((attributes.get('itemprop') or '').lower())
+        value = attributes.get('content') or attributes.get('href')
+        if field and field not in fields and value:
+            fields[field] = value
+
+    price = _to_float(fields.get('price'))
+    if price is None:
+        return None
+    return _build(price, fields.get('currency'), fields.get('availability'), source='microdata')
+
+
+def _attributes(tag: str) -> Dict[str, str]:
+    return {
+        match.group(1).lower(): next(value for value in match.groups()[1:] if value is not None)
+        for match in ATTRIBUTE.finditer(tag)
+    }
+
+
+def _to_float(value) -> Optional[float]:
+    """Convertir un prix déclaré ("1 299,00", "1.299,00", "1,299", "19.90", 19.9) en float"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+
+    text = re.sub(r'[^\d,.]', '', str(value))
+    # Le dernier séparateur est décimal, sauf suivi d'exactement 3 chiffres (milliers)
+    last = max(text.rfind(','), text.rfind('.'))
+    if last >= 0:
+        integer, decimals = re.sub(r'[,.]', '', text[:last]), text[last + 1:]
+        text = integer + decimals if len(decimals) == 3 else f'{integer}.{decimals}'
+
+    try:
+        price = float(text)
+    except ValueError:
+        return None
+    return price if price > 0 else None
+
+
+def parse_availability(value) -> Optional[bool]:
+    """Disponibilité schema.org / OpenGraph ('https://schema.org/InStock', 'out of stock', ...)"""
+    if not value or not isinstance(value, str):
+        return None
+
+    normalized = re.sub(r'[\s_-]', '', value.rstrip('/').rsplit('/', 1)[-1].lower())
+    if normalized in IN_STOCK:
+        return True
+    if normalized in OUT_OF_STOCK:
+        return False
+    return None
+
+
+def _build(price: float, currency: Optional[str], availability, source: str) -> Dict[str, Any]:
+    available = parse_availability(availability)
+    return {
+        'price': price,
+        'currency': (currency or 'EUR').strip().upper()[:3] or 'EUR',
+        'is_available': available is not False,
+        'source': source
+    }
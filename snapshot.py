@@ -0,0 +1,64 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Snapshot analytique de l'historique des prix (fichiers Parquet / Arrow)
+
+Ajoute au répertoire du snapshot les relevés exportables depuis la passe
+précédente (voir app/snapshot.py). Les fichiers se lisent ensuite sans
+toucher à la base, par exemple avec DuckDB :
+
+    SELECT shop_name, avg(price) FROM 'snapshots/*.parquet' GROUP BY shop_name
+
+Usage:
+    python snapshot.py                      # Passe incrémentale
+    python snapshot.py --format arrow       # Fichiers Arrow IPC
+    python snapshot.py --full               # Reconstruire le snapshot
+"""
+
+import os
+import logging
+import argparse
+from dotenv import load_dotenv
+from app import create_app
+from app.snapshot import SNAPSHOT_FORMATS, run_snapshot
+
+# Charger les variables du fichier .env
+load_dotenv()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='Répertoire du snapshot (SNAPSHOT_DIR)')
+    parser.add_argument('--format', choices=list(SNAPSHOT_FORMATS), help='Format des fichiers (SNAPSHOT_FORMAT)')
+    parser.add_argument('--batch-rows', type=int, help='Relevés par lot (SNAPSHOT_BATCH_ROWS)')
+    parser.add_argument('--full', action='store_true', help='Reconstruire le snapshot depuis le premier relevé')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    # Aucun scraping : pas de navigateur préchauffé
+    app = create_app(overrides={'SELENIUM_WARM_SIZE': 0})
+    print("📦 Snapshot analytique de l'historique des prix...")
+    report = run_snapshot(app, output_dir=args.output, fmt=args.format, batch_rows=args.batch_rows, full=args.full)
+
+    if report['file']:
+        print(f"✅ {report['rows']} relevé(s) écrit(s) dans {report['file']}")
+    else:
+        print("ℹ️ Aucun nouveau relevé à exporter")
+    print(f"   {report['pending']} dernier(s) relevé(s) de lien en attente, dernier ID exporté : {report['last_id']}")
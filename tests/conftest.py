@@ -26,23 +26,19 @@ from database.models import init_db
 
 
 @pytest.fixture(scope='session')
-def app():
+def app(tmp_path_factory):
     """Application Flask pour les tests"""
-    # Configuration de test simplifiée
-    test_config = {
-        'TESTING': True,
-        'SECRET_KEY': 'test-secret-key',
-        'DATABASE_PATH': ':memory:'  # Base en mémoire plus simple
-    }
+    # Base fichier : les connexions du pool (requêtes, workers) voient les mêmes données
+    database_path = tmp_path_factory.mktemp('db') / 'pricechecker-test.db'
 
-    app = create_app('testing')
-    app.config.update(test_config)
+    app = create_app('testing', overrides={'DATABASE_PATH': str(database_path)})
 
     with app.app_context():
         init_db()
 
     yield app
-    # Pas de nettoyage nécessaire avec :memory:
+
+    app.extensions['sqlite'].close_all()
 
 
 @pytest.fixture
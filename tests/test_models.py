@@ -20,10 +20,25 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 Tests pour les modèles de base de données
 """
 
+import sqlite3
+
 import pytest
+from database.cache import QueryCache, get_query_cache
+from database.connection import get_connection_manager, get_request_db_stats
+from database.migrations import LATEST_VERSION, apply_migrations, get_schema_version
+from database.writer import PriceWriter
 from database.models import (
-    init_db, get_all_products, create_product,
-    get_product_by_id, add_product_link, get_latest_prices
+    init_db, get_db_connection, get_all_products, create_product,
+    get_product_by_id, add_product_link, get_latest_prices,
+    save_link_strategy, get_link_strategies, clear_link_strategy,
+    save_http_cache, get_http_cache_entries, clear_http_cache,
+    record_price, get_catalogue_latest_prices, get_catalogue,
+    get_history_resolution, get_price_history_for_chart, get_price_statistics, get_product_statistics,
+    get_global_stats, rebuild_stats_counters, delete_product_link,
+    compact_price_links, expire_error_prices, get_maintenance_report, get_scraping_stats,
+    record_extraction, get_extraction_stats,
+    enqueue_scrape_job, claim_scrape_job, update_scrape_job_progress,
+    finish_scrape_job, get_scrape_job, cancel_scrape_job
 )
 
 
@@ -121,4 +136,988 @@ class TestProductLinks:
             # Récupérer les prix
             prices = get_latest_prices(product_id)
             assert isinstance(prices, list)
-            # Peut être vide ou contenir des liens sans prix
\ No newline at end of file
+            # Peut être vide ou contenir des liens sans prix
+
+class TestLinkStrategies:
+    """Tests du cache de stratégie d'extraction"""
+
+    def test_save_and_get_strategy(self, app, sample_product):
+        """Test mémorisation puis remplacement d'une stratégie"""
+        with app.app_context():
+            product_id = create_product(sample_product['name'])
+            link_id = add_product_link(product_id, "Fnac", "https://fnac.com/test")
+
+            save_link_strategy(link_id, {'fetch_mode': 'requests', 'selector': '.price',
+                                         'element_path': 'html > body > span:nth-of-type(1)'})
+            save_link_strategy(link_id, {'fetch_mode': 'selenium', 'selector': '.prix',
+                                         'element_path': None})
+
+            strategies = get_link_strategies([link_id])
+            assert strategies[link_id] == {'fetch_mode': 'selenium', 'selector': '.prix',
+                                           'element_path': None}
+
+    def test_clear_strategy(self, app, sample_product):
+        """Test oubli d'une stratégie"""
+        with app.app_context():
+            product_id = create_product(sample_product['name'])
+            link_id = add_product_link(product_id, "Darty", "https://darty.com/test")
+
+            save_link_strategy(link_id, {'fetch_mode': 'requests', 'selector': '.price'})
+            clear_link_strategy(link_id)
+            assert get_link_strategies([link_id]) == {}
+
+
+class TestHttpCache:
+    """Tests du cache HTTP persistant"""
+
+    def test_save_and_clear(self, app):
+        """Test mémorisation puis invalidation des validateurs"""
+        with app.app_context():
+            url = "https://boutique.fr/produit-cache"
+            save_http_cache(url, {'etag': '"abc"', 'last_modified': None, 'content_hash': 'h1'}, 19.99)
+            save_http_cache(url, {'etag': '"def"', 'last_modified': None, 'content_hash': 'h2'}, 17.49)
+
+            entry = get_http_cache_entries([url])[url]
+            assert entry['etag'] == '"def"'
+            assert entry['price'] == 17.49
+
+            clear_http_cache(url)
+            assert get_http_cache_entries([url]) == {}
+
+
+class TestExtractionStats:
+    """Tests du suivi des étapes d'extraction par boutique"""
+
+    def test_structured_rate_per_shop(self, app):
+        """Test du taux de prix issus des données structurées"""
+        with app.app_context():
+            for source in ('json-ld', 'json-ld', 'meta', 'css'):
+                record_extraction('Boutique A', source)
+            record_extraction('Boutique B', 'none')
+
+            stats = {shop['shop_name']: shop for shop in get_extraction_stats()}
+            assert stats['Boutique A']['total'] == 4
+            assert stats['Boutique A']['structured'] == 3
+            assert stats['Boutique A']['structured_rate'] == 75.0
+            assert stats['Boutique A']['sources'] == {'json-ld': 2, 'meta': 1, 'css': 1}
+            assert stats['Boutique B']['structured_rate'] == 0
+
+
+class TestScrapeJobs:
+    """Tests de la file de jobs de scraping"""
+
+    def test_duplicate_jobs_merged(self, app):
+        """Test fusion des demandes pour un même produit"""
+        with app.app_context():
+            product_id = create_product("Produit Job Doublon")
+            first = enqueue_scrape_job(product_id)
+            second = enqueue_scrape_job(product_id)
+
+            assert first['merged'] is False
+            assert second['merged'] is True
+            assert second['id'] == first['id']
+
+            cancel_scrape_job(first['id'])
+            assert enqueue_scrape_job(product_id)['id'] != first['id']
+
+    def test_claim_progress_and_finish(self, app):
+        """Test cycle de vie d'un job : file, exécution, fin"""
+        with app.app_context():
+            product_id = create_product("Produit Job Cycle")
+            job = enqueue_scrape_job(product_id)
+
+            claimed = claim_scrape_job('test-worker')
+            while claimed['id'] != job['id']:
+                finish_scrape_job(claimed['id'], 'done')
+                claimed = claim_scrape_job('test-worker')
+
+            assert claimed['status'] == 'running'
+            assert update_scrape_job_progress(job['id'], total=4, completed=1, succeeded=1) is False
+
+            # Un job en cours est seulement marqué pour annulation
+            assert cancel_scrape_job(job['id'])['cancel_requested'] is True
+            assert update_scrape_job_progress(job['id'], completed=2, succeeded=1, failed=1) is True
+
+            finish_scrape_job(job['id'], 'cancelled', [{'shop_name': 'A', 'success': True}])
+            final = get_scrape_job(job['id'])
+            assert final['status'] == 'cancelled'
+            assert final['progress'] == 50.0
+            assert final['results'] == [{'shop_name': 'A', 'success': True}]
+
+    def test_product_merged_into_queued_catalogue_job(self, app):
+        """Test qu'un produit rejoint un scraping global pas encore démarré"""
+        with app.app_context():
+            product_id = create_product("Produit Job Catalogue")
+            catalogue = enqueue_scrape_job()
+            try:
+                merged = enqueue_scrape_job(product_id)
+                assert merged['merged'] and merged['id'] == catalogue['id']
+            finally:
+                cancel_scrape_job(catalogue['id'])
+
+    def test_claim_empty_queue(self, app):
+        """Test réservation sur file vide"""
+        with app.app_context():
+            while claim_scrape_job('test-worker'):
+                pass
+            assert claim_scrape_job('test-worker') is None
+
+
+class TestConnections:
+    """Tests de la gestion des connexions (pragmas, connexion par requête, pool)"""
+
+    def test_pragmas_applied(self, app):
+        """Test que les pragmas de la configuration sont appliqués aux connexions"""
+        with app.app_context():
+            conn = get_db_connection()
+            cache_size = conn.execute('PRAGMA cache_size').fetchone()[0]
+            conn.close()
+
+        assert cache_size == app.config['SQLITE_PRAGMAS']['cache_size']
+
+    def test_request_shares_one_connection(self, app):
+        """Test qu'une requête réutilise une seule connexion pour tous ses accès"""
+        with app.test_request_context('/'):
+            product_id = create_product("Produit Connexion Partagée")
+            get_product_by_id(product_id)
+            get_latest_prices(product_id)
+
+            stats = get_request_db_stats()
+            assert stats['acquired'] == 3
+            assert stats['opened'] <= 1
+
+    def test_pool_reuses_connections(self, app):
+        """Test que hors requête les connexions sont rendues au pool puis réutilisées"""
+        with app.app_context():
+            get_all_products()
+            pool = get_connection_manager().pool(app.config)
+            opened = pool.stats()['opened']
+
+            for _ in range(5):
+                get_all_products()
+
+            stats = pool.stats()
+            assert stats['opened'] == opened
+            assert stats['in_use'] == 0
+
+    def test_close_discards_uncommitted_changes(self, app):
+        """Test que close() annule ce qui n'a pas été validé, comme une vraie fermeture"""
+        with app.test_request_context('/'):
+            conn = get_db_connection()
+            conn.execute("INSERT INTO products (name) VALUES ('Produit Non Validé')")
+            conn.close()
+
+            conn = get_db_connection()
+            count = conn.execute("SELECT COUNT(*) FROM products WHERE name = 'Produit Non Validé'").fetchone()[0]
+            conn.close()
+
+        assert count == 0
+
+    def test_pool_rejects_memory_database(self):
+        """Test qu'une base en mémoire est refusée plutôt que vide pour chaque connexion"""
+        from database.connection import ConnectionPool
+
+        for path in (':memory:', 'file::memory:?cache=shared'):
+            with pytest.raises(ValueError):
+                ConnectionPool(path)
+
+
+class TestMigrations:
+    """Tests des migrations versionnées du schéma"""
+
+    def test_database_at_latest_version(self, app):
+        """Test qu'init_db amène la base à la dernière version, sans rien rejouer ensuite"""
+        with app.app_context():
+            init_db()
+            conn = get_db_connection()
+            try:
+                assert get_schema_version(conn) == LATEST_VERSION
+                assert apply_migrations(conn) == []
+            finally:
+                conn.close()
+
+    def test_upgrade_old_schema(self, tmp_path):
+        """Test migration d'une base antérieure au versionnement"""
+        conn = sqlite3.connect(tmp_path / 'ancienne.db')
+        conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, created_at TIMESTAMP)')
+        conn.execute('''CREATE TABLE product_links (id INTEGER PRIMARY KEY, product_id INTEGER,
+                        shop_name TEXT, url TEXT)''')
+        conn.execute('''CREATE TABLE price_history (id INTEGER PRIMARY KEY, product_link_id INTEGER,
+                        price REAL, currency TEXT, is_available BOOLEAN, scraped_at TIMESTAMP,
+                        error_message TEXT)''')
+        conn.execute('''CREATE TABLE link_schedule (product_link_id INTEGER PRIMARY KEY,
+                        interval_seconds INTEGER, next_run_at TIMESTAMP)''')
+
+        conn.executemany('INSERT INTO price_history (product_link_id, price, scraped_at) VALUES (?, ?, ?)',
+                         [(1, 20.0, '2024-01-02 10:00:00'), (1, 18.0, '2024-01-03 10:00:00'),
+                          (1, 25.0, '2024-01-01 10:00:00')])
+
+        assert get_schema_version(conn) == 0
+        assert apply_migrations(conn) == list(range(1, LATEST_VERSION + 1))
+
+        # Derniers prix repris de l'historique existant
+        assert conn.execute('SELECT price FROM link_latest_price WHERE product_link_id = 1').fetchone()[0] == 18.0
+        # Agrégats journaliers repris de l'historique existant
+        assert conn.execute('SELECT COUNT(*) FROM price_rollup_daily').fetchone()[0] == 3
+
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(link_schedule)')}
+        assert {'adaptive_interval', 'unchanged_runs'} <= columns
+        conn.close()
+
+    def test_latest_price_uses_covering_index(self, app):
+        """Test que la recherche des prix d'un lien passe par l'index de l'historique"""
+        with app.app_context():
+            conn = get_db_connection()
+            plan = ' '.join(row[3] for row in conn.execute('''
+                EXPLAIN QUERY PLAN
+                SELECT ph.price, ph.scraped_at
+                FROM price_history ph
+                         JOIN product_links pl ON ph.product_link_id = pl.id
+                WHERE pl.product_id = ?
+                  AND ph.scraped_at >= datetime('now', '-30 days')
+            ''', (1,)))
+            conn.close()
+
+        assert 'COVERING INDEX idx_price_history_link_scraped' in plan
+        assert 'idx_product_links_product' in plan
+
+
+class TestPriceWriter:
+    """Tests de l'écriture groupée des relevés de prix"""
+
+    @pytest.fixture
+    def writer_factory(self, app):
+        writers = []
+
+        def _factory(**kwargs):
+            with app.app_context():
+                writer = PriceWriter(get_connection_manager().pool(app.config), **kwargs)
+            writers.append(writer)
+            return writer
+
+        yield _factory
+        for writer in writers:
+            writer.close(timeout=5)
+
+    def test_rows_written_in_batches(self, app, writer_factory):
+        """Test écriture par lots de taille fixe et identifiants consécutifs"""
+        with app.app_context():
+            product_id = create_product("Produit Lots")
+            link_id = add_product_link(product_id, "Boutique Lots", "https://lots.fr/p")
+
+        writer = writer_factory(batch_size=3, flush_interval=60)
+        futures = [writer.submit(link_id, 10.0 + i) for i in range(7)]
+        assert writer.flush(timeout=5)
+
+        ids = [future.result() for future in futures]
+        assert ids == list(range(ids[0], ids[0] + 7))
+        assert writer.stats()['batches'] == 3
+
+        with app.app_context():
+            assert get_latest_prices(product_id)['best_price']['price'] == 16.0
+
+    def test_partial_batch_written_after_interval(self, writer_factory, app):
+        """Test qu'un lot incomplet est écrit après le délai, sans flush explicite"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Délai"), "Boutique Délai", "https://delai.fr/p")
+
+        writer = writer_factory(batch_size=100, flush_interval=0.05)
+        assert writer.submit(link_id, 12.0).result(timeout=5) > 0
+
+    def test_close_writes_pending_rows(self, app, writer_factory):
+        """Test qu'à l'arrêt les relevés en attente sont écrits"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Arrêt"), "Boutique Arrêt", "https://arret.fr/p")
+
+        writer = writer_factory(batch_size=100, flush_interval=60)
+        futures = [writer.submit(link_id, 5.0) for _ in range(4)]
+        assert writer.close(timeout=5)
+        assert all(future.done() and not future.exception() for future in futures)
+
+    def test_invalid_row_does_not_drop_batch(self, app, writer_factory):
+        """Test qu'un relevé invalide est isolé sans perdre le reste du lot"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Invalide"), "Boutique Invalide", "https://invalide.fr/p")
+
+        writer = writer_factory(batch_size=10, flush_interval=60)
+        good, bad, other = writer.submit(link_id, 1.0), writer.submit(None, 2.0), writer.submit(link_id, 3.0)
+        writer.flush(timeout=5)
+
+        assert good.result() and other.result()
+        assert isinstance(bad.exception(), sqlite3.IntegrityError)
+        assert writer.stats()['failed'] == 1
+
+    def test_writer_failure_releases_waiters(self, app, writer_factory, monkeypatch):
+        """Test qu'un thread d'écriture arrêté sur erreur met ses relevés en échec sans bloquer flush()"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Panne"), "Boutique Panne", "https://panne.fr/p")
+
+        writer = writer_factory(batch_size=10, flush_interval=60)
+
+        def broken_write(conn, batch):
+            raise RuntimeError('panne')
+
+        monkeypatch.setattr(writer, '_write', broken_write)
+        futures = [writer.submit(link_id, 1.0), writer.submit(link_id, 2.0)]
+        assert writer.flush(timeout=5)
+        assert all(isinstance(future.exception(timeout=5), RuntimeError) for future in futures)
+
+        # Le thread suivant repart normalement
+        monkeypatch.undo()
+        future = writer.submit(link_id, 3.0)
+        assert writer.flush(timeout=5)
+        assert future.result() > 0
+
+    def test_writer_failure_on_acquire(self, app):
+        """Test qu'une connexion impossible à obtenir met les relevés en échec"""
+        class BrokenPool:
+            def acquire(self):
+                raise sqlite3.OperationalError('unable to open database file')
+
+        writer = PriceWriter(BrokenPool(), flush_interval=60)
+        future = writer.submit(1, 1.0)
+        assert isinstance(future.exception(timeout=5), sqlite3.OperationalError)
+        assert writer.close(timeout=5)
+
+    def test_scrape_links_writes_through_writer(self, app, monkeypatch):
+        """Test que scrape_links confie les prix au writer et les rend lisibles au retour"""
+        import database.models as models
+
+        class FakeEngine:
+            def run(self, links, on_result=None, cancel=None):
+                return [on_result(link, {'price': 19.9, 'currency': 'EUR', 'is_available': True,
+                                         'error_message': None, 'source': 'json-ld',
+                                         'strategy': {'fetch_mode': 'requests', 'selector': None,
+                                                      'element_path': None},
+                                         'http_cache': {'etag': '"v1"', 'content_hash': 'abc'}})
+                        for link in links]
+
+        with app.app_context():
+            product_id = create_product("Produit Writer")
+            link_id = add_product_link(product_id, "Boutique Writer", "https://writer.fr/p")
+            link = {'id': link_id, 'product_id': product_id, 'shop_name': "Boutique Writer",
+                    'url': "https://writer.fr/p", 'css_selector': None}
+
+            monkeypatch.setattr(models, 'create_scrape_engine', FakeEngine)
+            # Aucune écriture isolée dans le thread appelant : tout passe par le writer
+            monkeypatch.setattr(models, 'get_db_connection', lambda: pytest.fail('Écriture hors du writer'))
+            monkeypatch.setattr(models, 'get_link_strategies', lambda ids: {})
+            monkeypatch.setattr(models, 'get_http_cache_entries', lambda urls: {})
+            results = models.scrape_links([link])
+            monkeypatch.undo()
+
+            assert results[0]['price_id'] is not None
+            assert get_latest_prices(product_id)['best_price']['price'] == 19.9
+            assert get_http_cache_entries(["https://writer.fr/p"])["https://writer.fr/p"]['etag'] == '"v1"'
+            assert get_link_strategies([link_id])[link_id]['fetch_mode'] == 'requests'
+            assert any(row['shop_name'] == "Boutique Writer" for row in get_extraction_stats())
+
+
+class TestLatestPrices:
+    """Tests de la table des derniers prix tenue à jour par triggers"""
+
+    def test_latest_price_follows_history(self, app):
+        """Test que le dernier relevé (par date) devient le prix courant du lien"""
+        with app.app_context():
+            product_id = create_product("Produit Dernier Prix")
+            link_id = add_product_link(product_id, "Boutique Dernier Prix", "https://dernier.fr/p")
+            empty_id = add_product_link(product_id, "Boutique Sans Prix", "https://vide.fr/p")
+
+            record_price(link_id, 30.0)
+            record_price(link_id, 27.5)
+
+            conn = get_db_connection()
+            # Relevé plus ancien importé après coup : ne remplace pas le prix courant
+            conn.execute('''INSERT INTO price_history (product_link_id, price, scraped_at)
+                            VALUES (?, 12.0, '2000-01-01 00:00:00')''', (link_id,))
+            conn.commit()
+            conn.close()
+
+            prices = {price['link_id']: price for price in get_latest_prices(product_id)['prices']}
+            assert prices[link_id]['price'] == 27.5
+            assert prices[empty_id]['price'] is None
+            assert prices[empty_id]['is_available'] is False
+            assert get_latest_prices(product_id)['best_price']['link_id'] == link_id
+
+    def test_delete_latest_restores_previous(self, app):
+        """Test suppression du dernier relevé : le précédent redevient le prix courant"""
+        with app.app_context():
+            product_id = create_product("Produit Suppression Relevé")
+            link_id = add_product_link(product_id, "Boutique Suppression", "https://suppr.fr/p")
+            record_price(link_id, 40.0)
+            latest_id = record_price(link_id, 35.0)
+
+            conn = get_db_connection()
+            conn.execute('DELETE FROM price_history WHERE id = ?', (latest_id,))
+            conn.commit()
+            conn.close()
+
+            assert get_latest_prices(product_id)['prices'][0]['price'] == 40.0
+
+    def test_catalogue_latest_prices(self, app):
+        """Test lecture des derniers prix de tout le catalogue"""
+        with app.app_context():
+            first = create_product("Produit Catalogue A")
+            second = create_product("Produit Catalogue B")
+            record_price(add_product_link(first, "Boutique A1", "https://a1.fr/p"), 10.0)
+            record_price(add_product_link(first, "Boutique A2", "https://a2.fr/p"), 8.0)
+            add_product_link(second, "Boutique B1", "https://b1.fr/p")
+
+            catalogue = get_catalogue_latest_prices()
+            assert catalogue[first]['best_price']['price'] == 8.0
+            assert len(catalogue[first]['prices']) == 2
+            assert catalogue[second]['best_price'] is None
+
+
+class TestPriceRollups:
+    """Tests des agrégats horaires et journaliers de l'historique"""
+
+    @staticmethod
+    def _insert(link_id, rows):
+        conn = get_db_connection()
+        conn.executemany('INSERT INTO price_history (product_link_id, price, scraped_at) VALUES (?, ?, ?)',
+                         [(link_id, price, scraped_at) for price, scraped_at in rows])
+        conn.commit()
+        conn.close()
+
+    def test_rollups_maintained_on_insert(self, app):
+        """Test agrégats incrémentaux : min/max/somme, dernier prix par date, échecs ignorés"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Agrégats"), "Boutique Agrégats", "https://agregats.fr/p")
+            self._insert(link_id, [(20.0, '2024-03-01 10:05:00'), (18.0, '2024-03-01 10:40:00'),
+                                   (None, '2024-03-01 10:50:00'), (25.0, '2024-03-01 10:10:00'),
+                                   (30.0, '2024-03-01 14:00:00')])
+
+            conn = get_db_connection()
+            hourly = conn.execute('''SELECT min_price, max_price, sum_price, samples, last_price
+                                     FROM price_rollup_hourly
+                                     WHERE product_link_id = ? AND bucket = '2024-03-01 10:00:00' ''',
+                                  (link_id,)).fetchone()
+            daily = conn.execute('''SELECT min_price, max_price, samples, first_at, last_price
+                                    FROM price_rollup_daily WHERE product_link_id = ?''', (link_id,)).fetchall()
+            conn.close()
+
+        # Relevé de 10:10 inséré après celui de 10:40 : ne devient pas le dernier prix
+        assert tuple(hourly) == (18.0, 25.0, 63.0, 3, 18.0)
+        assert [tuple(row) for row in daily] == [(18.0, 30.0, 4, '2024-03-01 10:05:00', 30.0)]
+
+    def test_rollups_kept_on_purge_and_dropped_with_link(self, app):
+        """Test que la purge de relevés garde les agrégats, supprimés avec le lien"""
+        from database.models import delete_product_link
+
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Purge"), "Boutique Purge", "https://purge.fr/p")
+            self._insert(link_id, [(10.0, '2024-03-02 08:00:00')])
+
+            conn = get_db_connection()
+            conn.execute('DELETE FROM price_history WHERE product_link_id = ?', (link_id,))
+            conn.commit()
+            kept = conn.execute('SELECT COUNT(*) FROM price_rollup_daily WHERE product_link_id = ?',
+                                (link_id,)).fetchone()[0]
+            conn.close()
+
+            delete_product_link(link_id)
+            conn = get_db_connection()
+            dropped = conn.execute('SELECT COUNT(*) FROM price_rollup_hourly WHERE product_link_id = ?',
+                                   (link_id,)).fetchone()[0]
+            conn.close()
+
+        assert kept == 1
+        assert dropped == 0
+
+    def test_resolution_fits_points_budget(self, app):
+        """Test choix de la résolution selon la période demandée"""
+        with app.app_context():
+            assert get_history_resolution(7, max_points=400)[0] == 'hourly'
+            assert get_history_resolution(30, max_points=400)[0] == 'daily'
+            assert get_history_resolution(365, max_points=400)[0] == 'daily'
+
+    def test_chart_and_stats_read_rollups(self, app):
+        """Test graphique (un point par heure) et statistiques calculés sur les agrégats"""
+        with app.app_context():
+            product_id = create_product("Produit Graphique Agrégé")
+            link_id = add_product_link(product_id, "Boutique Graphique", "https://graphique.fr/p")
+
+            conn = get_db_connection()
+            conn.executemany('''INSERT INTO price_history (product_link_id, price, scraped_at)
+                                VALUES (?, ?, datetime(strftime('%Y-%m-%d %H:00:00', 'now', '-2 hours'), ?))''',
+                             [(link_id, price, f'+{minute} minutes') for minute, price in
+                              ((5, 12.0), (15, 10.0), (25, 14.0), (35, 11.0))])
+            conn.commit()
+            conn.close()
+
+            chart = get_price_history_for_chart(product_id, 7)
+            stats = get_price_statistics(product_id, 7)
+
+        assert chart['resolution'] == 'hourly'
+        assert [point['y'] for point in chart['datasets'][0]['data']] == [11.0]
+        assert (stats['min_price'], stats['max_price'], stats['avg_price']) == (10.0, 14.0, 11.75)
+        assert stats['total_scrapes'] == 4
+        assert stats['by_shop'][0]['records_count'] == 4
+
+
+class TestChartDecimation:
+    """Tests de la décimation des séries des graphiques"""
+
+    @staticmethod
+    def _series(count, spike_at):
+        return [(x, 500.0 if x == spike_at else 100.0 + x % 5) for x in range(count)]
+
+    def test_lttb_keeps_bounds_and_spike(self):
+        """Test LTTB : max_points points, premier et dernier gardés, pic isolé conservé"""
+        from utils.decimation import lttb
+
+        points = self._series(1000, spike_at=613)
+        kept = lttb(points, 100)
+
+        assert len(kept) == 100
+        assert kept[0] == points[0] and kept[-1] == points[-1]
+        assert (613, 500.0) in kept
+        assert [x for x, _ in kept] == sorted(x for x, _ in kept)
+        assert lttb(points[:50], 100) == points[:50]
+
+    def test_min_max_keeps_extremes(self):
+        """Test minimum/maximum : extrêmes de chaque intervalle, séries plates réduites"""
+        from utils.decimation import decimate
+
+        points = self._series(1000, spike_at=401)
+        kept = decimate(points, 60, method='minmax')
+
+        assert len(kept) <= 60
+        assert (401, 500.0) in kept
+        assert min(y for _, y in kept) == 100.0
+        assert len(decimate([(x, 10.0) for x in range(1000)], 60, method='minmax')) == 31
+        with pytest.raises(ValueError):
+            decimate(points, 60, method='moyenne')
+
+    def test_chart_decimated_and_filtered_by_shop(self, app, monkeypatch):
+        """Test graphique : agrégats horaires sur 30 jours décimés, boutique filtrée en SQL"""
+        monkeypatch.setitem(app.config, 'CHART_SOURCE_MAX_POINTS', 1000)
+        with app.app_context():
+            product_id = create_product("Produit Graphique Décimé")
+            first = add_product_link(product_id, "Boutique D1", "https://d1.fr/p")
+            second = add_product_link(product_id, "Boutique D2", "https://d2.fr/p")
+
+            conn = get_db_connection()
+            conn.executemany('''INSERT INTO price_history (product_link_id, price, scraped_at)
+                                VALUES (?, ?, datetime('now', ?))''',
+                             [(link_id, 50.0 + hour % 3, f'-{hour} hours')
+                              for link_id in (first, second) for hour in range(1, 700)])
+            conn.commit()
+            conn.close()
+
+            chart = get_price_history_for_chart(product_id, 30, max_points=120)
+            shop_chart = get_price_history_for_chart(product_id, 30, shop="Boutique D2", max_points=120)
+            full = get_price_history_for_chart(product_id, 30, max_points=1000)
+
+        assert chart['resolution'] == 'hourly'
+        assert chart['decimation'] == 'lttb'
+        assert [len(dataset['data']) for dataset in chart['datasets']] == [120, 120]
+        assert [dataset['label'] for dataset in shop_chart['datasets']] == ["Boutique D2"]
+        assert shop_chart['datasets'][0] == chart['datasets'][1]
+        assert full['decimation'] is None
+        assert len(full['datasets'][0]['data']) > 600
+
+
+class TestProductStatistics:
+    """Tests du calcul groupé des statistiques d'un produit"""
+
+    def test_one_query_for_prices_stats_and_scraping(self, app):
+        """Test derniers prix, statistiques par boutique et compteurs de scraping d'un seul calcul"""
+        with app.app_context():
+            product_id = create_product("Produit Statistiques")
+            cheap = add_product_link(product_id, "Boutique A", "https://a.fr/p")
+            dear = add_product_link(product_id, "Boutique B", "https://b.fr/p")
+            add_product_link(product_id, "Boutique C", "https://c.fr/p")  # Jamais scrapée
+
+            TestPriceRollups._insert(cheap, [(10.0, '2024-01-01 10:00:00'), (12.0, '2024-01-02 10:00:00')])
+            TestPriceRollups._insert(dear, [(30.0, '2024-01-01 10:00:00')])
+            record_price(dear, 20.0)
+            record_price(cheap, None, is_available=False, error_message='Prix non trouvé')
+
+            conn = get_db_connection()
+            statements = []
+            conn.set_trace_callback(statements.append)
+            conn.close()
+
+            statistics = get_product_statistics(product_id, days=7)
+
+            conn = get_db_connection()
+            conn.set_trace_callback(None)
+            conn.close()
+
+            assert len(statements) == 1
+            assert [price['shop_name'] for price in statistics['prices']] == ['Boutique A', 'Boutique B', 'Boutique C']
+            assert statistics['best_price']['price'] == 20.0
+
+            scraping = statistics['scraping']
+            assert (scraping['total_scrapes'], scraping['successful_scrapes'], scraping['errors']) == (5, 4, 1)
+
+            # Période de 7 jours : seul le relevé du jour
+            stats = statistics['price_stats']
+            assert (stats['min_price'], stats['max_price'], stats['total_scrapes'], stats['shops_count']) == (20.0, 20.0, 1, 1)
+            assert stats['best_current']['shop'] == 'Boutique B'
+            # Par boutique : tout l'historique, trié par prix moyen
+            assert [(shop['shop_name'], shop['records_count'], shop['avg_price']) for shop in stats['by_shop']] == [
+                ('Boutique A', 2, 11.0), ('Boutique B', 2, 25.0)
+            ]
+            assert get_price_statistics(product_id, days=7) == stats
+            assert get_scraping_stats(product_id) == scraping
+
+    def test_product_without_history(self, app):
+        """Test produit sans relevé : pas de statistiques de prix, compteurs à zéro"""
+        with app.app_context():
+            product_id = create_product("Produit Sans Statistiques")
+            add_product_link(product_id, "Boutique Vide", "https://vide.fr/p")
+
+            statistics = get_product_statistics(product_id)
+            assert statistics['price_stats'] is None
+            assert statistics['scraping']['total_scrapes'] == 0
+            assert statistics['best_price'] is None
+
+
+class TestGlobalStatsCounters:
+    """Tests des compteurs du tableau de bord tenus à jour par triggers"""
+
+    def test_counters_follow_writes(self, app):
+        """Test produits, liens, boutiques et relevés comptés à chaque écriture"""
+        with app.app_context():
+            before = get_global_stats()
+
+            product_id = create_product("Produit Compteurs")
+            found = add_product_link(product_id, "Boutique Compteurs A", "https://compteurs-a.fr/p")
+            missing = add_product_link(product_id, "Boutique Compteurs B", "https://compteurs-b.fr/p")
+            record_price(found, 10.0)
+            record_price(found, 11.0, is_available=False)
+            record_price(missing, None, is_available=False, error_message='Prix non trouvé')
+
+            stats = get_global_stats()
+            delta = {name: stats[name] - before[name] for name in before if name != 'success_rate'}
+            assert delta == {'products_count': 1, 'links_count': 2, 'total_scrapes': 3, 'successful_scrapes': 1,
+                             'failed_scrapes': 2, 'unique_shops': 2, 'shops_without_success': 1}
+
+            # Lien sans relevé réussi supprimé : sa boutique disparaît
+            delete_product_link(missing)
+            stats = get_global_stats()
+            assert stats['unique_shops'] - before['unique_shops'] == 1
+            assert stats['shops_without_success'] == before['shops_without_success']
+
+            assert rebuild_stats_counters() == {}
+
+    def test_rebuild_after_manual_edit(self, app):
+        """Test recalcul des compteurs désynchronisés"""
+        with app.app_context():
+            expected = get_global_stats()
+
+            conn = get_db_connection()
+            conn.execute('UPDATE stats_counters SET total_scrapes = total_scrapes + 100, unique_shops = 0')
+            conn.commit()
+            conn.close()
+
+            drift = rebuild_stats_counters()
+            assert drift == {
+                'total_scrapes': (expected['total_scrapes'] + 100, expected['total_scrapes']),
+                'unique_shops': (0, expected['unique_shops']),
+            }
+            assert get_global_stats() == expected
+
+
+class TestQueryCache:
+    """Tests du cache des lectures par produit"""
+
+    @staticmethod
+    def _traced(app, read):
+        """Requêtes SQL exécutées par read() dans une requête"""
+        with app.test_request_context():
+            conn = get_db_connection()
+            statements = []
+            conn.set_trace_callback(statements.append)
+            result = read()
+            conn.set_trace_callback(None)
+            conn.close()
+        return result, statements
+
+    def test_reads_cached_until_product_write(self, app):
+        """Test lecture servie par le cache, invalidée par un relevé du seul produit concerné"""
+        with app.app_context():
+            product_id = create_product("Produit Cache")
+            link_id = add_product_link(product_id, "Boutique Cache", "https://cache.fr/p")
+            other_id = create_product("Produit Cache Voisin")
+            other_link = add_product_link(other_id, "Boutique Cache", "https://cache.fr/voisin")
+            record_price(link_id, 10.0)
+            record_price(other_link, 50.0)
+
+        first, statements = self._traced(app, lambda: get_latest_prices(product_id))
+        assert statements
+        again, statements = self._traced(app, lambda: get_latest_prices(product_id=product_id))
+        assert statements == [] and again is first
+        self._traced(app, lambda: get_latest_prices(other_id))
+
+        with app.app_context():
+            record_price(link_id, 8.0)
+            stats = get_query_cache().stats()
+
+        fresh, statements = self._traced(app, lambda: get_latest_prices(product_id))
+        assert statements and fresh['best_price']['price'] == 8.0
+        # Produit voisin non invalidé
+        _, statements = self._traced(app, lambda: get_latest_prices(other_id))
+        assert statements == []
+        assert stats['hits'] >= 1 and stats['invalidations'] >= 1
+
+    def test_writer_invalidates_before_result(self, app):
+        """Test relevé du thread d'écriture visible dès que son résultat est disponible"""
+        with app.app_context():
+            product_id = create_product("Produit Cache Lots")
+            link_id = add_product_link(product_id, "Boutique Cache Lots", "https://cache-lots.fr/p")
+            record_price(link_id, 20.0)
+            assert get_latest_prices(product_id)['best_price']['price'] == 20.0
+
+            writer = PriceWriter(get_connection_manager().pool(app.config), flush_interval=0.01,
+                                 cache=get_query_cache())
+            try:
+                writer.submit(link_id, 15.0).result(timeout=5)
+            finally:
+                writer.close(timeout=5)
+            assert get_latest_prices(product_id)['best_price']['price'] == 15.0
+
+    def test_lru_eviction_and_expiry(self):
+        """Test éviction des entrées les moins récemment lues et expiration"""
+        now = [0.0]
+        cache = QueryCache(max_entries=2, ttl=10, clock=lambda: now[0])
+
+        cache.get_or_compute('a', 1, lambda: 'A')
+        cache.get_or_compute('b', 2, lambda: 'B')
+        assert cache.get_or_compute('a', 1, lambda: 'A2') == 'A'   # 'a' récemment lue
+        cache.get_or_compute('c', 3, lambda: 'C')                  # évince 'b'
+        assert cache.get_or_compute('b', 2, lambda: 'B2') == 'B2'
+
+        now[0] = 11
+        assert cache.get_or_compute('b', 2, lambda: 'B3') == 'B3'
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions'], stats['expired']) == (1, 5, 2, 1)
+
+    def test_write_during_read_not_cached(self):
+        """Test résultat calculé pendant une écriture non conservé"""
+        cache = QueryCache()
+
+        def read_during_write():
+            cache.invalidate([1])
+            return 'périmé'
+
+        assert cache.get_or_compute('a', 1, read_during_write) == 'périmé'
+        assert cache.get_or_compute('a', 1, lambda: 'frais') == 'frais'
+
+
+class TestHistoryMaintenance:
+    """Tests du compactage et de la rétention de l'historique"""
+
+    @staticmethod
+    def _history(link_id):
+        conn = get_db_connection()
+        rows = conn.execute('''SELECT price, scraped_at, first_seen_at, observations FROM price_history
+                               WHERE product_link_id = ? ORDER BY scraped_at, id''', (link_id,)).fetchall()
+        conn.close()
+        return [tuple(row) for row in rows]
+
+    @staticmethod
+    def _compact_all(**kwargs):
+        """Passe complète sur tous les liens, par lots"""
+        compacted, after = 0, 0
+        while after is not None:
+            result = compact_price_links(after, **kwargs)
+            compacted, after = compacted + result['compacted_rows'], result['last_link_id']
+        return compacted
+
+    def test_identical_runs_merged_into_last_row(self, app):
+        """Test fusion des suites identiques : dernier relevé conservé avec sa plage d'observation"""
+        with app.app_context():
+            product_id = create_product("Produit Compactage")
+            link_id = add_product_link(product_id, "Boutique Compactage", "https://compactage.fr/p")
+            TestPriceRollups._insert(link_id, [
+                (10.0, '2024-04-01 08:00:00'), (10.0, '2024-04-02 08:00:00'), (None, '2024-04-03 08:00:00'),
+                (10.0, '2024-04-04 08:00:00'), (12.0, '2024-04-05 08:00:00'), (12.0, '2024-04-06 08:00:00'),
+                (10.0, '2024-04-07 08:00:00'),
+            ])
+
+            self._compact_all(batch_links=2)
+
+            # Un échec interrompt une suite, comme un changement de prix
+            assert self._history(link_id) == [
+                (10.0, '2024-04-02 08:00:00', '2024-04-01 08:00:00', 2),
+                (None, '2024-04-03 08:00:00', None, 1),
+                (10.0, '2024-04-04 08:00:00', None, 1),
+                (12.0, '2024-04-06 08:00:00', '2024-04-05 08:00:00', 2),
+                (10.0, '2024-04-07 08:00:00', None, 1),
+            ]
+            assert get_latest_prices(product_id)['prices'][0]['scraped_at'] == '2024-04-07 08:00:00'
+
+    def test_outage_not_covered_after_error_purge(self, app):
+        """Test 10 € -> échec -> échec -> 10 € : deux plages distinctes, même après purge des échecs"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Panne Site"), "Boutique Panne Site", "https://pannesite.fr/p")
+            TestPriceRollups._insert(link_id, [
+                (10.0, '2000-03-01 08:00:00'), (10.0, '2000-03-02 08:00:00'), (None, '2000-03-03 08:00:00'),
+                (None, '2000-03-04 08:00:00'), (10.0, '2000-03-05 08:00:00'), (10.0, '2000-03-06 08:00:00'),
+            ])
+
+            self._compact_all()
+            # Reprise incrémentale après un échec : pas de fusion par-dessus non plus
+            TestPriceRollups._insert(link_id, [(10.0, '2000-03-07 08:00:00')])
+            self._compact_all()
+            expire_error_prices(30)
+
+            assert self._history(link_id) == [
+                (10.0, '2000-03-02 08:00:00', '2000-03-01 08:00:00', 2),
+                (10.0, '2000-03-07 08:00:00', '2000-03-05 08:00:00', 3),
+            ]
+
+    def test_compaction_continues_from_last_kept_row(self, app):
+        """Test compactage incrémental : les nouveaux relevés rejoignent la suite déjà compactée"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Reprise"), "Boutique Reprise", "https://reprise.fr/p")
+            TestPriceRollups._insert(link_id, [(5.0, '2024-05-01 08:00:00'), (5.0, '2024-05-02 08:00:00')])
+            self._compact_all()
+
+            TestPriceRollups._insert(link_id, [(5.0, '2024-05-03 08:00:00')])
+            assert self._compact_all(batch_rows=2) == 1
+            assert self._history(link_id) == [(5.0, '2024-05-03 08:00:00', '2024-05-01 08:00:00', 3)]
+
+            # Plus rien de nouveau : le lien n'est pas relu
+            assert self._compact_all() == 0
+
+    def test_old_errors_expired(self, app):
+        """Test purge des relevés en échec au-delà de la rétention uniquement"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Rétention"), "Boutique Rétention", "https://retention.fr/p")
+            TestPriceRollups._insert(link_id, [(None, '2000-01-01 00:00:00'), (7.0, '2000-01-02 00:00:00')])
+            record_price(link_id, None, is_available=False, error_message='Prix non trouvé')
+
+            while expire_error_prices(30, batch_size=1):
+                pass
+
+            assert [row[0] for row in self._history(link_id)] == [7.0, None]
+            assert get_maintenance_report()['history']['error_rows'] >= 1
+
+
+class TestChangeOnlyStorage:
+    """Tests du stockage des changements seulement (PRICE_STORAGE_MODE = 'changes')"""
+
+    @pytest.fixture
+    def changes_only(self, app, monkeypatch):
+        monkeypatch.setitem(app.config, 'PRICE_STORAGE_MODE', 'changes')
+
+    @staticmethod
+    def _samples(link_id):
+        conn = get_db_connection()
+        samples = conn.execute('SELECT SUM(samples) FROM price_rollup_daily WHERE product_link_id = ?',
+                               (link_id,)).fetchone()[0]
+        conn.close()
+        return samples
+
+    def test_identical_price_extends_last_row(self, app, changes_only):
+        """Test qu'un relevé identique prolonge la ligne précédente, un changement en crée une"""
+        with app.app_context():
+            product_id = create_product("Produit Changements")
+            link_id = add_product_link(product_id, "Boutique Changements", "https://changements.fr/p")
+
+            first_id = record_price(link_id, 10.0)
+            assert record_price(link_id, 10.0) == first_id
+            assert record_price(link_id, 10.0) == first_id
+            record_price(link_id, None, is_available=False, error_message='Prix non trouvé')
+            record_price(link_id, 10.0)
+            record_price(link_id, 12.0)
+
+            history = TestHistoryMaintenance._history(link_id)
+            assert [(row[0], row[3]) for row in history] == [(10.0, 3), (None, 1), (10.0, 1), (12.0, 1)]
+            assert history[0][2] is not None
+
+            # Agrégats et statistiques comptent chaque observation
+            assert self._samples(link_id) == 5
+            assert get_scraping_stats(product_id)['total_scrapes'] == 6
+            assert get_latest_prices(product_id)['prices'][0]['price'] == 12.0
+
+    def test_writer_extends_within_batch(self, app):
+        """Test prolongation par le writer, y compris pour des relevés d'un même lot"""
+        with app.app_context():
+            link_id = add_product_link(create_product("Produit Lot Inchangé"), "Boutique Lot", "https://lot.fr/p")
+            writer = PriceWriter(get_connection_manager().pool(app.config), batch_size=10,
+                                 flush_interval=60, changes_only=True)
+
+        try:
+            futures = [writer.submit(link_id, price) for price in (8.0, 8.0, 8.0, 8.0, 9.0)]
+            assert writer.flush(timeout=5)
+            ids = [future.result() for future in futures]
+        finally:
+            writer.close(timeout=5)
+
+        assert len(set(ids[:4])) == 1 and ids[4] != ids[0]
+        assert writer.stats()['extended'] == 3
+
+        with app.app_context():
+            assert [(row[0], row[3]) for row in TestHistoryMaintenance._history(link_id)] == [(8.0, 4), (9.0, 1)]
+            assert self._samples(link_id) == 5
+
+    def test_cache_hit_extends_in_every_mode(self, app):
+        """Test qu'un prix repris du cache HTTP prolonge le dernier relevé, même en mode 'every'"""
+        with app.app_context():
+            assert app.config.get('PRICE_STORAGE_MODE', 'every') == 'every'
+            link_id = add_product_link(create_product("Produit Cache Inchangé"), "Boutique Cache", "https://cache.fr/p")
+            writer = PriceWriter(get_connection_manager().pool(app.config), batch_size=10, flush_interval=60)
+
+            first_id = record_price(link_id, 10.0)
+            assert record_price(link_id, 10.0, unchanged=True) == first_id
+            record_price(link_id, 10.0)
+
+        try:
+            futures = [writer.submit(link_id, 10.0, unchanged=True), writer.submit(link_id, 11.0, unchanged=True)]
+            assert writer.flush(timeout=5)
+            [future.result() for future in futures]
+        finally:
+            writer.close(timeout=5)
+
+        with app.app_context():
+            assert [(row[0], row[3]) for row in TestHistoryMaintenance._history(link_id)] == \
+                [(10.0, 2), (10.0, 2), (11.0, 1)]
+
+
+class TestCatalogue:
+    """Tests de la liste paginée du catalogue"""
+
+    def test_keyset_pagination_by_name(self, app):
+        """Test que les pages successives couvrent le catalogue sans doublon"""
+        with app.app_context():
+            for name in ("Zèbre Catalogue", "Ananas Catalogue", "Mangue Catalogue"):
+                create_product(name)
+
+            ids, names, after = [], [], None
+            while True:
+                page = get_catalogue(sort='name', limit=2, after=after)
+                ids += [product['id'] for product in page['products']]
+                names += [product['name'].lower() for product in page['products']]
+                after = page['next_cursor']
+                if after is None:
+                    break
+
+            assert len(ids) == len(set(ids)) == page['total']
+            assert names == sorted(names)
+
+    def test_latest_change_ignores_same_price_and_failures(self, app):
+        """Test date du dernier changement : inchangée pour un prix identique ou un échec"""
+        with app.app_context():
+            product_id = create_product("Produit Changement")
+            link_id = add_product_link(product_id, "Boutique Changement", "https://changement.fr/p")
+
+            conn = get_db_connection()
+            for price, scraped_at in ((20.0, '2024-01-01 10:00:00'), (18.0, '2024-01-02 10:00:00'),
+                                      (18.0, '2024-01-03 10:00:00'), (None, '2024-01-04 10:00:00'),
+                                      (18.0, '2024-01-05 10:00:00')):
+                conn.execute('''INSERT INTO price_history (product_link_id, price, scraped_at)
+                                VALUES (?, ?, ?)''', (link_id, price, scraped_at))
+            conn.commit()
+            latest = conn.execute('''SELECT known_price, changed_at FROM link_latest_price
+                                     WHERE product_link_id = ?''', (link_id,)).fetchone()
+            conn.close()
+
+            assert latest['known_price'] == 18.0
+            assert latest['changed_at'] == '2024-01-02 10:00:00'
+
@@ -38,6 +38,19 @@ class TestMainRoutes:
         response = client.get('/products')
         assert response.status_code == 200
 
+    def test_products_page_sorted_by_best_price(self, client, app):
+        """Test liste triée par meilleur prix avec le prix affiché"""
+        from database.models import add_product_link, record_price
+
+        with app.app_context():
+            product_id = create_product("Produit Liste Prix")
+            record_price(add_product_link(product_id, "Boutique Liste", "https://liste.fr/p"), 0.5)
+
+        response = client.get('/products?sort=best_price')
+        assert response.status_code == 200
+        assert 'Produit Liste Prix' in response.get_data(as_text=True)
+        assert '0.5 EUR' in response.get_data(as_text=True)
+
     def test_add_product_get(self, client):
         """Test affichage formulaire ajout"""
         response = client.get('/add_product')
@@ -104,6 +117,35 @@ class TestAPI:
         assert 'products' in data
         assert isinstance(data['products'], list)
 
+    def test_api_catalogue_keyset_pages(self, client, app):
+        """Test parcours complet du catalogue par curseur, trié par meilleur prix"""
+        from database.models import add_product_link, record_price
+
+        with app.app_context():
+            for price in (30.0, 10.0, 20.0):
+                product_id = create_product(f"Produit Catalogue {price:.0f}")
+                record_price(add_product_link(product_id, "Boutique Catalogue", f"https://cat.fr/{price}"), price)
+
+        seen = []
+        url = '/api/catalogue?sort=best_price&limit=2'
+        while url:
+            data = json.loads(client.get(url).data)
+            assert data['status'] == 'success'
+            assert data['count'] <= 2
+            seen.extend(data['products'])
+            url = data['next_url']
+
+        assert len(seen) == data['total']
+        assert len({product['id'] for product in seen}) == len(seen)
+        prices = [product['best_price']['price'] for product in seen if product['best_price']]
+        assert prices == sorted(prices)
+        assert {10.0, 20.0, 30.0} <= set(prices)
+
+    def test_api_catalogue_invalid_cursor(self, client):
+        """Test rejet d'un curseur ou d'un tri invalide"""
+        assert client.get('/api/catalogue?after=pas-un-curseur').status_code == 400
+        assert client.get('/api/catalogue?sort=inconnu').status_code == 400
+
     def test_api_product_detail_exists(self, client, app, sample_product):
         """Test API détail produit"""
         with app.app_context():
@@ -126,4 +168,500 @@ class TestAPI:
         assert response.status_code == 404
 
         data = json.loads(response.data)
-        assert data['status'] == 'error'
\ No newline at end of file
+        assert data['status'] == 'error'
+
+    def test_api_price_chart_served_from_cache(self, client, app):
+        """Test graphique relu depuis le cache, boutique filtrée en SQL (entrée distincte)"""
+        from database.models import add_product_link, record_price
+
+        with app.app_context():
+            product_id = create_product("Produit Graphique Cache")
+            record_price(add_product_link(product_id, "Boutique G1", "https://g1.fr/p"), 10.0)
+            record_price(add_product_link(product_id, "Boutique G2", "https://g2.fr/p"), 12.0)
+
+        before = json.loads(client.get('/api/cache').data)['stats']
+        filtered = json.loads(client.get(f'/product/{product_id}/history/chart-data?shop=Boutique G1').data)
+        full = json.loads(client.get(f'/product/{product_id}/history/chart-data').data)
+        again = json.loads(client.get(f'/product/{product_id}/history/chart-data?shop=all').data)
+        after = json.loads(client.get('/api/cache').data)['stats']
+
+        assert [dataset['label'] for dataset in filtered['datasets']] == ['Boutique G1']
+        assert len(full['datasets']) == 2
+        assert again == full
+        assert after['hits'] - before['hits'] == 1
+        assert after['misses'] - before['misses'] == 2
+
+    def test_api_price_chart_decimated(self, client, app, monkeypatch):
+        """Test max_points : séries décimées, borné à CHART_MAX_POINTS, méthode inconnue ignorée"""
+        from database.models import add_product_link, get_db_connection
+
+        monkeypatch.setitem(app.config, 'CHART_SOURCE_MAX_POINTS', 1000)
+
+        with app.app_context():
+            product_id = create_product("Produit Graphique Décimé")
+            link_id = add_product_link(product_id, "Boutique Décimée", "https://decimee.fr/p")
+            conn = get_db_connection()
+            conn.executemany("""INSERT INTO price_history (product_link_id, price, scraped_at)
+                                VALUES (?, ?, datetime('now', ?))""",
+                             [(link_id, 100.0 + hour % 7, f'-{hour} hours') for hour in range(1, 600)])
+            conn.commit()
+            conn.close()
+
+        def points(query):
+            data = json.loads(client.get(f'/api/product/{product_id}/price-chart?days=30&{query}').data)['data']
+            return len(data['datasets'][0]['data']), data['decimation']
+
+        assert points('max_points=50') == (50, 'lttb')
+        assert points('max_points=50&decimation=minmax') == (50, 'minmax')
+        assert points('max_points=50&decimation=inconnue') == (50, 'lttb')
+        assert points('max_points=1')[0] == 10
+        assert points('max_points=100000')[0] == app.config['CHART_MAX_POINTS']
+
+
+class TestConditionalRequests:
+    """Tests des ETag et réponses 304 des routes JSON d'un produit"""
+
+    @pytest.fixture
+    def product(self, app):
+        from database.models import add_product_link, record_price
+
+        with app.app_context():
+            product_id = create_product("Produit ETag")
+            link_id = add_product_link(product_id, "Boutique ETag", "https://etag.fr/p")
+            record_price(link_id, 10.0)
+        return product_id, link_id
+
+    def test_not_modified_without_query_work(self, client, product, monkeypatch):
+        """Test 304 sur If-None-Match à jour, sans calcul des données"""
+        product_id, _ = product
+        for url in (f'/api/product/{product_id}/price-chart?days=30', f'/api/product/{product_id}/price-stats',
+                    f'/product/{product_id}/history/chart-data?shop=Boutique ETag', f'/api/product/{product_id}'):
+            response = client.get(url)
+            assert response.status_code == 200
+            etag = response.headers['ETag']
+            assert 'no-cache' in response.headers['Cache-Control']
+
+            monkeypatch.setattr('app.routes.get_price_history_for_chart', None)
+            monkeypatch.setattr('app.routes.get_price_statistics', None)
+            monkeypatch.setattr('app.routes.get_latest_prices', None)
+            response = client.get(url, headers={'If-None-Match': etag})
+            monkeypatch.undo()
+
+            assert response.status_code == 304
+            assert response.data == b''
+            assert response.headers['ETag'] == etag
+
+    def test_etag_follows_product_data_and_parameters(self, client, app, product):
+        """Test ETag modifié par un relevé, un renommage ou d'autres paramètres"""
+        from database.models import record_price, update_product
+
+        product_id, link_id = product
+        url = f'/api/product/{product_id}'
+        etag = client.get(url).headers['ETag']
+        assert client.get(f'/api/product/{product_id}/price-chart?days=7').headers['ETag'] != \
+            client.get(f'/api/product/{product_id}/price-chart?days=30').headers['ETag']
+
+        with app.app_context():
+            record_price(link_id, 9.0)
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert json.loads(response.data)['prices']['best_price']['price'] == 9.0
+
+        # Même seconde que l'écriture précédente : la version ne dépend pas que de updated_at
+        etag = response.headers['ETag']
+        with app.app_context():
+            update_product(product_id, "Produit ETag renommé")
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert json.loads(response.data)['product']['name'] == "Produit ETag renommé"
+
+    def test_write_from_other_process_refreshes_cache(self, client, app, product):
+        """Test relevé écrit hors de l'application (scheduler.py) : cache du produit invalidé par la version"""
+        from database.models import get_db_connection
+
+        product_id, link_id = product
+        assert json.loads(client.get(f'/api/product/{product_id}').data)['prices']['best_price']['price'] == 10.0
+
+        # Écriture directe, sans invalidation par l'application
+        with app.app_context():
+            conn = get_db_connection()
+            conn.execute('INSERT INTO price_history (product_link_id, price, scraped_at) VALUES (?, ?, ?)',
+                         (link_id, 7.0, '2099-01-01 00:00:00'))
+            conn.commit()
+            conn.close()
+
+        assert json.loads(client.get(f'/api/product/{product_id}').data)['prices']['best_price']['price'] == 7.0
+
+
+class TestScrapeJobRoutes:
+    """Tests des routes de scraping en arrière-plan"""
+
+    @pytest.fixture
+    def no_autostart(self, app, monkeypatch):
+        monkeypatch.setitem(app.config, 'SCRAPE_JOBS_AUTOSTART', False)
+
+    def test_ajax_scrape_returns_job(self, client, app, no_autostart):
+        """Test que le scraping AJAX répond immédiatement avec un job"""
+        with app.app_context():
+            product_id = create_product("Produit Route Job")
+
+        response = client.post(f'/product/{product_id}/scrape/ajax')
+        assert response.status_code == 202
+        data = json.loads(response.data)
+        assert data['success'] and data['merged'] is False
+
+        # Seconde demande fusionnée dans le même job
+        again = json.loads(client.post(f'/product/{product_id}/scrape/ajax').data)
+        assert again['job_id'] == data['job_id'] and again['merged'] is True
+
+        status = json.loads(client.get(data['status_url']).data)
+        assert status['job']['status'] == 'queued'
+
+        cancelled = json.loads(client.post(data['cancel_url']).data)
+        assert cancelled['job']['status'] == 'cancelled'
+
+    def test_job_not_found(self, client):
+        """Test job inexistant"""
+        assert client.get('/api/jobs/999999').status_code == 404
+        assert client.post('/api/jobs/999999/cancel').status_code == 404
+
+    def test_worker_runs_job(self, client, app, no_autostart, monkeypatch):
+        """Test exécution d'un job par un worker avec suivi de l'avancement"""
+        from database.models import add_product_link
+        import app.jobs as jobs
+
+        with app.app_context():
+            product_id = create_product("Produit Worker Job")
+            add_product_link(product_id, "Boutique A", "https://a.fr/p")
+            add_product_link(product_id, "Boutique B", "https://b.fr/p")
+
+        def fake_scrape_links(links, on_progress=None, cancel=None):
+            results = []
+            for link in links:
+                result = {'link_id': link['id'], 'product_id': link['product_id'], 'shop_name': link['shop_name'],
+                          'price': 10.0, 'currency': 'EUR', 'success': True, 'error_message': None}
+                on_progress(result)
+                results.append(result)
+            return results
+
+        monkeypatch.setattr(jobs, 'scrape_links', fake_scrape_links)
+
+        job_id = json.loads(client.post(f'/product/{product_id}/scrape/ajax').data)['job_id']
+        workers = app.extensions['scrape_jobs']
+        while workers.run_pending('test-worker'):
+            pass
+
+        job = json.loads(client.get(f'/api/jobs/{job_id}').data)['job']
+        assert job['status'] == 'done'
+        assert (job['total'], job['completed'], job['succeeded']) == (2, 2, 2)
+        assert {result['shop_name'] for result in job['results']} == {'Boutique A', 'Boutique B'}
+
+
+class TestScrapeScheduler:
+    """Tests du planificateur de scraping automatique"""
+
+    def test_due_links_scraped_and_rescheduled(self, app, monkeypatch):
+        """Test qu'un tour scrape les liens dus puis les replanifie dans le futur"""
+        import time
+        import app.scheduler as scheduler_module
+        from app.scheduler import ScrapeScheduler
+        from database.models import add_product_link, get_link_schedules, schedule_link_runs
+
+        with app.app_context():
+            product_id = create_product("Produit Planifié")
+            link_id = add_product_link(product_id, "Boutique Planifiée", "https://planif.fr/p")
+
+        scraped = []
+
+        def fake_scrape_links(links, on_progress=None, cancel=None):
+            results = []
+            for link in links:
+                scraped.append(link['id'])
+                result = {'link_id': link['id'], 'shop_name': link['shop_name'], 'success': True}
+                on_progress(result)
+                results.append(result)
+            return results
+
+        monkeypatch.setattr(scheduler_module, 'scrape_links', fake_scrape_links)
+
+        scheduler = ScrapeScheduler(app)
+        scheduler.run_once()
+        with app.app_context():
+            assert get_link_schedules([link_id])[link_id]['next_run_at'] is not None
+            # Créneau du lien arrivé à échéance
+            schedule_link_runs([(link_id, time.time() - 60)])
+
+        scraped.clear()
+        summary = scheduler.run_once()
+        assert link_id in scraped
+        assert summary['due'] >= 1
+
+        scraped.clear()
+        scheduler.run_once()
+        assert link_id not in scraped
+
+        with app.app_context():
+            schedule = get_link_schedules([link_id])[link_id]
+        assert schedule['last_run_at'] is not None
+        assert schedule['next_run_at'] > schedule['last_run_at']
+
+    def test_adaptive_interval_backs_off_and_resets(self, app, monkeypatch):
+        """Test recul exponentiel d'un prix stable puis retour à la fréquence de base au changement"""
+        import time
+        import app.scheduler as scheduler_module
+        from app.scheduler import ScrapeScheduler
+        from database.models import add_product_link, get_link_schedules, record_price, schedule_link_runs
+
+        with app.app_context():
+            product_id = create_product("Produit Adaptatif")
+            link_id = add_product_link(product_id, "Boutique Adaptative", "https://adaptatif.fr/p")
+            record_price(link_id, 50.0)
+
+        prices = {'value': 50.0}
+
+        def fake_scrape_links(links, on_progress=None, cancel=None):
+            results = []
+            for link in links:
+                result = {'link_id': link['id'], 'price': prices['value'], 'is_available': True, 'success': True}
+                if link['id'] == link_id:
+                    with app.app_context():
+                        record_price(link_id, prices['value'])
+                on_progress(result)
+                results.append(result)
+            return results
+
+        monkeypatch.setattr(scheduler_module, 'scrape_links', fake_scrape_links)
+        scheduler = ScrapeScheduler(app)
+
+        def run_due():
+            with app.app_context():
+                scheduler.schedule_new_links()
+                schedule_link_runs([(link_id, time.time() - 60)])
+            scheduler.run_once()
+            with app.app_context():
+                return get_link_schedules([link_id])[link_id]
+
+        first = run_due()
+        second = run_due()
+        assert first['unchanged_runs'] == 1
+        assert second['unchanged_runs'] == 2
+        assert second['adaptive_interval'] == 2 * first['adaptive_interval']
+
+        prices['value'] = 45.0
+        changed = run_due()
+        assert changed['unchanged_runs'] == 0
+        assert changed['last_change_at'] is not None
+        assert changed['change_rate'] > 0
+        assert changed['adaptive_interval'] < first['adaptive_interval']
+
+    def test_product_detail_shows_schedule(self, client, app):
+        """Test affichage de la planification des liens"""
+        from database.models import add_product_link, set_link_interval
+
+        with app.app_context():
+            product_id = create_product("Produit Planification Affichée")
+            link_id = add_product_link(product_id, "Boutique Affichée", "https://affiche.fr/p")
+            set_link_interval(link_id, 21600)
+
+        response = client.get(f'/product/{product_id}')
+        assert response.status_code == 200
+        assert 'Planification' in response.get_data(as_text=True)
+        assert '6 h' in response.get_data(as_text=True)
+
+    def test_product_detail_opens_at_most_one_connection(self, client, app):
+        """Test que l'affichage d'un produit ouvre au plus une connexion"""
+        with app.app_context():
+            product_id = create_product("Produit Une Connexion")
+
+        manager = app.extensions['sqlite']
+        before = manager.stats()
+        assert client.get(f'/product/{product_id}').status_code == 200
+        after = manager.stats()
+
+        assert after['requests'] == before['requests'] + 1
+        assert after['request_opened'] - before['request_opened'] <= 1
+        assert after['request_acquired'] - before['request_acquired'] > 1
+
+    def test_edit_link_sets_interval(self, client, app):
+        """Test réglage de la fréquence d'un lien depuis le formulaire"""
+        from database.models import add_product_link, get_link_schedules
+
+        with app.app_context():
+            product_id = create_product("Produit Fréquence")
+            link_id = add_product_link(product_id, "Boutique Volatile", "https://volatile.fr/p")
+
+        response = client.post(f'/product/{product_id}/link/{link_id}/edit', data={
+            'shop_name': 'Boutique Volatile', 'url': 'https://volatile.fr/p',
+            'css_selector': '', 'scrape_interval': '3600'
+        })
+        assert response.status_code == 302
+
+        with app.app_context():
+            assert get_link_schedules([link_id])[link_id]['interval_seconds'] == 3600
+
+
+class TestHistoryMaintenanceRoutes:
+    """Tests de la passe de maintenance de l'historique"""
+
+    def test_run_records_report_and_respects_interval(self, client, app):
+        """Test qu'une passe est enregistrée puis n'est relancée qu'après l'intervalle"""
+        import time
+        from app.maintenance import HistoryMaintenance
+
+        now = [time.time()]
+        maintenance = HistoryMaintenance(app, clock=lambda: now[0])
+
+        report = maintenance.run(full_vacuum=False)
+        assert report['id'] is not None
+        assert report['vacuum'] != 'full'
+        assert not maintenance.is_due()
+        assert maintenance.run_if_due() is None
+
+        now[0] += app.config.get('MAINTENANCE_INTERVAL_HOURS', 24) * 3600 + 60
+        assert maintenance.is_due()
+
+        response = client.get('/api/maintenance')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['success'] is True
+        assert data['report']['runs'][0]['id'] == report['id']
+
+
+class TestHistoryExport:
+    """Tests de l'export en flux de l'historique des prix"""
+
+    @staticmethod
+    def _history(app, name, rows):
+        """Produit avec un lien par boutique et ses relevés ((boutique, prix, date), ...)"""
+        from database.models import add_product_link, get_db_connection
+
+        with app.app_context():
+            product_id = create_product(name)
+            links = {shop: add_product_link(product_id, shop, f"https://{shop.lower()}.fr/p")
+                     for shop in dict.fromkeys(shop for shop, _, _ in rows)}
+            conn = get_db_connection()
+            conn.executemany('''INSERT INTO price_history (product_link_id, price, currency, scraped_at)
+                                VALUES (?, ?, 'EUR', ?)''',
+                             [(links[shop], price, scraped_at) for shop, price, scraped_at in rows])
+            conn.commit()
+            conn.close()
+        return product_id
+
+    def test_csv_export_not_capped(self, client, app):
+        """Test export CSV complet au-delà de 1000 relevés, en flux"""
+        product_id = self._history(app, "Produit Export Long", [
+            ('Boutique', 10.0 + i % 7, f'2023-01-01 {i // 60 % 24:02d}:{i % 60:02d}:00')
+            for i in range(1200)
+        ])
+
+        response = client.get(f'/product/{product_id}/history/export')
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == 'text/csv'
+
+        lines = response.get_data(as_text=True).strip().splitlines()
+        assert lines[0].startswith('Date et heure;Boutique;Prix')
+        assert len(lines) == 1201
+
+    def test_jsonl_gzip_with_filters(self, client, app):
+        """Test export JSON Lines compressé, filtré par boutique et période"""
+        import gzip
+
+        product_id = self._history(app, "Produit Export Filtré", [
+            ('Alpha', 1.0, '2024-02-01 10:00:00'), ('Alpha', 2.0, '2024-02-15 10:00:00'),
+            ('Alpha', 3.0, '2024-03-01 10:00:00'), ('Beta', 4.0, '2024-02-15 10:00:00'),
+        ])
+
+        response = client.get(f'/product/{product_id}/history/export'
+                              '?format=jsonl&gzip=1&shop=Alpha&since=2024-02-10&until=2024-02-28')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/gzip'
+        assert '.jsonl.gz' in response.headers['Content-Disposition']
+
+        records = [json.loads(line) for line in gzip.decompress(response.data).decode('utf-8').splitlines()]
+        assert [(record['shop_name'], record['price']) for record in records] == [('Alpha', 2.0)]
+        assert records[0]['product_id'] == product_id
+
+    def test_catalogue_export(self, client, app):
+        """Test export du catalogue : colonne produit, tous les produits"""
+        self._history(app, "Produit Catalogue Un", [('Gamma', 5.0, '2024-06-01 10:00:00')])
+        self._history(app, "Produit Catalogue Deux", [('Delta', 6.0, '2024-06-01 10:00:00')])
+
+        response = client.get('/history/export?since=2024-06-01&until=2024-06-01')
+        assert response.status_code == 200
+
+        lines = response.get_data(as_text=True).splitlines()
+        assert lines[0].startswith('Produit;Date et heure')
+        assert any(line.startswith('Produit Catalogue Un;') for line in lines)
+        assert any(line.startswith('Produit Catalogue Deux;') for line in lines)
+
+    def test_invalid_options_redirect(self, client, app):
+        """Test format ou date invalide : retour à l'historique"""
+        product_id = self._history(app, "Produit Export Invalide", [('Epsilon', 1.0, '2024-01-01 10:00:00')])
+
+        assert client.get(f'/product/{product_id}/history/export?format=xml').status_code == 302
+        assert client.get(f'/product/{product_id}/history/export?since=hier').status_code == 302
+
+
+class TestAnalyticalSnapshot:
+    """Tests du snapshot Parquet / Arrow de l'historique"""
+
+    @staticmethod
+    def _read(path, fmt):
+        pa = pytest.importorskip('pyarrow')
+        import glob
+        import pyarrow.ipc
+        import pyarrow.parquet as pq
+
+        tables = []
+        for part in sorted(glob.glob(f'{path}/part-*.{fmt}')):
+            if fmt == 'parquet':
+                tables.append(pq.read_table(part))
+            else:
+                with pa.memory_map(part) as source:
+                    tables.append(pa.ipc.open_file(source).read_all())
+        return pa.concat_tables(tables, promote_options='permissive') if tables else None
+
+    @pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+    def test_incremental_snapshot(self, app, tmp_path, fmt):
+        """Test passes incrémentales : nouveaux relevés seulement, dernier relevé d'un lien en attente"""
+        pytest.importorskip('pyarrow')
+        from app.snapshot import run_snapshot
+
+        product_id = TestHistoryExport._history(app, f"Produit Snapshot {fmt}", [
+            ('Zeta', 1.0, '2024-01-01 10:00:00'), ('Zeta', 2.0, '2024-01-02 10:00:00'),
+            ('Eta', 3.0, '2024-01-01 10:00:00'),
+        ])
+
+        first = run_snapshot(app, output_dir=str(tmp_path), fmt=fmt, batch_rows=2, full=True)
+        table = self._read(tmp_path, fmt).to_pydict()
+        mine = [i for i, pid in enumerate(table['product_id']) if pid == product_id]
+        # Dernier relevé de chaque lien en attente : seul le premier relevé de Zeta est exporté
+        assert [(table['shop_name'][i], table['price'][i]) for i in mine] == [('Zeta', 1.0)]
+        assert first['pending'] >= 2
+
+        TestHistoryExport._history(app, f"Produit Snapshot {fmt} suite", [('Theta', 4.0, '2024-01-03 10:00:00')])
+        with app.app_context():
+            from database.models import get_product_links, record_price
+            zeta = [link['id'] for link in get_product_links(product_id) if link['shop_name'] == 'Zeta'][0]
+            record_price(zeta, 5.0)
+
+        second = run_snapshot(app, output_dir=str(tmp_path), fmt=fmt)
+        assert second['file'] != first['file']
+        assert second['last_id'] > first['last_id']
+
+        table = self._read(tmp_path, fmt)
+        assert pytest.importorskip('pyarrow').types.is_dictionary(table.schema.field('shop_name').type)
+        rows = table.to_pydict()
+        mine = sorted((rows['shop_name'][i], rows['price'][i])
+                      for i, pid in enumerate(rows['product_id']) if pid == product_id)
+        assert mine == [('Zeta', 1.0), ('Zeta', 2.0)]
+        assert len(rows['price_id']) == len(set(rows['price_id']))
+
+    def test_nothing_new(self, app, tmp_path):
+        """Test passe sans nouveau relevé : aucun fichier ajouté"""
+        pytest.importorskip('pyarrow')
+        from app.snapshot import run_snapshot
+
+        run_snapshot(app, output_dir=str(tmp_path), full=True)
+        assert run_snapshot(app, output_dir=str(tmp_path))['file'] is None
@@ -0,0 +1,781 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Tests pour le moteur de scraping
+"""
+
+import time
+import threading
+from collections import defaultdict
+
+import pytest
+from scraping.engine import ScrapeEngine, get_link_domain
+from scraping.politeness import DomainScheduler, TokenBucket
+from scraping.driver_pool import DriverPool
+from scraping.price_scraper import PriceScraper
+from scraping.scheduling import (
+    DAY, HOUR, adaptive_interval, change_rate, first_run_time, interval_for, link_phase, next_run_time
+)
+from scraping.structured_data import extract_structured_price, parse_availability
+from scraping.parsers import available_backends, parse_html, prescan, selector_pattern, PRESCAN_MARGIN
+from bs4 import BeautifulSoup
+
+
+class FakeScraper:
+    """Scraper factice qui mesure la concurrence par domaine"""
+
+    lock = threading.Lock()
+
+    def __init__(self, tracker, duration=0.02):
+        self.tracker = tracker
+        self.duration = duration
+
+    def scrape_price(self, url, css_selector=None, shop_name="", strategy=None, http_cache=None):
+        domain = get_link_domain(url)
+        with self.lock:
+            self.tracker['active'][domain] += 1
+            self.tracker['total'] += 1
+            self.tracker['max_domain'] = max(self.tracker['max_domain'], self.tracker['active'][domain])
+            self.tracker['max_total'] = max(self.tracker['max_total'], self.tracker['total'])
+            self.tracker['starts'][domain].append(time.monotonic())
+
+        time.sleep(self.duration)
+
+        with self.lock:
+            self.tracker['active'][domain] -= 1
+            self.tracker['total'] -= 1
+
+        if 'erreur' in url:
+            raise RuntimeError('Page introuvable')
+
+        return {'price': 9.99, 'currency': 'EUR', 'is_available': True, 'error_message': None}
+
+
+def make_tracker():
+    return {'active': defaultdict(int), 'total': 0, 'max_domain': 0, 'max_total': 0,
+            'starts': defaultdict(list)}
+
+
+def make_links(count, shops):
+    return [
+        {'id': i, 'shop_name': f'Shop {i % shops}', 'url': f'https://www.shop{i % shops}.fr/p/{i}',
+         'css_selector': None}
+        for i in range(count)
+    ]
+
+
+class TestLinkDomain:
+    """Tests d'extraction du domaine"""
+
+    def test_strips_www_and_port(self):
+        assert get_link_domain('https://www.Amazon.fr:443/dp/123') == 'amazon.fr'
+
+    def test_keeps_subdomain(self):
+        assert get_link_domain('https://boutique.fnac.com/a') == 'boutique.fnac.com'
+
+
+class TestScrapeEngine:
+    """Tests du pool de scraping borné"""
+
+    def test_all_links_scraped(self):
+        tracker = make_tracker()
+        engine = ScrapeEngine(4, 1, 0, scraper_factory=lambda: FakeScraper(tracker))
+        results = engine.run(make_links(12, 4))
+
+        assert len(results) == 12
+        assert all(r['success'] for r in results)
+
+    def test_global_and_domain_caps(self):
+        tracker = make_tracker()
+        engine = ScrapeEngine(3, 1, 0, scraper_factory=lambda: FakeScraper(tracker))
+        engine.run(make_links(20, 5))
+
+        assert tracker['max_total'] <= 3
+        assert tracker['max_domain'] == 1
+
+    def test_domain_delay_respected(self):
+        tracker = make_tracker()
+        engine = ScrapeEngine(4, 1, 0.05, scraper_factory=lambda: FakeScraper(tracker, duration=0))
+        engine.run(make_links(6, 2))
+
+        for starts in tracker['starts'].values():
+            gaps = [b - a for a, b in zip(starts, starts[1:])]
+            assert all(gap >= 0.045 for gap in gaps)
+
+    def test_error_isolated_per_link(self):
+        tracker = make_tracker()
+        links = make_links(3, 3)
+        links[1]['url'] = 'https://shop1.fr/erreur'
+        engine = ScrapeEngine(2, 1, 0, scraper_factory=lambda: FakeScraper(tracker))
+        results = {r['link_id']: r for r in engine.run(links)}
+
+        assert results[1]['success'] is False
+        assert 'Page introuvable' in results[1]['error_message']
+        assert results[0]['success'] and results[2]['success']
+
+    def test_on_result_runs_in_caller_thread(self):
+        tracker = make_tracker()
+        caller = threading.get_ident()
+        seen = []
+
+        def on_result(link, price_data):
+            seen.append(threading.get_ident())
+            return {'link_id': link['id'], 'success': True}
+
+        engine = ScrapeEngine(4, 1, 0, scraper_factory=lambda: FakeScraper(tracker))
+        engine.run(make_links(5, 5), on_result=on_result)
+
+        assert seen and all(ident == caller for ident in seen)
+
+    def test_cancel_stops_new_links(self):
+        tracker = make_tracker()
+        cancel = threading.Event()
+
+        def on_result(link, price_data):
+            cancel.set()
+            return {'link_id': link['id'], 'success': True}
+
+        engine = ScrapeEngine(1, 1, 0, scraper_factory=lambda: FakeScraper(tracker))
+        results = engine.run(make_links(10, 5), on_result=on_result, cancel=cancel)
+
+        assert len(results) == 1
+
+    def test_empty_links(self):
+        assert ScrapeEngine(scraper_factory=lambda: None).run([]) == []
+
+
+class FakeClock:
+    """Horloge manuelle pour les tests de l'ordonnanceur"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    """Tests du seau à jetons"""
+
+    def test_spacing(self):
+        bucket = TokenBucket(delay=2, capacity=1, now=0)
+        assert bucket.try_acquire(0)
+        assert not bucket.try_acquire(1)
+        assert bucket.wait_time(1) == pytest.approx(1)
+        assert bucket.try_acquire(2)
+
+    def test_burst(self):
+        bucket = TokenBucket(delay=1, capacity=3, now=0)
+        assert all(bucket.try_acquire(0) for _ in range(3))
+        assert not bucket.try_acquire(0)
+
+
+class TestDomainScheduler:
+    """Tests de l'ordonnanceur de politesse"""
+
+    def test_other_domains_served_during_cooldown(self):
+        clock = FakeClock()
+        scheduler = DomainScheduler(default_delay=10, clock=clock)
+        scheduler.add_all(make_links(6, 3))
+
+        domains = [scheduler.next_ready()[0] for _ in range(3)]
+        assert sorted(domains) == ['shop0.fr', 'shop1.fr', 'shop2.fr']
+        assert scheduler.next_ready() is None
+        assert scheduler.wait_time() == pytest.approx(10)
+
+        clock.now = 10
+        assert scheduler.next_ready() is not None
+
+    def test_longest_queue_first(self):
+        scheduler = DomainScheduler(default_delay=0, clock=FakeClock())
+        links = make_links(2, 2) + [
+            {'id': 10 + i, 'shop_name': 'Big', 'url': f'https://big.fr/{i}'} for i in range(5)
+        ]
+        scheduler.add_all(links)
+        assert scheduler.next_ready()[0] == 'big.fr'
+
+    def test_domain_delays_apply_to_subdomains(self):
+        scheduler = DomainScheduler(default_delay=2, domain_delays={'www.amazon.fr': 5})
+        assert scheduler.delay_for('amazon.fr') == 5
+        assert scheduler.delay_for('smile.amazon.fr') == 5
+        assert scheduler.delay_for('fnac.com') == 2
+
+    def test_busy_domains_skipped(self):
+        scheduler = DomainScheduler(default_delay=0, clock=FakeClock())
+        scheduler.add_all(make_links(2, 2))
+        domain, _ = scheduler.next_ready(busy={'shop0.fr'})
+        assert domain == 'shop1.fr'
+
+    def test_stats_report_rate(self):
+        clock = FakeClock()
+        scheduler = DomainScheduler(default_delay=0.5, clock=clock)
+        scheduler.add_all({'id': i, 'shop_name': 'A', 'url': f'https://a.fr/{i}'} for i in range(3))
+        for t in (0, 0.5, 1.0):
+            clock.now = t
+            assert scheduler.next_ready() is not None
+
+        stats = scheduler.stats()['a.fr']
+        assert stats['requests'] == 3
+        assert stats['requests_per_second'] == pytest.approx(2.0)
+
+
+class FakeDriver:
+    """Driver Selenium factice"""
+
+    def __init__(self):
+        self.alive = True
+        self.quit_called = False
+
+    def set_page_load_timeout(self, timeout):
+        pass
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError('Navigateur mort')
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TestDriverPool:
+    """Tests du pool de navigateurs"""
+
+    def make_pool(self, **kwargs):
+        created = []
+
+        def factory():
+            driver = FakeDriver()
+            created.append(driver)
+            return driver
+
+        return DriverPool(factory=factory, **kwargs), created
+
+    def test_driver_reused(self):
+        pool, created = self.make_pool(max_size=2, warm_size=0)
+        for _ in range(5):
+            with pool.driver():
+                pass
+        assert len(created) == 1
+
+    def test_max_size_shared_by_concurrent_users(self):
+        pool, created = self.make_pool(max_size=2, warm_size=0)
+        barrier = threading.Barrier(4)
+
+        def use():
+            barrier.wait()
+            with pool.driver():
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=use) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(created) <= 2
+        assert pool.stats()['size'] == len(created)
+
+    def test_recycled_after_max_pages(self):
+        pool, created = self.make_pool(max_size=1, warm_size=0, max_pages=2)
+        for _ in range(3):
+            with pool.driver():
+                pass
+        assert len(created) == 2
+        assert created[0].quit_called
+
+    def test_unhealthy_driver_replaced(self):
+        pool, created = self.make_pool(max_size=1, warm_size=0)
+        with pool.driver():
+            pass
+        created[0].alive = False
+
+        with pool.driver() as driver:
+            assert driver is created[1]
+
+    def test_browser_error_discards_driver(self):
+        from selenium.common.exceptions import WebDriverException
+
+        pool, created = self.make_pool(max_size=1, warm_size=0)
+        with pytest.raises(WebDriverException):
+            with pool.driver():
+                raise WebDriverException('crash')
+
+        assert created[0].quit_called
+        assert pool.stats()['size'] == 0
+
+    def test_recycled_on_memory_growth(self, monkeypatch):
+        pool, created = self.make_pool(max_size=1, warm_size=0, max_memory_growth_mb=100)
+        memory = iter([300.0, 350.0, 450.0])
+        monkeypatch.setattr(pool, '_memory_mb', lambda pooled: next(memory, 300.0))
+
+        # Démarrage à 300 Mo, +50 Mo : gardé ; +150 Mo : recyclé
+        with pool.driver():
+            pass
+        with pool.driver():
+            pass
+        assert created[0].quit_called
+        assert pool.stats()['size'] == 0
+
+        with pool.driver() as driver:
+            assert driver is created[1]
+
+    def test_warm_up(self):
+        pool, created = self.make_pool(max_size=3, warm_size=2)
+        pool.warm_up()
+        assert len(created) == 2
+        assert pool.stats()['idle'] == 2
+
+    def test_configure_warms_in_background(self, monkeypatch):
+        """Navigateurs démarrés dès la configuration, avant le premier repli Selenium"""
+        import scraping.driver_pool as driver_pool
+
+        monkeypatch.setattr(driver_pool, '_pool', None)
+        monkeypatch.setattr(driver_pool, '_pool_settings', driver_pool._pool_settings)
+        created = []
+        driver_pool.configure_driver_pool(factory=lambda: created.append(FakeDriver()) or created[-1],
+                                          max_size=2, warm_size=1)
+        pool = driver_pool.get_driver_pool()
+
+        deadline = time.monotonic() + 5
+        while pool.stats()['idle'] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pool.stats()['idle'] == 1 and len(created) == 1
+        pool.close()
+
+
+PRODUCT_PAGE = """
+<html><body>
+  <div class="header"><span class="amount">Livraison 4,99 €</span></div>
+  <div class="product">
+    <h1>Produit</h1>
+    <div><span class="old">129,99 €</span><span class="final">99,90 €</span></div>
+  </div>
+</body></html>
+"""
+
+
+class TestExtractionStrategy:
+    """Tests de la stratégie d'extraction mémorisée"""
+
+    @pytest.fixture
+    def scraper(self):
+        return PriceScraper()
+
+    def test_css_selector_reports_element_path(self, scraper):
+        soup = BeautifulSoup(PRODUCT_PAGE, 'html.parser')
+        info = scraper._extract_price_from_soup(soup, '.final', 'Test')
+
+        assert info['price'] == 99.90
+        assert info['selector'] == '.final'
+        assert soup.select_one(info['element_path']).get_text() == '99,90 €'
+
+    @pytest.mark.parametrize('backend', available_backends())
+    def test_element_path_with_identical_siblings(self, scraper, backend):
+        """Chemin du second de deux frères identiques : le second, pas le premier"""
+        page = '<html><body><div><span class="price">10,00 €</span><span class="price">10,00 €</span></div></body></html>'
+        soup = parse_html(page, backend)
+        path = scraper._element_path(soup.select('span.price')[1])
+
+        assert path.endswith('span:nth-of-type(2)')
+        changed = parse_html(page.replace('10,00 €</span></div>', '12,00 €</span></div>'), backend)
+        assert changed.select_one(path).get_text(strip=True) == '12,00 €'
+
+    def test_strategy_path_used_first(self, scraper):
+        soup = BeautifulSoup(PRODUCT_PAGE, 'html.parser')
+        path = scraper._extract_with_css_selector(soup, '.final', 'Test')['element_path']
+
+        # Sans sélecteur, l'auto-détection trouverait d'abord '.amount' (4,99 €)
+        info = scraper._extract_price_from_soup(soup, None, 'Test', {'fetch_mode': 'requests',
+                                                                     'selector': None,
+                                                                     'element_path': path})
+        assert info['price'] == 99.90
+
+    def test_stale_strategy_falls_back(self, scraper):
+        soup = BeautifulSoup(PRODUCT_PAGE, 'html.parser')
+        strategy = {'fetch_mode': 'requests', 'selector': '.disparu', 'element_path': 'html > nav'}
+        info = scraper._extract_price_from_soup(soup, '.final', 'Test', strategy)
+        assert info['price'] == 99.90
+
+    def test_with_strategy_only_on_success(self):
+        found = PriceScraper._with_strategy({'price': 5.0, 'selector': '.p', 'element_path': 'html'}, 'selenium')
+        assert found['strategy'] == {'fetch_mode': 'selenium', 'selector': '.p', 'element_path': 'html'}
+        assert 'selector' not in found
+
+        missing = PriceScraper._with_strategy({'price': None}, 'requests')
+        assert missing['strategy'] is None
+
+    def test_selenium_strategy_skips_requests(self, scraper, monkeypatch):
+        calls = []
+
+        def fake_requests(*args, **kwargs):
+            calls.append('requests')
+            return {'price': None, 'currency': 'EUR', 'is_available': False, 'error_message': 'x'}
+
+        def fake_selenium(*args, **kwargs):
+            calls.append('selenium')
+            return {'price': 10.0, 'currency': 'EUR', 'is_available': True, 'error_message': None,
+                    'selector': '.price', 'element_path': None}
+
+        monkeypatch.setattr(scraper, '_scrape_with_requests', fake_requests)
+        monkeypatch.setattr(scraper, '_scrape_with_selenium', fake_selenium)
+
+        result = scraper.scrape_price('https://shop.fr/p', strategy={'fetch_mode': 'selenium'})
+        assert calls == ['selenium']
+        assert result['strategy']['fetch_mode'] == 'selenium'
+
+
+class FakeResponse:
+    """Réponse requests factice"""
+
+    def __init__(self, status_code=200, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        self.read = 0
+        for start in range(0, len(self.content), chunk_size):
+            self.read = start + chunk_size
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class TestConditionalFetch:
+    """Tests du cache HTTP (ETag / Last-Modified / hash du contenu)"""
+
+    PAGE = b'<html><body><span class="price">49,90 \xe2\x82\xac</span></body></html>'
+
+    @pytest.fixture
+    def scraper(self):
+        return PriceScraper()
+
+    def test_validators_returned(self, scraper, monkeypatch):
+        monkeypatch.setattr(scraper.session, 'get', lambda url, **kw: FakeResponse(
+            200, self.PAGE, {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}))
+
+        result = scraper.scrape_price('https://shop.fr/p', '.price')
+        assert result['price'] == 49.90
+        assert result['http_cache']['etag'] == '"v1"'
+        assert result['http_cache']['content_hash']
+        assert not result.get('cache_hit')
+
+    def test_not_modified_reuses_price(self, scraper, monkeypatch):
+        sent = {}
+
+        def fake_get(url, **kwargs):
+            sent.update(kwargs['headers'])
+            return FakeResponse(304)
+
+        monkeypatch.setattr(scraper.session, 'get', fake_get)
+        cache = {'etag': '"v1"', 'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT',
+                 'content_hash': 'abc', 'price': 49.90, 'currency': 'EUR'}
+        strategy = {'fetch_mode': 'requests', 'selector': '.price', 'element_path': None}
+
+        result = scraper.scrape_price('https://shop.fr/p', '.price', strategy=strategy, http_cache=cache)
+        assert sent == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+        assert result['cache_hit'] and result['price'] == 49.90
+        assert result['strategy'] == strategy
+
+    def test_same_hash_skips_parsing(self, scraper, monkeypatch):
+        import hashlib
+
+        monkeypatch.setattr(scraper.session, 'get', lambda url, **kw: FakeResponse(200, self.PAGE))
+        monkeypatch.setattr(scraper, '_extract_price_from_soup',
+                            lambda *a, **kw: pytest.fail('Parsing inutile'))
+        cache = {'content_hash': hashlib.sha256(self.PAGE).hexdigest(), 'price': 12.0, 'currency': 'EUR'}
+
+        result = scraper.scrape_price('https://shop.fr/p', '.price', http_cache=cache)
+        assert result['cache_hit'] and result['price'] == 12.0
+
+    def test_cache_without_price_not_conditional(self, scraper, monkeypatch):
+        sent = {}
+
+        def fake_get(url, **kwargs):
+            sent.update(kwargs['headers'])
+            return FakeResponse(200, self.PAGE)
+
+        monkeypatch.setattr(scraper.session, 'get', fake_get)
+        result = scraper.scrape_price('https://shop.fr/p', '.price', http_cache={'etag': '"v1"', 'price': None})
+        assert sent == {}
+        assert result['price'] == 49.90
+
+
+class TestParsers:
+    """Tests des backends de parsing HTML"""
+
+    @pytest.fixture(params=available_backends())
+    def backend(self, request):
+        return request.param
+
+    def test_html_parser_always_available(self):
+        assert available_backends()[-1] == 'html.parser'
+
+    def test_extraction_identical_across_backends(self, backend):
+        scraper = PriceScraper(parser=backend)
+        soup = parse_html(PRODUCT_PAGE.encode('utf-8'), backend)
+
+        info = scraper._extract_price_from_soup(soup, '.final', 'Test')
+        assert info['price'] == 99.90
+        assert soup.select_one(info['element_path']).get_text() == '99,90 €'
+
+        # Auto-détection puis regex sur le texte complet
+        assert scraper._extract_price_from_soup(soup, None, 'Test')['price'] == 4.99
+        assert scraper._regex_price_search(soup, 'Test')['price'] == 4.99
+
+    def test_declared_encoding_respected(self, backend):
+        page = '<html><head><meta charset="iso-8859-1"></head><body><p class="p">Prix : 12,50 £</p></body></html>'
+        soup = parse_html(page.encode('iso-8859-1'), backend)
+        assert soup.select_one('.p').get_text() == 'Prix : 12,50 £'
+
+
+class TestPrescan:
+    """Tests du pré-scan en flux"""
+
+    @staticmethod
+    def chunks(content, size=1024):
+        return [content[i:i + size] for i in range(0, len(content), size)]
+
+    def test_selector_pattern(self):
+        pattern = selector_pattern('div.box > span.price')
+        assert pattern.search(b'<span class="a price">')
+        assert not pattern.search(b'<div class="price-box">')
+        assert selector_pattern('#tarif').search(b'<b id=tarif>')
+        assert selector_pattern('[class*="price"]') is None
+        assert selector_pattern(None) is None
+
+    def test_stops_after_price_region(self):
+        page = b'<html><body>' + b'<p>menu</p>' * 500 + b'<span class="price">9,99 \xe2\x82\xac</span>' + b'x' * 100000
+        prefix, region, rest = prescan(self.chunks(page), selector_pattern('.price'))
+
+        assert region == 'selector'
+        assert len(prefix) < 20000
+        assert prefix + b''.join(rest) == page
+        assert parse_html(prefix).select_one('.price').get_text() == '9,99 €'
+
+    def test_deterministic_boundary(self):
+        page = b'<div class="price">1 \xe2\x82\xac</div>' + b'y' * 50000
+        small = prescan(self.chunks(page, 100), selector_pattern('.price'))[0]
+        large = prescan(self.chunks(page, 8192), selector_pattern('.price'))[0]
+        assert small == large
+        assert len(small) == page.index(b'price') + len(b'price') + PRESCAN_MARGIN
+
+    def test_json_ld_stop(self):
+        block = b'<script type="application/ld+json">{"@type": "Offer", "price": "19.90"}</script>'
+        page = b'<html><head>' + block + b'</head><body>' + b'z' * 100000 + b'</body></html>'
+        prefix, region, _ = prescan(self.chunks(page), structured=True)
+        assert region == 'json-ld'
+        assert prefix.endswith(block)
+
+    def test_meta_stop_reads_whole_head(self):
+        """Balises de devise et de disponibilité après celle du prix : lues avant l'arrêt"""
+        head = (b'<html><head><meta property="product:price:amount" content="89.90">' + b'<link rel="x">' * 3000
+                + b'<meta property="product:price:currency" content="USD">'
+                + b'<meta property="product:availability" content="out of stock"></head>')
+        page = head + b'<body>' + b'z' * 100000 + b'</body></html>'
+        prefix, region, _ = prescan(self.chunks(page), structured=True)
+
+        assert region == 'meta'
+        assert prefix == head
+        assert extract_structured_price(prefix) == extract_structured_price(page) == \
+            {'price': 89.9, 'currency': 'USD', 'is_available': False, 'source': 'meta'}
+
+    def test_no_region_reads_everything(self):
+        page = b'<html><body>' + b'w' * 30000 + b'</body></html>'
+        prefix, region, rest = prescan(self.chunks(page), selector_pattern('.price'))
+        assert region is None
+        assert prefix == page and list(rest) == []
+
+    def test_scraper_reads_only_prefix(self, monkeypatch):
+        page = b'<html><body><span class="price">49,90 \xe2\x82\xac</span>' + b'<p>avis</p>' * 20000 + b'</body></html>'
+        response = FakeResponse(200, page)
+        scraper = PriceScraper()
+        monkeypatch.setattr(scraper.session, 'get', lambda url, **kw: response)
+
+        result = scraper.scrape_price('https://shop.fr/p', '.price')
+        assert result['price'] == 49.90
+        assert response.read < len(page) // 4
+
+    def test_prefix_miss_falls_back_to_full_page(self, monkeypatch):
+        # La classe apparaît tôt sans prix, le vrai prix est en fin de page
+        page = (b'<html><body><span class="price">Voir offre</span>' + b'<p>avis</p>' * 2000
+                + b'<span class="price">15,00 \xe2\x82\xac</span></body></html>')
+        scraper = PriceScraper()
+        monkeypatch.setattr(scraper.session, 'get', lambda url, **kw: FakeResponse(200, page))
+
+        result = scraper.scrape_price('https://shop.fr/p', '.price')
+        assert result['price'] == 15.0
+        assert result['http_cache']['content_hash'] == __import__('hashlib').sha256(page).hexdigest()
+
+
+class TestStructuredData:
+    """Tests de l'extraction depuis JSON-LD, meta et microdata"""
+
+    JSON_LD_PAGE = """
+    <html><head>
+      <script type="application/ld+json">{"@context": "https://schema.org", "@graph": [
+        {"@type": "BreadcrumbList"},
+        {"@type": "Product", "name": "Casque", "offers": {
+          "@type": "Offer", "price": "1 299,00", "priceCurrency": "eur",
+          "availability": "https://schema.org/OutOfStock"}}]}</script>
+    </head><body><span class="amount">Livraison 4,99 €</span></body></html>
+    """
+
+    META_PAGE = """
+    <html><head>
+      <meta property="og:title" content="Casque">
+      <meta property="product:price:amount" content="89.90">
+      <meta property="product:price:currency" content="USD">
+    </head><body></body></html>
+    """
+
+    MICRODATA_PAGE = """
+    <div itemscope itemtype="https://schema.org/Offer">
+      <span itemprop="price" content="42.50">42,50 €</span>
+      <meta itemprop="priceCurrency" content="EUR">
+      <link itemprop="availability" href="https://schema.org/InStock">
+    </div>
+    """
+
+    def test_json_ld_offer(self):
+        result = extract_structured_price(self.JSON_LD_PAGE.encode('utf-8'))
+        assert result == {'price': 1299.0, 'currency': 'EUR', 'is_available': False, 'source': 'json-ld'}
+
+    def test_meta_tags(self):
+        result = extract_structured_price(self.META_PAGE)
+        assert result['price'] == 89.90 and result['currency'] == 'USD' and result['source'] == 'meta'
+
+    def test_microdata(self):
+        result = extract_structured_price(self.MICRODATA_PAGE)
+        assert result == {'price': 42.5, 'currency': 'EUR', 'is_available': True, 'source': 'microdata'}
+
+    def test_aggregate_offer_and_invalid_blocks(self):
+        page = ('<script type="application/ld+json">{invalide</script>'
+                '<script type="application/ld+json">[{"@type": "Product", "offers": '
+                '{"@type": "AggregateOffer", "lowPrice": 15.5, "priceCurrency": "EUR"}}]</script>')
+        assert extract_structured_price(page)['price'] == 15.5
+
+    def test_no_structured_data(self):
+        assert extract_structured_price(PRODUCT_PAGE) is None
+        assert extract_structured_price('<meta property="product:price:amount" content="0">') is None
+
+    def test_thousands_separators(self):
+        """Séparateurs de milliers français et anglais : le dernier séparateur suivi de 3 chiffres n'est pas décimal"""
+        for declared, price in (('1.299,00', 1299.0), ('1,299', 1299.0), ('1,299.00', 1299.0),
+                                ('1 299,00', 1299.0), ('1.299.000', 1299000.0), ('12,5', 12.5), ('19.90', 19.9)):
+            page = f'<meta property="product:price:amount" content="{declared}">'
+            assert extract_structured_price(page)['price'] == price, declared
+
+    def test_availability_values(self):
+        assert parse_availability('http://schema.org/InStock') is True
+        assert parse_availability('out of stock') is False
+        assert parse_availability('PreOrder') is True
+        assert parse_availability('inconnu') is None
+
+    def test_runs_before_selector_search(self, monkeypatch):
+        scraper = PriceScraper()
+        page = self.JSON_LD_PAGE.encode('utf-8') + b'<p>avis</p>' * 20000
+        response = FakeResponse(200, page)
+        monkeypatch.setattr(scraper.session, 'get', lambda url, **kw: response)
+        monkeypatch.setattr(scraper, '_auto_detect_price', lambda *a: pytest.fail('Recherche par sélecteurs inutile'))
+
+        result = scraper.scrape_price('https://shop.fr/p')
+        assert result['price'] == 1299.0
+        assert result['source'] == 'json-ld'
+        assert result['is_available'] is False
+        assert result['http_cache'] is None
+        assert response.read < len(page) // 4
+
+    def test_css_selector_keeps_priority(self, monkeypatch):
+        scraper = PriceScraper()
+        monkeypatch.setattr(scraper.session, 'get',
+                            lambda url, **kw: FakeResponse(200, self.JSON_LD_PAGE.encode('utf-8')))
+
+        assert scraper.scrape_price('https://shop.fr/p', '.amount')['price'] == 4.99
+        # Sélecteur en échec : repli sur les données structurées avant Selenium
+        result = scraper.scrape_price('https://shop.fr/p', '.disparu')
+        assert result['price'] == 1299.0 and result['source'] == 'json-ld'
+
+
+class TestScheduling:
+    """Tests du calcul des dates de scraping planifié"""
+
+    NOW = 1_780_000_000.0
+
+    def test_phase_spreads_consecutive_ids(self):
+        minutes = {int(link_phase(link_id) * 60) for link_id in range(1, 121)}
+        assert len(minutes) > 40
+
+    def test_sub_daily_grid(self):
+        for link_id in range(1, 50):
+            run = next_run_time(link_id, HOUR, self.NOW)
+            assert self.NOW < run <= self.NOW + HOUR
+            # Grille stable : le scraping suivant tombe une heure plus tard
+            assert next_run_time(link_id, HOUR, run) == run + HOUR
+
+    def test_hourly_links_flat_over_the_hour(self):
+        runs = [next_run_time(link_id, HOUR, self.NOW) for link_id in range(1, 601)]
+        buckets = [0] * 6
+        for run in runs:
+            buckets[int((run - self.NOW) // 600)] += 1
+        assert max(buckets) - min(buckets) < 40
+
+    def test_daily_links_inside_window(self):
+        for link_id in range(1, 50):
+            first = first_run_time(link_id, DAY, self.NOW, window_start_hour=6, window_hours=4)
+            run = next_run_time(link_id, DAY, first, window_start_hour=6, window_hours=4)
+            assert 6 <= time.localtime(run).tm_hour < 10
+            # Même créneau le lendemain (à un changement d'heure près)
+            assert abs(run - first - DAY) <= HOUR
+
+    def test_first_run_is_next_window_slot(self):
+        run = first_run_time(7, DAY, self.NOW, window_start_hour=6, window_hours=6)
+        assert self.NOW < run <= self.NOW + DAY
+        assert 6 <= time.localtime(run).tm_hour < 12
+
+    def test_interval_precedence(self):
+        link = {'url': 'https://www.amazon.fr/dp/1', 'interval_seconds': None}
+        assert interval_for(link, DAY) == DAY
+        assert interval_for(link, DAY, {'amazon.fr': 1}) == HOUR
+        assert interval_for({**link, 'url': 'https://smile.amazon.fr/x'}, DAY, {'amazon.fr': 1}) == HOUR
+        assert interval_for({**link, 'interval_seconds': 7200}, DAY, {'amazon.fr': 1}) == 7200
+
+    def test_adaptive_backoff_up_to_ceiling(self):
+        intervals = [adaptive_interval(DAY, 0, runs, HOUR, 14 * DAY) for runs in range(8)]
+        assert intervals[:4] == [DAY, 2 * DAY, 4 * DAY, 8 * DAY]
+        assert intervals[-1] == 14 * DAY
+
+    def test_adaptive_volatile_links_faster(self):
+        # Quatre changements par jour : un scraping toutes les 3 heures, sans descendre sous le plancher
+        assert adaptive_interval(DAY, 4.0, 0, HOUR, 14 * DAY) == 3 * HOUR
+        assert adaptive_interval(DAY, 100.0, 0, HOUR, 14 * DAY) == HOUR
+        # Un prix rarement modifié ne ralentit pas au-delà de la fréquence de base tant qu'il bouge
+        assert adaptive_interval(DAY, 0.01, 0, HOUR, 14 * DAY) == DAY
+
+    def test_change_rate(self):
+        assert change_rate(0, 10 * DAY) == 0
+        assert change_rate(5, 10 * DAY) == 0.5
+        # Période trop courte : ramenée à une heure
+        assert change_rate(3, 0) == 72
+
@@ -0,0 +1,139 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Décimation des séries des graphiques de prix
+
+Une série trop longue (période d'un an lue à l'heure...) est réduite à
+max_points points avant d'être envoyée au navigateur, sans perdre sa forme :
+
+- lttb : Largest-Triangle-Three-Buckets, garde dans chaque intervalle le
+  point qui forme le plus grand triangle avec ses voisins retenus (pics,
+  creux et changements de pente restent visibles) ;
+- minmax : garde le prix le plus bas et le plus haut de chaque intervalle
+  (aucune promotion ni hausse ponctuelle n'est perdue).
+
+Les points sont des séquences dont les deux premiers éléments sont x et y,
+numériques (horodatage epoch et prix) ; les éléments suivants sont ignorés
+et les points retenus sont renvoyés tels quels, dans l'ordre.
+"""
+
+
+def lttb(points, max_points):
+    """
+    Largest-Triangle-Three-Buckets
+
+    Args:
+        points (list): Points (x, y, ...) triés par x
+        max_points (int): Points conservés au plus (premier et dernier inclus)
+
+    Returns:
+        list: Points retenus
+    """
+    count = len(points)
+    if count <= max_points:
+        return list(points)
+    if max_points < 3:
+        return [points[0], points[-1]][:max(0, max_points)]
+
+    # Premier et dernier points gardés, les autres répartis en max_points - 2 intervalles
+    every = (count - 2) / (max_points - 2)
+    sampled = [points[0]]
+    selected = 0
+
+    for bucket in range(max_points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+
+        # Moyenne de l'intervalle suivant (dernier point pour le dernier intervalle)
+        following = points[end:min(int((bucket + 2) * every) + 1, count)] or points[-1:]
+        next_x = sum(point[0] for point in following) / len(following)
+        next_y = sum(point[1] for point in following) / len(following)
+
+        ax, ay = points[selected][0], points[selected][1]
+        best_area = -1
+        for index in range(start, end):
+            x, y = points[index][0], points[index][1]
+            area = abs((ax - next_x) * (y - ay) - (ax - x) * (next_y - ay))
+            if area > best_area:
+                best_area, best = area, index
+
+        sampled.append(points[best])
+        selected = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def min_max(points, max_points):
+    """
+    Minimum et maximum de chaque intervalle
+
+    Args:
+        points (list): Points (x, y, ...) triés par x
+        max_points (int): Points conservés au plus (premier et dernier inclus)
+
+    Returns:
+        list: Points retenus
+    """
+    count = len(points)
+    if count <= max_points:
+        return list(points)
+    if max_points < 4:
+        return [points[0], points[-1]][:max(0, max_points)]
+
+    buckets = (max_points - 2) // 2
+    every = (count - 2) / buckets
+    sampled = [points[0]]
+
+    for bucket in range(buckets):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        indexes = range(start, end)
+        lowest = min(indexes, key=lambda index: points[index][1])
+        highest = max(indexes, key=lambda index: points[index][1])
+        # Dans l'ordre chronologique, une seule fois si l'intervalle est plat
+        sampled.extend(points[index] for index in sorted({lowest, highest}))
+
+    sampled.append(points[-1])
+    return sampled
+
+
+DECIMATION_METHODS = {
+    'lttb': lttb,
+    'minmax': min_max,
+}
+
+
+def decimate(points, max_points, method='lttb'):
+    """
+    Réduire une série à max_points points au plus
+
+    Args:
+        points (list): Points (x, y, ...) triés par x
+        max_points (int): Points conservés au plus, None pour tout garder
+        method (str): 'lttb' ou 'minmax' (voir DECIMATION_METHODS)
+
+    Returns:
+        list: Points retenus
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Méthode de décimation inconnue: {method}")
+    if max_points is None:
+        return list(points)
+    return DECIMATION_METHODS[method](points, max_points)
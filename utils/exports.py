@@ -0,0 +1,136 @@
+"""
+PriceChecker - Application de surveillance des prix en ligne
+Copyright (C) 2024 PriceChecker Project
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Export de l'historique des prix
+
+Les relevés (database.models.iter_price_history) sont sérialisés au fil de
+l'eau en CSV ou JSON Lines, éventuellement compressés en gzip : chaque
+morceau produit ne contient que quelques centaines de relevés, la mémoire
+reste la même quelle que soit la taille de l'historique.
+"""
+
+import csv
+import json
+import zlib
+from io import StringIO
+
+# Format -> (type MIME, extension du fichier)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+CSV_HEADERS = [
+    'Date et heure',
+    'Boutique',
+    'Prix',
+    'Devise',
+    'Disponible',
+    'URL',
+    'Message d\'erreur',
+    'Observé depuis',
+    'Relevés'
+]
+
+
+def _format_timestamp(value):
+    return value.replace('T', ' ')[:19] if value else ''
+
+
+def _csv_row(record, with_product):
+    row = [
+        _format_timestamp(record.get('scraped_at')),
+        record.get('shop_name', ''),
+        f"{record['price']:.2f}" if record.get('price') is not None else '',
+        record.get('currency') or 'EUR',
+        'Oui' if record.get('is_available') else 'Non',
+        record.get('url', ''),
+        record.get('error_message') or '',
+        # Relevé prolongé ou compacté : plage first_seen_at -> scraped_at
+        _format_timestamp(record.get('first_seen_at') or record.get('scraped_at')),
+        record.get('observations') or 1
+    ]
+    return [record.get('product_name', '')] + row if with_product else row
+
+
+def _jsonl_record(record):
+    return {
+        'product_id': record.get('product_id'),
+        'product_name': record.get('product_name'),
+        'shop_name': record.get('shop_name'),
+        'url': record.get('url'),
+        'price': record.get('price'),
+        'currency': record.get('currency'),
+        'is_available': bool(record.get('is_available')),
+        'error_message': record.get('error_message'),
+        'first_seen_at': record.get('first_seen_at') or record.get('scraped_at'),
+        'scraped_at': record.get('scraped_at'),
+        'observations': record.get('observations') or 1,
+    }
+
+
+def export_chunks(records, fmt='csv', with_product=False, chunk_rows=500):
+    """
+    Fichier d'export produit par morceaux
+
+    Args:
+        records (iterable): Relevés (dictionnaires de iter_price_history)
+        fmt (str): Format, clé de EXPORT_FORMATS
+        with_product (bool): Colonne produit en CSV (export du catalogue)
+        chunk_rows (int): Relevés par morceau
+
+    Yields:
+        bytes: Morceau du fichier, encodé en UTF-8
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu: {fmt}")
+
+    buffer = StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(['Produit'] + CSV_HEADERS if with_product else CSV_HEADERS)
+
+        def write(record):
+            writer.writerow(_csv_row(record, with_product))
+    else:
+        def write(record):
+            buffer.write(json.dumps(_jsonl_record(record), ensure_ascii=False) + '\n')
+
+    pending = 0
+    for record in records:
+        write(record)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Compresser en gzip un flux de morceaux, sans le charger en mémoire"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # En-tête gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()